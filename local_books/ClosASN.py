@@ -0,0 +1,106 @@
+"""
+Author: Peter Willis
+Desc: Integer-arithmetic ASN allocation for folded-Clos fabrics. The private ASN ranges are laid end to end and an ASN is only ever
+      described by its index in them, so the ASN of an index (and the index of an ASN) is computed in constant time.
+"""
+
+import numpy as np
+
+# RFC 6996 private ASNs: the 2-byte range, then the 4-byte range once the 1023 2-byte ASNs are used up.
+PRIVATE_ASN_RANGES = ((64512, 65534), (4200000000, 4294967294))
+
+class ASNPool:
+    def __init__(self, ranges=PRIVATE_ASN_RANGES):
+        """
+        Lay a set of ASN ranges end to end. ASNs are either asked for by index (ex: from the position of a node in the topology)
+        or handed out in order by allocate, starting after every index that has been reserved.
+
+        :param ranges: The (first, last) ASN of each range, inclusive, in the order they are used.
+        """
+
+        self.ranges = [(int(first), int(last)) for first, last in ranges]
+
+        # Index of the first ASN of each range.
+        self.rangeOffsets = []
+        numASNs = 0
+        for first, last in self.ranges:
+            self.rangeOffsets.append(numASNs)
+            numASNs += last - first + 1
+
+        self.numASNs = numASNs
+        self.nextIndex = 0
+
+    def checkIndex(self, index):
+        if(not 0 <= index < self.numASNs):
+            raise IndexError(f"ASN {index} is outside of the {self.numASNs} ASNs of {self.ranges}")
+
+        return index
+
+    def reserve(self, count):
+        """
+        Make sure allocate never hands out one of the first count ASNs, as they are given out by index.
+
+        :param count: The number of ASNs (from index 0) to keep out of allocate.
+        """
+
+        self.nextIndex = max(self.nextIndex, count)
+
+        return
+
+    def allocate(self):
+        """
+        :returns: The next unused ASN.
+        """
+
+        ASN = self.getASN(self.nextIndex)
+        self.nextIndex += 1
+
+        return ASN
+
+    def getASN(self, index):
+        """
+        :param index: The index of the ASN.
+        :returns: The ASN.
+        """
+
+        self.checkIndex(index)
+
+        for (first, _), offset in zip(reversed(self.ranges), reversed(self.rangeOffsets)):
+            if(index >= offset):
+                return first + index - offset
+
+    def getASNs(self, indexes):
+        """
+        Vectorized getASN.
+
+        :param indexes: A numpy array of ASN indexes.
+        :returns: A numpy int64 array of the ASNs.
+        """
+
+        indexes = np.asarray(indexes, dtype=np.int64)
+
+        if(indexes.size and not (0 <= indexes.min() and indexes.max() < self.numASNs)):
+            raise IndexError(f"ASN indexes are outside of the {self.numASNs} ASNs of {self.ranges}")
+
+        offsets = np.array(self.rangeOffsets, dtype=np.int64)
+        firsts = np.array([first for first, _ in self.ranges], dtype=np.int64)
+        rangeIndexes = np.searchsorted(offsets, indexes, side="right") - 1
+
+        return firsts[rangeIndexes] + indexes - offsets[rangeIndexes]
+
+    def contains(self, ASN):
+        return any(first <= ASN <= last for first, last in self.ranges)
+
+    def getIndex(self, ASN):
+        """
+        Find where an ASN given out by this pool is.
+
+        :param ASN: The ASN.
+        :returns: The index of the ASN.
+        """
+
+        for (first, last), offset in zip(self.ranges, self.rangeOffsets):
+            if(first <= ASN <= last):
+                return offset + ASN - first
+
+        raise ValueError(f"ASN {ASN} is outside of {self.ranges}")
@@ -0,0 +1,148 @@
+"""
+Author: Peter Willis
+Desc: Reverse index of the IPv4 addresses of a folded-Clos topology. Each address is mapped to the interface it is configured on, so peers,
+      subnets, and links named by address in FRR logs or analysis output (ex: 172.16.8.1(S-1-1)) are resolved with a single dictionary lookup.
+"""
+
+import json
+from collections import namedtuple
+from ClosStats import ClosStats
+
+# An interface holding an address: the node it is on, the neighbor it faces (as keyed in the node's ipv4 attribute, ex: "compute"),
+# its FABRIC interface name, its subnet in CIDR notation, and the type of link (see ClosStats).
+InterfaceAddress = namedtuple("InterfaceAddress", ("address", "node", "neighbor", "interface", "subnet", "linkType"))
+
+class AddressIndex:
+    # Bump when the layout of saved indexes changes.
+    FORMAT_VERSION = 1
+
+    def __init__(self, interfaces=()):
+        """
+        Index interfaces by address and by subnet.
+
+        :param interfaces: InterfaceAddress tuples.
+        """
+
+        self.addresses = {}
+        self.subnets = {}
+
+        for interface in interfaces:
+            self.addresses[interface.address] = interface
+            self.subnets.setdefault(interface.subnet, []).append(interface)
+
+    @classmethod
+    def fromTopology(cls, topology):
+        """
+        Index every address of a built topology.
+
+        :param topology: A built BGPDCNConfig or MTPConfig object.
+        :returns: An AddressIndex object.
+        """
+
+        return cls(cls.iterInterfaces(topology))
+
+    @staticmethod
+    def iterInterfaces(topology):
+        graph = topology.clos
+
+        for node, ipv4 in graph.nodes(data="ipv4", default=None):
+            for neighbor, address in (ipv4 or {}).items():
+                # MTP core interfaces hold a placeholder instead of an address.
+                if(address.count(".") != 3):
+                    continue
+
+                # A leaf with a single compute subnet has one interface for all of its compute nodes.
+                if(neighbor not in graph):
+                    linkType = ClosStats.EDGE_LINK
+                elif(min(graph.nodes[node]["tier"], graph.nodes[neighbor]["tier"]) < topology.COMPUTE_TIER):
+                    linkType = ClosStats.SECURITY_LINK
+                elif(graph.edges[node, neighbor].get("computeNetwork")):
+                    linkType = ClosStats.EDGE_LINK
+                else:
+                    linkType = ClosStats.CORE_LINK
+
+                yield InterfaceAddress(address, node, neighbor, topology.getFabricInterfaceName(node, neighbor),
+                                       topology.getInterfaceSubnet(node, neighbor), linkType)
+
+        return
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __iter__(self):
+        return iter(self.addresses.values())
+
+    def __contains__(self, address):
+        return self.lookup(address) is not None
+
+    def lookup(self, address):
+        """
+        :param address: An IPv4 address, optionally followed by the peer name FRR logs add to it (ex: "172.16.8.1(S-1-1)").
+        :returns: The InterfaceAddress holding the address, or None if no interface has it.
+        """
+
+        interface = self.addresses.get(address)
+
+        if(interface is None and "(" in address):
+            interface = self.addresses.get(address.partition("(")[0])
+
+        return interface
+
+    def getNode(self, address):
+        """
+        :param address: An IPv4 address (see lookup).
+        :returns: The name of the node the address is configured on, or None if no interface has it.
+        """
+
+        interface = self.lookup(address)
+
+        return interface.node if interface else None
+
+    def getLink(self, address):
+        """
+        :param address: An IPv4 address (see lookup) of either end of a link.
+        :returns: A tuple of (node holding the address, neighbor it faces), or None if no interface has the address.
+        """
+
+        interface = self.lookup(address)
+
+        return (interface.node, interface.neighbor) if interface else None
+
+    def getSubnetInterfaces(self, subnet):
+        """
+        :param subnet: A subnet in CIDR notation (ex: a prefix withdrawn in an UPDATE).
+        :returns: A list of the InterfaceAddress tuples on the subnet.
+        """
+
+        return self.subnets.get(subnet, [])
+
+    def save(self, path):
+        """
+        Write the index to a JSON file, so analysis code doesn't need the topology to resolve addresses.
+
+        :param path: The file to write.
+        """
+
+        with open(path, "w") as indexFile:
+            json.dump({"formatVersion": self.FORMAT_VERSION,
+                       "fields": InterfaceAddress._fields,
+                       "interfaces": [list(interface) for interface in self]}, indexFile, separators=(",", ":"))
+
+        return
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save.
+
+        :param path: The file to read.
+        :returns: An AddressIndex object.
+        """
+
+        with open(path) as indexFile:
+            data = json.load(indexFile)
+
+        if(data.get("formatVersion") != cls.FORMAT_VERSION or tuple(data["fields"]) != InterfaceAddress._fields):
+            raise ValueError(f"{path} is not an address index this version can read")
+
+        return cls(InterfaceAddress(*interface) for interface in data["interfaces"])
@@ -0,0 +1,117 @@
+"""
+Author: Peter Willis
+Desc: Integer-arithmetic IPv4 allocation for folded-Clos links. A supernet is split into equal subnets that are only ever described
+      by their index, and an address is computed as supernet + subnet index * subnet size + host offset, so no network or address
+      objects are created.
+"""
+
+from ipaddress import IPv4Network
+
+def formatIPv4(address):
+    """
+    :param address: An IPv4 address as an integer.
+    :returns: The dotted-quad string of the address.
+    """
+
+    return f"{address >> 24}.{(address >> 16) & 0xff}.{(address >> 8) & 0xff}.{address & 0xff}"
+
+def parseIPv4(address):
+    """
+    :param address: An IPv4 address as a dotted-quad string.
+    :returns: The address as an integer.
+    """
+
+    first, second, third, fourth = address.split(".")
+    return (int(first) << 24) | (int(second) << 16) | (int(third) << 8) | int(fourth)
+
+class SubnetPool:
+    def __init__(self, supernet, subnetBits, firstSubnet=0):
+        """
+        Split a supernet into 2**subnetBits subnets. Subnets are either asked for by index (ex: the position of a link in the topology)
+        or handed out in order by allocate, starting after every index that has been reserved.
+
+        :param supernet: The supernet to split (ex: "172.16.0.0/12").
+        :param subnetBits: Number of bits added to the supernet's prefix length to get the subnets' prefix length.
+        :param firstSubnet: The first subnet that may be used. Earlier subnets are never handed out.
+        """
+
+        supernet = IPv4Network(supernet)
+
+        self.supernet = str(supernet)
+        self.base = int(supernet.network_address)
+        self.prefixLength = supernet.prefixlen + subnetBits
+        self.subnetSize = 2**(32 - self.prefixLength)
+        self.numSubnets = 2**subnetBits
+        self.firstSubnet = firstSubnet
+        self.nextSubnet = firstSubnet
+
+    def checkSubnet(self, index):
+        if(not self.firstSubnet <= index < self.numSubnets):
+            raise IndexError(f"Subnet {index} is outside of the {self.numSubnets} subnets of {self.supernet}")
+
+        return index
+
+    def reserve(self, count):
+        """
+        Make sure allocate never hands out one of the first count subnets, as they are given out by index.
+
+        :param count: The number of subnets (from subnet 0) to keep out of allocate.
+        """
+
+        self.nextSubnet = max(self.nextSubnet, count)
+
+        return
+
+    def allocate(self):
+        """
+        :returns: The index of the next unused subnet.
+        """
+
+        index = self.checkSubnet(self.nextSubnet)
+        self.nextSubnet += 1
+
+        return index
+
+    def getNetwork(self, index):
+        """
+        :param index: The index of the subnet.
+        :returns: The network address of the subnet as an integer.
+        """
+
+        return self.base + self.checkSubnet(index)*self.subnetSize
+
+    def getAddress(self, index, host):
+        """
+        :param index: The index of the subnet.
+        :param host: The offset of the address within the subnet. Negative offsets count back from the broadcast address (-1).
+        :returns: The address as a dotted-quad string.
+        """
+
+        if(host < 0):
+            host += self.subnetSize
+
+        if(not 0 <= host < self.subnetSize):
+            raise IndexError(f"Host {host} is outside of a /{self.prefixLength} subnet")
+
+        return formatIPv4(self.getNetwork(index) + host)
+
+    def getPrefix(self, index):
+        """
+        :param index: The index of the subnet.
+        :returns: The subnet in CIDR notation (ex: "192.168.1.0/24").
+        """
+
+        return f"{formatIPv4(self.getNetwork(index))}/{self.prefixLength}"
+
+    def contains(self, address):
+        return 0 <= parseIPv4(address) - self.base < self.numSubnets*self.subnetSize
+
+    def locate(self, address):
+        """
+        Find where an address given out by this pool is.
+
+        :param address: An address as a dotted-quad string.
+        :returns: A tuple of (subnet index, host offset).
+        """
+
+        return divmod(parseIPv4(address) - self.base, self.subnetSize)
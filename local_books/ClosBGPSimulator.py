@@ -0,0 +1,460 @@
+"""
+Author: Peter Willis
+Desc: Discrete-event simulation of BGP reconvergence after a link failure in a folded-Clos fabric built by BGPDCNConfig. Failure
+      detection, UPDATE propagation, MRAI, and per-message processing are modelled on the FRR configuration the fabric is deployed
+      with, and results are reported in the units BGP_Analysis uses, so a failure can be studied before (or instead of) a FABRIC run.
+"""
+
+import heapq
+import random
+from collections import defaultdict
+from ClosGenerator import BGPDCNConfig
+from ClosRoutes import RoutePredictor, UPDATE_PAYLOAD_BYTES, PREFIX_BYTES, ANNOUNCEMENT_ATTRIBUTE_BYTES
+
+# Failure modes of BGP_Test and MTP_Test. A soft failure drops the interface's traffic with iptables (nftables for MTP, which
+# only drops what comes in), a hard failure takes the interfaces on both ends down, and a hybrid failure only takes
+# NODE_TO_FAIL's interface down.
+SOFT_FAILURE = "soft"
+HARD_FAILURE = "hard"
+HYBRID_FAILURE = "hybrid"
+FAILURE_MODES = (SOFT_FAILURE, HARD_FAILURE, HYBRID_FAILURE)
+
+# Bytes BGPOverheadCalculator counts for an UPDATE on top of its BGP message: the IPv4 header and a TCP header with timestamps.
+IP_HEADER_BYTES = 20
+TCP_HEADER_BYTES = 32
+# BGP header, withdrawn routes length, and total path attribute length fields.
+UPDATE_HEADER_BYTES = 19 + 2 + 2
+
+# Event types, in the order they are handled when they happen at the same time. A session going down or an UPDATE arriving
+# is queued at its node, and handled (processed) once the node is done with everything queued before it.
+PROCESS_EVENT = 0
+SESSION_DOWN_EVENT = 1
+RECEIVE_EVENT = 2
+MRAI_EVENT = 3
+
+def getUpdateSizes(numPrefixes, path=None):
+    """
+    Split a set of withdrawn or announced prefixes into the UPDATE messages that carry them.
+
+    :param numPrefixes: The number of /24 prefixes.
+    :param path: The AS_PATH the prefixes are announced with, or None if they are withdrawn.
+    :returns: A list of (IPv4 length, withdrawn routes length, path attribute length) tuples, one per UPDATE.
+    """
+
+    attributeBytes = 0 if path is None else ANNOUNCEMENT_ATTRIBUTE_BYTES + 4*len(path)
+    prefixesPerUpdate = (UPDATE_PAYLOAD_BYTES - attributeBytes) // PREFIX_BYTES
+    sizes = []
+
+    for first in range(0, numPrefixes, prefixesPerUpdate):
+        prefixBytes = min(prefixesPerUpdate, numPrefixes - first) * PREFIX_BYTES
+        ipLength = IP_HEADER_BYTES + TCP_HEADER_BYTES + UPDATE_HEADER_BYTES + attributeBytes + prefixBytes
+        sizes.append((ipLength, prefixBytes if path is None else 0, attributeBytes))
+
+    return sizes
+
+class ConvergenceResult:
+    def __init__(self, link, failureMode, networkNodes):
+        """
+        Metrics of a simulated reconvergence, named and measured like BGP_Analysis: times in milliseconds from the failure and
+        overhead in bytes of received UPDATE packets.
+
+        :param link: The (NODE_TO_FAIL, NEIGHBOR_TO_FAIL) tuple of the failed link.
+        :param failureMode: "soft", "hard", or "hybrid".
+        :param networkNodes: The names of the nodes whose logs BGP_Analysis reads.
+        """
+
+        self.link = link
+        self.failureMode = failureMode
+        self.totalNodeCount = len(networkNodes)
+        self.failedNodes = list(link)
+
+        # Per node, like the overhead.log and bgpd.log of each node.
+        self.nodeOverhead = defaultdict(lambda: [0, 0, 0]) # [packet, withdrawn routes, added routes] bytes received.
+        self.nodeConvergenceTimes = {} # Time the last UPDATE with a withdrawal was logged.
+        self.detectionTimes = {} # Time each end of the link took the session down.
+
+        self.messagesSent = 0
+        self.messagesLost = 0 # Sent into the failed link before the sender noticed.
+        self.lastEventTime = 0.0 # Time the last UPDATE was processed, whether or not it withdrew anything.
+        self.numEvents = 0
+
+    @property
+    def reconvergenceTime(self):
+        return max(self.nodeConvergenceTimes.values(), default=0)
+
+    @property
+    def totalPacketOverhead(self):
+        return sum(overhead[0] for overhead in self.nodeOverhead.values())
+
+    @property
+    def totalWithdrawnRoutesOverhead(self):
+        return sum(overhead[1] for overhead in self.nodeOverhead.values())
+
+    @property
+    def totalAddedRoutesOverhead(self):
+        return sum(overhead[2] for overhead in self.nodeOverhead.values())
+
+    @property
+    def effectedNodeCount(self):
+        return len({node for node, overhead in self.nodeOverhead.items() if overhead[0] > 0} | set(self.failedNodes))
+
+    @property
+    def blastRadius(self):
+        return (self.effectedNodeCount/self.totalNodeCount) * 100 if self.totalNodeCount else 0.0
+
+    def report(self):
+        """
+        :returns: The metrics as BGP_Analysis prints them.
+        """
+
+        return (f"Reconvergence time: {self.reconvergenceTime} milliseconds\n"
+                f"Packet Overhead: {self.totalPacketOverhead} bytes\n"
+                f"Withdrawn Routes Overhead: {self.totalWithdrawnRoutesOverhead} bytes\n"
+                f"Added Routes Overhead: {self.totalAddedRoutesOverhead} bytes\n"
+                f"\nBlast radius: {self.blastRadius:.2f}% of nodes received updated prefix information.\n"
+                f"\tNodes receiving updated information: {self.effectedNodeCount}\n\tTotal nodes: {self.totalNodeCount}")
+
+    def toDict(self):
+        """
+        :returns: The result as a JSON-serializable dictionary.
+        """
+
+        return {"link": list(self.link), "failureMode": self.failureMode,
+                "reconvergenceTime": self.reconvergenceTime, "lastEventTime": self.lastEventTime,
+                "packetOverhead": self.totalPacketOverhead, "withdrawnRoutesOverhead": self.totalWithdrawnRoutesOverhead,
+                "addedRoutesOverhead": self.totalAddedRoutesOverhead, "effectedNodeCount": self.effectedNodeCount,
+                "totalNodeCount": self.totalNodeCount, "blastRadius": self.blastRadius,
+                "messagesSent": self.messagesSent, "messagesLost": self.messagesLost, "numEvents": self.numEvents,
+                "detectionTimes": dict(self.detectionTimes), "nodeConvergenceTimes": dict(self.nodeConvergenceTimes),
+                "nodeOverhead": dict(self.nodeOverhead)}
+
+    def __repr__(self):
+        return (f"ConvergenceResult({self.failureMode} {self.link[0]} <--> {self.link[1]}: {self.reconvergenceTime} ms, "
+                f"{self.totalPacketOverhead} bytes, blast radius {self.blastRadius:.2f}%)")
+
+class BGPSimulator:
+    # Timers of frr_conf_bgp.mako: "timers bgp 1 3", and the lowerIntervals BFD profile with FRR's default detect multiplier.
+    KEEPALIVE_TIME = 1.0
+    HOLD_TIME = 3.0
+    BFD_INTERVAL = 0.1
+    BFD_MULTIPLIER = 3
+
+    def __init__(self, topology, processingDelay=0.001, linkDelay=0.0001, mrai=0.0, useBFD=True, seed=0):
+        """
+        Simulate the fabric's BGP speakers reacting to a link failure. Each speaker handles one event at a time, so UPDATEs
+        queue up behind each other, and only the routes of origins whose best path the failure changes are simulated, as
+        nothing is sent for the others. Every node starts from the converged state RoutePredictor computes, and uses the same
+        best path selection, so the simulation ends in the routes RoutePredictor predicts.
+
+        :param topology: A BGPDCNConfig object that has been built.
+        :param processingDelay: Seconds a node takes to handle an UPDATE or a session going down and send the UPDATEs it causes.
+        :param linkDelay: Seconds an UPDATE takes to get to a neighbor.
+        :param mrai: Minimum seconds between announcements to a peer, FRR's default of 0 sending them right away. Withdrawals
+                     are never delayed.
+        :param useBFD: Detect soft failures with BFD, as frr_conf_bgp.mako does, instead of the BGP hold timer.
+        :param seed: Seed for the phase of the BFD and keepalive timers when the failure happens.
+        """
+
+        self.topology = topology
+        self.predictor = RoutePredictor(topology)
+        self.processingDelay = processingDelay
+        self.linkDelay = linkDelay
+        self.mrai = mrai
+        self.useBFD = useBFD
+        self.random = random.Random(seed)
+
+    def getDetectionTime(self):
+        """
+        :returns: Seconds until a node notices a peer it stopped hearing from: BFD's (or the hold timer's) detection time, minus
+                  how long ago the last packet came in.
+        """
+
+        if(self.useBFD):
+            return self.BFD_INTERVAL*self.BFD_MULTIPLIER - self.random.uniform(0, self.BFD_INTERVAL)
+
+        return self.HOLD_TIME - self.random.uniform(0, self.KEEPALIVE_TIME)
+
+    def getDetectionTimes(self, node, neighbor, failureMode):
+        """
+        :param node: NODE_TO_FAIL.
+        :param neighbor: NEIGHBOR_TO_FAIL.
+        :param failureMode: "soft", "hard", or "hybrid".
+        :returns: A dictionary of each end of the link to the second it takes the BGP session down.
+        """
+
+        if(failureMode not in FAILURE_MODES):
+            raise ValueError(f"The failure mode must be one of {FAILURE_MODES}, not {failureMode}")
+
+        # An interface that goes down takes its session with it, the other end has to notice the silence.
+        if(failureMode == HARD_FAILURE):
+            return {node: 0.0, neighbor: 0.0}
+        elif(failureMode == HYBRID_FAILURE):
+            return {node: 0.0, neighbor: self.getDetectionTime()}
+        else:
+            return {node: self.getDetectionTime(), neighbor: self.getDetectionTime()}
+
+    def schedule(self, time, eventType, node, data):
+        heapq.heappush(self.events, (time, eventType, self.sequence, node, data))
+        self.sequence += 1
+
+        return
+
+    def queue(self, time, node, data):
+        """
+        Queue an event at a node, which handles its events one at a time.
+
+        :param time: Second the event happens.
+        :param node: The name of the node.
+        :param data: The event, passed on to handleEvent.
+        :returns: The second the node is done handling the event.
+        """
+
+        doneTime = max(time, self.busyUntil[node]) + self.processingDelay
+        self.busyUntil[node] = doneTime
+        self.schedule(doneTime, PROCESS_EVENT, node, data)
+
+        return doneTime
+
+    def getAdvertisedPath(self, node, origin):
+        route = self.bestRoutes[node][origin]
+
+        return None if route is None else (self.predictor.ASNs[node],) + route[0]
+
+    def sendUpdates(self, time, node, peer, withdrawn, announced):
+        """
+        Send a peer one UPDATE with every withdrawn origin and one per announced AS_PATH.
+
+        :param time: Second the UPDATEs are sent.
+        :param node: The name of the sending node.
+        :param peer: The name of the peer.
+        :param withdrawn: A list of withdrawn origins.
+        :param announced: A dictionary of AS_PATH to the list of origins announced with it.
+        """
+
+        numMessages = (1 if withdrawn else 0) + len(announced)
+        self.result.messagesSent += numMessages
+
+        # The failed link carries nothing, the sender just hasn't noticed yet.
+        if(frozenset((node, peer)) == self.failedLink):
+            self.result.messagesLost += numMessages
+            return
+
+        if(withdrawn):
+            self.schedule(time + self.linkDelay, RECEIVE_EVENT, peer, (node, None, withdrawn))
+
+        for path, origins in announced.items():
+            self.schedule(time + self.linkDelay, RECEIVE_EVENT, peer, (node, path, origins))
+
+        return
+
+    def advertise(self, time, node, peer, origins):
+        """
+        Bring a peer up to date with the node's best paths to a set of origins, holding announcements back for MRAI.
+
+        :param time: Second the node advertises the paths.
+        :param node: The name of the node.
+        :param peer: The name of the peer.
+        :param origins: The origins whose best paths may have changed.
+        """
+
+        withdrawn = []
+        announced = defaultdict(list)
+        pending = self.pendingAnnouncements[node, peer]
+
+        for origin in origins:
+            path = self.getAdvertisedPath(node, origin)
+            key = (node, peer, origin)
+
+            if(self.sentPaths.get(key, self.initialPaths[node, origin]) == path):
+                pending.discard(origin)
+            elif(path is None):
+                withdrawn.append(origin)
+                self.sentPaths[key] = None
+                pending.discard(origin)
+            elif(self.mrai and time < self.lastAnnouncement.get((node, peer), -self.mrai) + self.mrai):
+                # The announcement goes out with whatever the best path is once MRAI is up.
+                if(not pending):
+                    self.schedule(self.lastAnnouncement[node, peer] + self.mrai, MRAI_EVENT, node, peer)
+
+                pending.add(origin)
+            else:
+                announced[path].append(origin)
+                self.sentPaths[key] = path
+
+        if(announced):
+            self.lastAnnouncement[node, peer] = time
+
+        self.sendUpdates(time, node, peer, withdrawn, announced)
+
+        return
+
+    def updateRoutes(self, time, node, origins):
+        """
+        Rerun best path selection for a set of origins and advertise the new best paths.
+
+        :param time: Second the node is done handling the event that changed its paths.
+        :param node: The name of the node.
+        :param origins: The origins whose accepted paths changed.
+        """
+
+        peers = self.predictor.getPeers(node)
+        changedOrigins = []
+
+        for origin in origins:
+            if(node == origin):
+                continue
+
+            paths = self.adjRibIn[node][origin]
+            route = None
+
+            if(paths):
+                bestPath = min(paths.values(), key=lambda path: (len(path), path))
+                route = (bestPath, tuple(peer for peer in peers if paths.get(peer) == bestPath))
+
+            before = self.bestRoutes[node][origin]
+            self.bestRoutes[node][origin] = route
+
+            # A change of next hops alone stays local.
+            if((before[0] if before else None) != (route[0] if route else None)):
+                changedOrigins.append(origin)
+
+        if(changedOrigins):
+            for peer in peers:
+                if((node, peer) not in self.sessionsDown):
+                    self.advertise(time, node, peer, changedOrigins)
+
+        return
+
+    def handleEvent(self, time, node, data):
+        """
+        Apply a session going down or an UPDATE to a node's accepted paths, once the node gets to it.
+
+        :param time: Second the node is done handling the event.
+        :param node: The name of the node.
+        :param data: (peer, None, None) for the session with peer going down, or (peer, AS_PATH, origins) for an UPDATE from
+                     peer, the AS_PATH being None for a withdrawal.
+        """
+
+        peer, path, origins = data
+        ASN = self.predictor.ASNs[node]
+
+        if(origins is None):
+            self.sessionsDown.add((node, peer))
+            origins = self.origins
+
+            for origin in origins:
+                self.adjRibIn[node][origin].pop(peer, None)
+        else:
+            # UPDATEs still queued from a peer whose session went down are thrown out with it.
+            if((node, peer) in self.sessionsDown):
+                return
+
+            self.result.lastEventTime = round(time * 1000)
+
+            if(path is None):
+                self.result.nodeConvergenceTimes[node] = round(time * 1000)
+
+            for origin in origins:
+                # A path through the node's own ASN is denied, which removes whatever the peer sent before.
+                if(path is None or ASN in path):
+                    self.adjRibIn[node][origin].pop(peer, None)
+                else:
+                    self.adjRibIn[node][origin][peer] = path
+
+        self.updateRoutes(time, node, origins)
+
+        return
+
+    def simulateLinkFailure(self, node, neighbor, failureMode=HYBRID_FAILURE):
+        """
+        Fail a link between two BGP speakers at time 0 and run the fabric until no UPDATE is left in flight.
+
+        :param node: NODE_TO_FAIL.
+        :param neighbor: NEIGHBOR_TO_FAIL.
+        :param failureMode: "soft", "hard", or "hybrid", as in BGP_Test.
+        :returns: A ConvergenceResult object.
+        """
+
+        predictor = self.predictor
+        ASNs = predictor.ASNs
+
+        if(node not in ASNs or neighbor not in predictor.getPeers(node)):
+            raise ValueError(f"{node} and {neighbor} are not connected BGP speakers")
+
+        detectionTimes = self.getDetectionTimes(node, neighbor, failureMode)
+
+        self.result = ConvergenceResult((node, neighbor), failureMode, predictor.networkNodes)
+        self.failedLink = frozenset((node, neighbor))
+        self.origins = predictor.getAffectedOrigins(node, neighbor, pathChangesOnly=True)
+
+        # Paths each node accepted from each peer, and its best route, for the origins that can change only.
+        self.adjRibIn = defaultdict(dict)
+        self.bestRoutes = defaultdict(dict)
+        for origin in self.origins:
+            routes = predictor.getRoutes(origin)
+
+            for speaker in predictor.networkNodes:
+                paths = {}
+                for peer in predictor.getPeers(speaker):
+                    if(peer in routes):
+                        path = (ASNs[peer],) + routes[peer][0]
+
+                        if(ASNs[speaker] not in path):
+                            paths[peer] = path
+
+                self.adjRibIn[speaker][origin] = paths
+                self.bestRoutes[speaker][origin] = routes.get(speaker)
+
+        # Paths every node sent its peers before the failure. sentPaths only holds what has been sent since.
+        self.initialPaths = {(speaker, origin): self.getAdvertisedPath(speaker, origin) for speaker in predictor.networkNodes for origin in self.origins}
+        self.sentPaths = {}
+        self.lastAnnouncement = {}
+        self.pendingAnnouncements = defaultdict(set)
+        self.sessionsDown = set()
+        self.busyUntil = defaultdict(float)
+        self.events = []
+        self.sequence = 0
+
+        for end, detectionTime in detectionTimes.items():
+            self.result.detectionTimes[end] = round(detectionTime * 1000)
+            self.schedule(detectionTime, SESSION_DOWN_EVENT, end, (neighbor if end == node else node, None, None))
+
+        while(self.events):
+            time, eventType, _, speaker, data = heapq.heappop(self.events)
+            self.result.numEvents += 1
+
+            if(eventType == PROCESS_EVENT):
+                self.handleEvent(time, speaker, data)
+            elif(eventType == SESSION_DOWN_EVENT):
+                self.queue(time, speaker, data)
+            elif(eventType == RECEIVE_EVENT):
+                peer, path, origins = data
+
+                # The capture sees the packet whether or not BGP still listens to the peer.
+                numPrefixes = sum(predictor.origins[origin] for origin in origins)
+                overhead = self.result.nodeOverhead[speaker]
+                for ipLength, withdrawnLength, attributeLength in getUpdateSizes(numPrefixes, path):
+                    overhead[0] += ipLength
+                    overhead[1] += withdrawnLength
+                    overhead[2] += attributeLength
+
+                self.queue(time, speaker, data)
+            elif(eventType == MRAI_EVENT):
+                peer = data
+                pending = self.pendingAnnouncements.pop((speaker, peer), ())
+
+                if(pending and (speaker, peer) not in self.sessionsDown):
+                    del self.lastAnnouncement[speaker, peer]
+                    self.advertise(time, speaker, peer, list(pending))
+
+        return self.result
+
+if __name__ == "__main__":
+    # The default link and failure mode of BGP_Test, on a 3-tier fabric.
+    topology = BGPDCNConfig(4, 3)
+    topology.buildGraph()
+    simulator = BGPSimulator(topology)
+
+    for failureMode in FAILURE_MODES:
+        result = simulator.simulateLinkFailure("T-1", "S-1-1", failureMode)
+        print(f"{failureMode.capitalize()} link failure of T-1 <--> S-1-1\n{result.report()}\n")
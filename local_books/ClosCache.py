@@ -0,0 +1,172 @@
+"""
+Author: Peter Willis
+Desc: Content-addressed on-disk cache of built folded-Clos topologies. Topologies are stored as the arrays of a CompactClosTopology,
+      one .npy file per array, so a cached topology loads near-instantly as read-only memory maps that can be shared between processes.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from ClosCompact import CompactClosTopology
+
+class TopologyCache:
+    # Bump when the stored layout or the meaning of the arrays changes, so old entries are no longer used.
+    FORMAT_VERSION = 1
+
+    # Generator class constants that change the ASNs or addresses of a topology.
+    PROTOCOL_CONSTANTS = ("PRIVATE_ASN_RANGES", "LEAF_SPINE_SUPERNET", "LEAF_SPINE_SUBNET_BITS", "COMPUTE_SUPERNET", "COMPUTE_SUBNET_BITS")
+
+    DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "clos_topologies")
+    METADATA_FILE = "topology.json"
+
+    def __init__(self, cacheDir=None):
+        """
+        Open (and create if needed) a topology cache directory.
+
+        :param cacheDir: Where cached topologies are stored. Defaults to ~/.cache/clos_topologies.
+        """
+
+        self.cacheDir = cacheDir or self.DEFAULT_CACHE_DIR
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def getParameters(self, generator):
+        """
+        Collect every parameter that determines the topology a generator builds.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        :returns: A dictionary of the generator's parameters.
+        """
+
+        generatorClass = type(generator)
+
+        return {"formatVersion": self.FORMAT_VERSION,
+                "class": f"{generatorClass.__module__}.{generatorClass.__qualname__}",
+                "protocol": generator.PROTOCOL,
+                "sharedDegree": generator.sharedDegree,
+                "numTiers": generator.numTiers,
+                "southboundPorts": [generator.southboundPorts[tier] for tier in range(generator.LEAF_TIER, generator.numTiers+1)],
+                "singleComputeSubnet": getattr(generator, "singleComputeSubnet", False),
+                "addSecurityNode": getattr(generator, "hasSecurityNode", False),
+                "corePrefixLength": getattr(generator, "corePrefixLength", None),
+                "unnumbered": getattr(generator, "unnumbered", False),
+                "constants": {name: getattr(generatorClass, name, None) for name in self.PROTOCOL_CONSTANTS}}
+
+    def getKey(self, generator):
+        """
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        :returns: The hash identifying the generator's topology in the cache. Any change to a parameter changes the hash.
+        """
+
+        parameters = json.dumps(self.getParameters(generator), sort_keys=True)
+        return hashlib.sha256(parameters.encode("utf-8")).hexdigest()
+
+    def getPath(self, generator):
+        return os.path.join(self.cacheDir, self.getKey(generator))
+
+    def contains(self, generator):
+        return os.path.isfile(os.path.join(self.getPath(generator), self.METADATA_FILE))
+
+    def store(self, generator, topology=None):
+        """
+        Save the topology of a generator to the cache. The entry is written to a temporary directory first and moved into
+        place, so readers in other processes never see a partially written topology.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        :param topology: The CompactClosTopology of the generator, computed if not given.
+        :returns: The path of the cache entry.
+        """
+
+        if(topology is None):
+            topology = CompactClosTopology(generator)
+
+        path = self.getPath(generator)
+        tempPath = tempfile.mkdtemp(prefix=".tmp-", dir=self.cacheDir)
+
+        try:
+            for name in CompactClosTopology.ARRAY_NAMES:
+                np.save(os.path.join(tempPath, f"{name}.npy"), np.ascontiguousarray(getattr(topology, name)))
+
+            with open(os.path.join(tempPath, self.METADATA_FILE), "w") as metadataFile:
+                json.dump({"parameters": self.getParameters(generator), "secNodeId": topology.secNodeId}, metadataFile)
+
+            # Entries whose parameters don't match (see load) are replaced.
+            if(os.path.isdir(path) and self.load(generator) is None):
+                shutil.rmtree(path, ignore_errors=True)
+
+            os.replace(tempPath, path)
+
+        # Another process stored the same topology first, which is just as good.
+        except OSError:
+            if(not self.contains(generator)):
+                raise
+        finally:
+            shutil.rmtree(tempPath, ignore_errors=True)
+
+        return path
+
+    def load(self, generator):
+        """
+        Load the cached topology of a generator as read-only memory-mapped arrays.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        :returns: A CompactClosTopology object, or None if the topology is not cached.
+        """
+
+        path = self.getPath(generator)
+
+        try:
+            with open(os.path.join(path, self.METADATA_FILE)) as metadataFile:
+                metadata = json.load(metadataFile)
+        except FileNotFoundError:
+            return None
+
+        # A matching hash with different parameters would mean a collision or a corrupted entry, so don't trust it.
+        if(metadata["parameters"] != json.loads(json.dumps(self.getParameters(generator)))):
+            return None
+
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in CompactClosTopology.ARRAY_NAMES}
+
+        return CompactClosTopology.fromArrays(generator, arrays, metadata["secNodeId"])
+
+    def getTopology(self, generator):
+        """
+        Get the topology of a generator from the cache, computing and storing it first if it is not cached yet.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        :returns: A CompactClosTopology object backed by the cache.
+        """
+
+        topology = self.load(generator)
+
+        if(topology is None):
+            self.store(generator)
+            topology = self.load(generator)
+
+        return topology
+
+    def remove(self, generator):
+        shutil.rmtree(self.getPath(generator), ignore_errors=True)
+
+    def clear(self):
+        """
+        Remove every cached topology.
+        """
+
+        for entry in os.listdir(self.cacheDir):
+            shutil.rmtree(os.path.join(self.cacheDir, entry), ignore_errors=True)
+
+        return
+
+def loadTopology(generator, cacheDir=None):
+    """
+    Shortcut for TopologyCache(cacheDir).getTopology(generator).
+
+    :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+    :param cacheDir: Where cached topologies are stored. Defaults to ~/.cache/clos_topologies.
+    :returns: A CompactClosTopology object backed by the cache.
+    """
+
+    return TopologyCache(cacheDir).getTopology(generator)
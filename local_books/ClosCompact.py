@@ -0,0 +1,506 @@
+"""
+Author: Peter Willis
+Desc: Compact, array-backed storage of a folded-Clos topology and its protocol attributes. An alternative to the networkx graph
+      built by ClosGenerator when the per-node dictionaries and lists of large fabrics use too much memory.
+"""
+
+import tracemalloc
+import numpy as np
+from collections import defaultdict
+from ipaddress import IPv4Address
+from ClosGenerator import ClosGenerator, BGPDCNConfig, MTPConfig
+
+class TopologyNodeView:
+    """
+    Read-only stand-in for networkx's NodeView. Iterates node names and builds a node's attribute dictionary on demand.
+    """
+
+    def __init__(self, topology):
+        self.topology = topology
+
+    def __iter__(self):
+        return self.topology.iterNodeNames()
+
+    def __len__(self):
+        return self.topology.numNodes()
+
+    def __contains__(self, node):
+        return self.topology.hasNode(node)
+
+    def __getitem__(self, node):
+        return self.topology.nodeAttributes(node)
+
+class TopologyEdgeView:
+    """
+    Read-only stand-in for networkx's EdgeView. Iterates (north node, south node) tuples and builds an edge's attributes on demand.
+    """
+
+    def __init__(self, topology):
+        self.topology = topology
+
+    def __iter__(self):
+        return ((north, south) for north, south, _ in self.topology.iterEdges())
+
+    def __len__(self):
+        return self.topology.numEdges()
+
+    def __getitem__(self, edge):
+        return self.topology.edgeAttributes(*edge)
+
+class ClosTopologyBackend:
+    """
+    The query API of ClosGenerator and its protocol subclasses, for topologies that are not stored as a networkx graph.
+    Subclasses provide iterNodeNames, numNodes, hasNode, nodeTier, nodeAttributes, iterEdges, numEdges, edgeAttributes, and computeNodes.
+    """
+
+    singleComputeSubnet = False
+
+    def getNetworks(self):
+        """
+        Return the edges of the network.
+
+        :returns: A view of the edges of the network, as (north node, south node) tuples.
+        """
+
+        return TopologyEdgeView(self)
+
+    def getNodes(self):
+        """
+        Return the nodes of the network.
+
+        :returns: A view of the nodes of the network.
+        """
+
+        return TopologyNodeView(self)
+
+    def iterNodes(self, noComputeNodes=False):
+        for node in self.getNodes():
+            if(noComputeNodes and not self.isNetworkNode(node)):
+                continue
+            else:
+                yield node
+
+    def isNetworkNode(self, node):
+        return False if node == "compute" else self.nodeTier(node) > ClosGenerator.COMPUTE_TIER
+
+    def getNodeAttribute(self, node, attribute, subattribute=None):
+        return self.nodeAttributes(node)[attribute] if subattribute is None else self.nodeAttributes(node)[attribute][subattribute]
+
+    def iterNetwork(self, fabricFormating=False):
+        """
+        Iterator for the networks in the folded-Clos topology.
+        For core networks, this means every edge is its own network. For edge networks, it is either every edge, or its all edges connected to the same leaf if a single subnet is defined.
+
+        :return: Yield the current network.
+        """
+
+        # Edges are grouped by their north node, so a leaf's compute network only needs to be compared against the last one.
+        lastLeaf = None
+
+        for north, south, isComputeNetwork in self.iterEdges():
+            networkType = "edge" if isComputeNetwork else "core"
+            network = (north, south)
+
+            if(networkType == "core" or self.singleComputeSubnet == False):
+                yield (network, self.generateFabricNetworkName(network, networkType)) if fabricFormating else network
+
+            elif(north != lastLeaf):
+                computeNetwork = (north,) + tuple(self.computeNodes(north))
+                lastLeaf = north
+
+                yield (computeNetwork, self.generateFabricNetworkName(network, networkType)) if fabricFormating else computeNetwork
+
+    def generateFabricNetworkName(self, network, networkType):
+        if(networkType == "edge"):
+            if(self.singleComputeSubnet == True):
+                name = f"edge-{network[0]}-compute" # network[0] will always be the leaf when iterNetwork is called
+            else:
+                name = f"edge-{network[0]}-{network[1]}"
+        else:
+            if(self.nodeTier(network[0]) > self.nodeTier(network[1])):
+                name = f"core-{network[0]}-{network[1]}"
+            else:
+                name = f"core-{network[1]}-{network[0]}"
+
+        return name
+
+    def generateFabricIntfName(self, node, network):
+        otherNode = network[1] if network[0] == node else network[0]
+
+        if(self.nodeTier(node) == ClosGenerator.LEAF_TIER and self.nodeTier(otherNode) == ClosGenerator.COMPUTE_TIER and self.singleComputeSubnet == True):
+            intfName = f"intf-compute"
+        else:
+            intfName = f"intf-{otherNode}"
+
+        return intfName
+
+class CompactClosTopology(ClosTopologyBackend):
+    # Integer types used by the arrays.
+    NODE_TYPE = np.int32
+    INDEX_TYPE = np.int64
+    ADDRESS_TYPE = np.uint32
+    ASN_TYPE = np.uint32
+
+    # Value stored for nodes or interfaces that are not given an ASN or an IPv4 address.
+    NO_VALUE = 0
+
+    # Security node naming, matching BGPDCNConfig.
+    SEC_NODE_NAME = f"{BGPDCNConfig.SEC_NAME}-1"
+
+    # Arrays that fully describe a topology, used to save and load it (see ClosCache).
+    ARRAY_NAMES = ("tier", "edgeNorth", "edgeSouth", "edgeCompute", "exists", "southIndptr", "northEdgeOrder", "northIndptr",
+                   "ASN", "edgeNorthAddress", "edgeSouthAddress", "edgeNewSubnet")
+
+    def __init__(self, generator):
+        """
+        Compute the topology described by a ClosGenerator (or a protocol subclass) directly into arrays, without building its
+        networkx graph. Nodes are integer IDs, adjacency is stored as CSR arrays split by north/south direction, tier and ASN are
+        typed arrays, and IPv4 addresses are packed into uint32s. ASNs and addresses match what the generator's buildGraph assigns.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        """
+
+        self.setParameters(generator)
+
+        north, south = self.layout.edgeArrays()
+        tiers = self.layout.tierArray()
+
+        # The security node hangs off of T-1 and is connected right after T-1's first southbound link.
+        self.secNodeId = None
+        if(self.protocol == BGPDCNConfig.PROTOCOL and generator.hasSecurityNode and len(north) > 0):
+            self.secNodeId = self.layout.numSlots
+            north = np.insert(north, 1, 0)
+            south = np.insert(south, 1, self.secNodeId)
+            tiers = np.append(tiers, BGPDCNConfig.SEC_TIER).astype(np.int8)
+
+        self.tier = tiers
+        self.edgeNorth = north.astype(self.NODE_TYPE)
+        self.edgeSouth = south.astype(self.NODE_TYPE)
+        self.edgeCompute = tiers[south] <= ClosGenerator.COMPUTE_TIER
+
+        numNodes = len(tiers)
+        self.exists = (np.bincount(north, minlength=numNodes) + np.bincount(south, minlength=numNodes)) > 0
+
+        # Southbound adjacency: edges are already grouped by their north node, so the edge ID is the CSR position.
+        self.southIndptr = np.concatenate(([0], np.cumsum(np.bincount(north, minlength=numNodes)))).astype(self.INDEX_TYPE)
+
+        # Northbound adjacency: a stable sort on the south node keeps neighbors in the order they were connected.
+        self.northEdgeOrder = np.argsort(south, kind="stable").astype(self.INDEX_TYPE)
+        self.northIndptr = np.concatenate(([0], np.cumsum(np.bincount(south, minlength=numNodes)))).astype(self.INDEX_TYPE)
+
+        self.ASN = np.zeros(numNodes, dtype=self.ASN_TYPE)
+        self.edgeNorthAddress = np.zeros(len(north), dtype=self.ADDRESS_TYPE)
+        self.edgeSouthAddress = np.zeros(len(north), dtype=self.ADDRESS_TYPE)
+        self.edgeNewSubnet = np.zeros(len(north), dtype=bool)
+
+        if(self.protocol == BGPDCNConfig.PROTOCOL):
+            self.assignASNs(generator)
+            if(not generator.unnumbered):
+                self.addressCoreEdges(generator)
+            self.addressComputeEdges(generator)
+        elif(self.protocol == MTPConfig.PROTOCOL):
+            self.addressComputeEdges(generator)
+
+    def setParameters(self, generator):
+        self.layout = generator.getLayout()
+        self.sharedDegree = generator.sharedDegree
+        self.numTiers = generator.numTiers
+        self.protocol = generator.PROTOCOL
+        self.singleComputeSubnet = getattr(generator, "singleComputeSubnet", False)
+
+        # Compute subnets follow the generator's edge pool, which only protocol generators have.
+        edgePool = getattr(generator, "edgePool", None)
+        self.computeSubnetSize = edgePool.subnetSize if edgePool else None
+        self.computePrefixLength = edgePool.prefixLength if edgePool else None
+
+    @classmethod
+    def fromArrays(cls, generator, arrays, secNodeId=None):
+        """
+        Rebuild a topology from previously computed arrays instead of computing them again. The arrays are used as-is, so
+        read-only memory-mapped arrays can be passed in and shared between processes.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object the arrays were computed from.
+        :param arrays: A mapping of each name in ARRAY_NAMES to its array.
+        :param secNodeId: The node ID of the security node, if the topology has one.
+        :returns: A CompactClosTopology object.
+        """
+
+        topology = cls.__new__(cls)
+        topology.setParameters(generator)
+        topology.secNodeId = secNodeId
+
+        for name in cls.ARRAY_NAMES:
+            setattr(topology, name, arrays[name])
+
+        return topology
+
+    def assignASNs(self, generator):
+        """
+        Give each node the ASN that BGPDCNConfig.generateNode would. Spines sharing a pod prefix share an ASN, every leaf gets
+        its own, and ASNs are handed out in the order the nodes are first generated.
+
+        :param generator: The BGPDCNConfig object holding the ASN pool.
+        """
+
+        layout = self.layout
+        keys = np.full(len(self.tier), -1, dtype=np.int64)
+        nextKey = 0
+
+        for tier in range(layout.LEAF_TIER, layout.numTiers+1):
+            start = layout.tierOffset[tier]
+            count = layout.tierCount(tier)
+            localIds = np.arange(count, dtype=np.int64)
+
+            # Leaves are keyed on the node, spines on their group (pod).
+            if(tier == layout.LEAF_TIER):
+                keys[start:start+count] = nextKey + localIds
+                nextKey += count
+            else:
+                keys[start:start+count] = nextKey + localIds // layout.groupWidth[tier]
+                nextKey += layout.numGroups[tier]
+
+        # Nodes are generated in order of the first link they are a part of.
+        sequence = keys[np.column_stack((self.edgeNorth, self.edgeSouth)).ravel()]
+        sequence = sequence[sequence >= 0]
+        uniqueKeys, firstSeen = np.unique(sequence, return_index=True)
+
+        keyASN = np.zeros(nextKey, dtype=np.int64)
+        keyASN[uniqueKeys[np.argsort(firstSeen, kind="stable")]] = generator.asnPool.getASNs(np.arange(len(uniqueKeys)))
+
+        hasASN = (keys >= 0) & self.exists
+        self.ASN[hasASN] = keyASN[keys[hasASN]]
+
+    def addressCoreEdges(self, generator):
+        """
+        Address core (leaf-spine and spine-spine) links the way BGPDCNConfig.addressCoreNodes does, one subnet per link in the order
+        the links are connected.
+
+        :param generator: The BGPDCNConfig object holding the core supernet.
+        """
+
+        core = np.flatnonzero(~self.edgeCompute)
+        pool = generator.corePool
+        northHost, southHost = generator.coreHosts
+
+        if(len(core) > pool.numSubnets):
+            raise ValueError(f"{len(core)} core links do not fit in the {pool.numSubnets} subnets of {pool.supernet}")
+
+        base = pool.base + np.arange(len(core), dtype=np.int64)*pool.subnetSize
+
+        self.edgeNorthAddress[core] = base + northHost
+        self.edgeSouthAddress[core] = base + southHost
+
+    def addressComputeEdges(self, generator):
+        """
+        Address edge (leaf-compute) links the way addressEdgeNodes does. Each link gets its own subnet, or each leaf does if a single
+        compute subnet is used, with the leaf on the high host address and compute nodes on the low ones.
+
+        :param generator: The BGPDCNConfig or MTPConfig object holding the compute supernet.
+        """
+
+        edges = np.flatnonzero(self.edgeCompute)
+        edgeNorth = self.edgeNorth[edges]
+
+        if(self.singleComputeSubnet):
+            # Subnets are handed out in order of each leaf's first compute link, with hosts numbered per leaf.
+            leaves, firstSeen, leafIndex = np.unique(edgeNorth, return_index=True, return_inverse=True)
+            leafRank = np.empty(len(leaves), dtype=np.int64)
+            leafRank[np.argsort(firstSeen, kind="stable")] = np.arange(len(leaves))
+
+            subnetIndex = leafRank[leafIndex]
+            hostIndex = np.arange(len(edges)) - firstSeen[leafIndex] + 1
+            newSubnet = np.zeros(len(edges), dtype=bool)
+            newSubnet[firstSeen] = True
+        else:
+            subnetIndex = np.arange(len(edges), dtype=np.int64)
+            hostIndex = np.ones(len(edges), dtype=np.int64)
+            newSubnet = np.ones(len(edges), dtype=bool)
+
+        # Subnets and hosts are numbered from the generator's first ones, in its edge pool.
+        pool = generator.edgePool
+        subnetIndex = subnetIndex + generator.FIRST_COMPUTE_SUBNET
+        hostIndex = hostIndex - 1 + generator.FIRST_EDGE_SOUTH_HOST
+        northHost = generator.EDGE_NORTH_HOST % pool.subnetSize # Counted back from the broadcast address.
+
+        if(len(edges) and subnetIndex.max() >= pool.numSubnets):
+            raise ValueError(f"{subnetIndex.max()+1 - generator.FIRST_COMPUTE_SUBNET} compute subnets do not fit in the "
+                             f"{pool.numSubnets - generator.FIRST_COMPUTE_SUBNET} subnets of {pool.supernet}")
+        if(len(edges) and hostIndex.max() >= northHost):
+            raise ValueError(f"{hostIndex.max() - generator.FIRST_EDGE_SOUTH_HOST + 1} compute nodes of a leaf do not fit in a "
+                             f"/{pool.prefixLength} compute subnet")
+
+        base = pool.base + subnetIndex*pool.subnetSize
+
+        self.edgeNorthAddress[edges] = base + northHost
+        self.edgeSouthAddress[edges] = base + hostIndex
+        self.edgeNewSubnet[edges] = newSubnet
+
+    def nodeId(self, node):
+        if(node == self.SEC_NODE_NAME and self.secNodeId is not None):
+            return self.secNodeId
+
+        nodeId = self.layout.parseName(node)
+
+        if(not self.exists[nodeId]):
+            raise KeyError(node)
+
+        return nodeId
+
+    def nodeName(self, nodeId):
+        return self.SEC_NODE_NAME if nodeId == self.secNodeId else self.layout.nodeName(nodeId)
+
+    def hasNode(self, node):
+        try:
+            self.nodeId(node)
+        except (ValueError, KeyError):
+            return False
+
+        return True
+
+    def numNodes(self):
+        return int(self.exists.sum())
+
+    def numEdges(self):
+        return len(self.edgeNorth)
+
+    def iterNodeNames(self):
+        for nodeId in np.flatnonzero(self.exists).tolist():
+            yield self.nodeName(nodeId)
+
+    def nodeTier(self, node):
+        return int(self.tier[self.nodeId(node)])
+
+    def iterEdges(self):
+        for north, south, isComputeNetwork in zip(self.edgeNorth.tolist(), self.edgeSouth.tolist(), self.edgeCompute.tolist()):
+            yield (self.nodeName(north), self.nodeName(south), isComputeNetwork)
+
+    def edgeAttributes(self, nodeA, nodeB):
+        return {"computeNetwork": bool(self.edgeCompute[self.edgeId(nodeA, nodeB)])}
+
+    def computeNodes(self, leaf):
+        leafId = self.nodeId(leaf)
+        return [self.nodeName(self.edgeSouth[edge]) for edge in self.southEdges(leafId) if self.edgeCompute[edge]]
+
+    def edgeId(self, nodeA, nodeB):
+        """
+        Find the link connecting two nodes.
+
+        :param nodeA: The name of one node on the link.
+        :param nodeB: The name of the other node on the link.
+        :returns: The integer ID of the link.
+        """
+
+        idA = self.nodeId(nodeA)
+        idB = self.nodeId(nodeB)
+        north, south = (idA, idB) if self.tier[idA] > self.tier[idB] else (idB, idA)
+
+        start, end = self.southIndptr[north], self.southIndptr[north+1]
+        matches = np.flatnonzero(self.edgeSouth[start:end] == south)
+
+        if(len(matches) == 0):
+            raise KeyError((nodeA, nodeB))
+
+        return int(start + matches[0])
+
+    def southEdges(self, nodeId):
+        return range(self.southIndptr[nodeId], self.southIndptr[nodeId+1])
+
+    def northEdges(self, nodeId):
+        return self.northEdgeOrder[self.northIndptr[nodeId]:self.northIndptr[nodeId+1]].tolist()
+
+    def nodeAttributes(self, node):
+        """
+        Build the attribute dictionary the networkx graph would hold for a node.
+
+        :param node: The name of the node.
+        :returns: A dictionary of node attributes.
+        """
+
+        nodeId = self.nodeId(node)
+        northEdges = self.northEdges(nodeId)
+        southEdges = self.southEdges(nodeId)
+
+        attributes = {"northbound": [self.nodeName(self.edgeNorth[edge]) for edge in northEdges],
+                      "southbound": [self.nodeName(self.edgeSouth[edge]) for edge in southEdges],
+                      "tier": int(self.tier[nodeId])}
+
+        if(self.protocol is None):
+            return attributes
+
+        if(self.protocol == MTPConfig.PROTOCOL):
+            ipv4 = defaultdict(MTPConfig.getDefaultAddress)
+            attributes["isTopTier"] = attributes["tier"] == self.numTiers
+        else:
+            ipv4 = {}
+            asn = int(self.ASN[nodeId])
+            attributes["ASN"] = asn if asn != self.NO_VALUE else None
+            attributes["advertise"] = []
+
+        for edge in northEdges:
+            if(self.edgeSouthAddress[edge] != self.NO_VALUE):
+                ipv4[self.nodeName(self.edgeNorth[edge])] = str(IPv4Address(int(self.edgeSouthAddress[edge])))
+
+        for edge in southEdges:
+            if(self.edgeNorthAddress[edge] == self.NO_VALUE):
+                continue
+
+            address = str(IPv4Address(int(self.edgeNorthAddress[edge])))
+
+            if(self.edgeCompute[edge] and self.singleComputeSubnet):
+                ipv4["compute"] = address
+            else:
+                ipv4[self.nodeName(self.edgeSouth[edge])] = address
+
+            if(self.edgeNewSubnet[edge] and "advertise" in attributes):
+                network = int(self.edgeNorthAddress[edge]) & ~(self.computeSubnetSize-1)
+                attributes["advertise"].append(f"{IPv4Address(network)}/{self.computePrefixLength}")
+
+        attributes["ipv4"] = ipv4
+
+        return attributes
+
+    def memoryUsage(self):
+        """
+        :returns: The number of bytes held by the topology's arrays.
+        """
+
+        return sum(array.nbytes for array in vars(self).values() if isinstance(array, np.ndarray))
+
+def compareMemory(kValues=(16, 32, 48, 64), t=3, generatorClass=ClosGenerator, **kwargs):
+    """
+    Measure the memory used by the networkx graph and by the compact topology for a range of folded-Clos sizes.
+    The networkx graph is measured with tracemalloc while it is built, the compact topology by the size of its arrays.
+
+    :param kValues: The shared degrees to compare.
+    :param t: Number of tiers in the graph.
+    :param generatorClass: ClosGenerator or a protocol subclass. Protocol subclasses are limited by the size of their address space.
+    :returns: A list of dictionaries, one per shared degree.
+    """
+
+    results = []
+
+    for k in kValues:
+        tracemalloc.start()
+        topology = generatorClass(k, t, **kwargs)
+        topology.buildGraph(engine=ClosGenerator.VECTORIZED_ENGINE)
+        networkxBytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        compactBytes = CompactClosTopology(generatorClass(k, t, **kwargs)).memoryUsage()
+
+        results.append({"k": k, "t": t,
+                        "nodes": topology.clos.number_of_nodes(),
+                        "edges": topology.clos.number_of_edges(),
+                        "networkxBytes": networkxBytes,
+                        "compactBytes": compactBytes,
+                        "ratio": networkxBytes / compactBytes})
+
+        del topology
+
+    return results
+
+if __name__ == "__main__":
+    print(f"{'k':>4} {'t':>3} {'nodes':>10} {'edges':>10} {'networkx (MB)':>14} {'compact (MB)':>13} {'ratio':>7}")
+
+    for row in compareMemory():
+        print(f"{row['k']:>4} {row['t']:>3} {row['nodes']:>10} {row['edges']:>10} {row['networkxBytes']/2**20:>14.1f} {row['compactBytes']/2**20:>13.1f} {row['ratio']:>7.1f}")
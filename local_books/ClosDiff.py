@@ -0,0 +1,132 @@
+"""
+Author: Peter Willis
+Desc: Structured differences between two states of a folded-Clos topology, as returned by the ClosGenerator mutation methods.
+"""
+
+class TopologyDiff:
+    def __init__(self):
+        """
+        Lists of nodes and links, and dictionaries of addresses, ASNs, and advertised routes, that were added to or removed from
+        a topology. Addresses are keyed by node and then by the neighbor (or "compute") the interface faces, like a node's ipv4 attribute.
+        """
+
+        self.nodesAdded = []
+        self.nodesRemoved = []
+        self.linksAdded = []
+        self.linksRemoved = []
+        self.addressesAdded = {}
+        self.addressesRemoved = {}
+        self.ASNsAdded = {}
+        self.ASNsRemoved = {}
+        self.routesAdded = {}
+        self.routesRemoved = {}
+
+    @staticmethod
+    def getNodeState(topology, node):
+        """
+        Capture the parts of a node's configuration that a diff reports on.
+
+        :param topology: The networkx graph holding the node.
+        :param node: The name of the node.
+        :returns: A dictionary of the node's state, or None if the node doesn't exist.
+        """
+
+        if(node not in topology):
+            return None
+
+        attributes = topology.nodes[node]
+
+        return {"ASN": attributes.get("ASN"),
+                "ipv4": dict(attributes.get("ipv4", {})),
+                "advertise": list(attributes.get("advertise", []))}
+
+    @classmethod
+    def fromChanges(cls, topology, nodesBefore, links):
+        """
+        Build a diff from the earlier state of every node touched by a change and the links that were added or removed.
+
+        :param topology: The networkx graph after the change.
+        :param nodesBefore: A dictionary of node name to its state (see getNodeState) before the change, in the order nodes were touched.
+        :param links: A dictionary of (north node, south node) to 1 if the link was added or -1 if it was removed, in the order links changed.
+        :returns: A TopologyDiff object.
+        """
+
+        diff = cls()
+
+        for link, change in links.items():
+            if(change > 0):
+                diff.linksAdded.append(link)
+            elif(change < 0):
+                diff.linksRemoved.append(link)
+
+        for node, before in nodesBefore.items():
+            after = cls.getNodeState(topology, node)
+
+            if(before is None and after is None):
+                continue
+            elif(before is None):
+                diff.nodesAdded.append(node)
+            elif(after is None):
+                diff.nodesRemoved.append(node)
+
+            before = before or {"ASN": None, "ipv4": {}, "advertise": []}
+            after = after or {"ASN": None, "ipv4": {}, "advertise": []}
+
+            if(before["ASN"] != after["ASN"]):
+                if(before["ASN"] is not None):
+                    diff.ASNsRemoved[node] = before["ASN"]
+                if(after["ASN"] is not None):
+                    diff.ASNsAdded[node] = after["ASN"]
+
+            added = {intf: addr for intf, addr in after["ipv4"].items() if before["ipv4"].get(intf) != addr}
+            removed = {intf: addr for intf, addr in before["ipv4"].items() if after["ipv4"].get(intf) != addr}
+
+            if(added):
+                diff.addressesAdded[node] = added
+            if(removed):
+                diff.addressesRemoved[node] = removed
+
+            added = [route for route in after["advertise"] if route not in before["advertise"]]
+            removed = [route for route in before["advertise"] if route not in after["advertise"]]
+
+            if(added):
+                diff.routesAdded[node] = added
+            if(removed):
+                diff.routesRemoved[node] = removed
+
+        return diff
+
+    def affectedNodes(self):
+        """
+        Get the nodes that still exist and need to be (re)configured because of the change: new nodes and the ends of changed links.
+
+        :returns: A sorted list of node names.
+        """
+
+        affected = set(self.nodesAdded)
+
+        for link in self.linksAdded + self.linksRemoved:
+            affected.update(link)
+
+        affected.update(self.addressesAdded, self.addressesRemoved, self.ASNsAdded, self.routesAdded, self.routesRemoved)
+
+        return sorted(affected - set(self.nodesRemoved))
+
+    def isEmpty(self):
+        return not any(vars(self).values())
+
+    def toDict(self):
+        """
+        :returns: The diff as a JSON-serializable dictionary.
+        """
+
+        diff = {name: value for name, value in vars(self).items()}
+        diff["linksAdded"] = [list(link) for link in self.linksAdded]
+        diff["linksRemoved"] = [list(link) for link in self.linksRemoved]
+
+        return diff
+
+    def __repr__(self):
+        return (f"TopologyDiff(+{len(self.nodesAdded)}/-{len(self.nodesRemoved)} nodes, "
+                f"+{len(self.linksAdded)}/-{len(self.linksRemoved)} links, "
+                f"+{len(self.ASNsAdded)}/-{len(self.ASNsRemoved)} ASNs)")
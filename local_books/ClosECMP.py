@@ -0,0 +1,271 @@
+"""
+Author: Peter Willis
+Desc: Closed-form equal-cost multipath (ECMP) counting and enumeration on a folded-Clos layout. Paths are worked out from the
+      tier, group, and slot of their ends, without searching the graph.
+"""
+
+import numpy as np
+from ClosLayout import ClosLayout
+
+class ClosECMP:
+    def __init__(self, layout):
+        """
+        Count and enumerate the equal-cost paths the fabric routes traffic over, which go north from the source to a node of the
+        lowest tier where their pods meet, and then south to the destination.
+
+        Above the leaves, a node only reaches the nodes of the tiers above whose slot matches its own (its plane), and each of them
+        through a single path. So the paths between two nodes are numbered by the meeting tier nodes in both of their planes, and
+        every one of those nodes is the top of exactly one path. For leaves and compute nodes these are all of the shortest paths.
+        Spines of different planes only meet through a valley (ex: S-1-1 to S-1-2 through a leaf), which routing doesn't use, so
+        they have no paths. Leaves past the tier-2 spines' southbound ports (ex: k=8, t=3, {2:2}) have no uplinks, so they (and their
+        compute nodes) have no paths to anything outside of their leaf.
+
+        :param layout: A ClosLayout object (see ClosGenerator.getLayout). Changes made to a topology after its build aren't in it.
+        """
+
+        self.layout = layout
+        self.numTiers = layout.numTiers
+
+    def getLocation(self, node):
+        """
+        :param node: The name or integer ID of a node.
+        :returns: A tuple of (node ID, tier, group, slot).
+        """
+
+        layout = self.layout
+        nodeId = layout.parseName(node) if isinstance(node, str) else node
+
+        if(not layout.nodeExists(nodeId)):
+            raise ValueError(f"{layout.nodeName(nodeId)} is not in this folded-Clos topology")
+
+        return (nodeId,) + layout.nodeLocation(nodeId)
+
+    def getAncestorGroup(self, tier, group, ancestorTier):
+        """
+        :param tier: The tier of a node.
+        :param group: The group of the node within its tier.
+        :param ancestorTier: A tier at or above the tier-2 spines.
+        :returns: The group at ancestorTier holding the node's pod.
+        """
+
+        layout = self.layout
+
+        # Compute nodes are grouped by leaf, and leaves share the group of the tier-2 spines of their pod.
+        if(tier == ClosLayout.COMPUTE_TIER):
+            group //= layout.groupSize[ClosLayout.LEAF_TIER]
+        for radixTier in range(max(tier, ClosLayout.LOWEST_SPINE_TIER)+1, ancestorTier+1):
+            group //= layout.southboundPorts[radixTier]
+
+        return group
+
+    def getPlaneSize(self, tier):
+        # Leaves and compute nodes reach every node above them, nodes above them only the nodes with the same slot modulo their group size.
+        return self.layout.groupSize[tier] if tier >= ClosLayout.LOWEST_SPINE_TIER else 1
+
+    def hasUplinks(self, location):
+        """
+        :param location: The (node ID, tier, group, slot) tuple of a node.
+        :returns: If the node's traffic can leave its leaf, which only leaves in a slot the tier-2 spines reach can do.
+        """
+
+        if(location[1] > ClosLayout.LEAF_TIER):
+            return True
+
+        leafSlot = self.layout.nodeLocation(self.getPathNode(location, ClosLayout.LEAF_TIER, 0))[2]
+
+        return leafSlot < self.layout.southboundPorts[ClosLayout.LOWEST_SPINE_TIER]
+
+    def getPathNode(self, location, tier, slot):
+        """
+        :param location: The (node ID, tier, group, slot) tuple of an end of the paths.
+        :param tier: A tier between that end and the meeting tier.
+        :param slot: The slot of a path's meeting tier node.
+        :returns: The ID of the node of that path at the given tier, on the side of that end.
+        """
+
+        layout = self.layout
+        nodeId, endTier, group, _ = location
+
+        if(tier == endTier):
+            return nodeId
+        if(tier == ClosLayout.LEAF_TIER):
+            return layout.northNeighbors(nodeId)[0]
+
+        return layout.nodeId(tier, self.getAncestorGroup(endTier, group, tier), slot % layout.groupSize[tier])
+
+    def getMeeting(self, source, destination):
+        """
+        Find where the paths between two nodes turn south.
+
+        :param source: The (node ID, tier, group, slot) tuple of the source.
+        :param destination: The (node ID, tier, group, slot) tuple of the destination.
+        :returns: A tuple of (meeting tier, range of the meeting tier slots that are the top of a path).
+        """
+
+        layout = self.layout
+        sourceTier, destinationTier = source[1], destination[1]
+        upperTier = max(sourceTier, destinationTier)
+
+        if(source[0] == destination[0]):
+            return sourceTier, range(1)
+
+        # Compute nodes of the same leaf, or a leaf and one of its compute nodes, meet at the leaf.
+        if(upperTier <= ClosLayout.LEAF_TIER):
+            leaves = {self.getPathNode(end, ClosLayout.LEAF_TIER, 0) for end in (source, destination)}
+            if(len(leaves) == 1):
+                return ClosLayout.LEAF_TIER, range(1)
+
+        meetingTier = max(upperTier, ClosLayout.LOWEST_SPINE_TIER)
+        while(self.getAncestorGroup(sourceTier, source[2], meetingTier) != self.getAncestorGroup(destinationTier, destination[2], meetingTier)):
+            meetingTier += 1
+
+        if(not (self.hasUplinks(source) and self.hasUplinks(destination))):
+            return meetingTier, range(0)
+
+        # The meeting tier nodes of a path are in the planes of both ends. Planes nest, so the larger plane picks the nodes.
+        sourcePlane, destinationPlane = self.getPlaneSize(sourceTier), self.getPlaneSize(destinationTier)
+        step = max(sourcePlane, destinationPlane)
+        commonPlane = min(sourcePlane, destinationPlane)
+
+        if(source[3] % commonPlane != destination[3] % commonPlane):
+            return meetingTier, range(0)
+
+        start = (source if sourcePlane >= destinationPlane else destination)[3] % step
+
+        return meetingTier, range(start, layout.groupSize[meetingTier], step)
+
+    def countPaths(self, source, destination):
+        """
+        Count the equal-cost paths between two nodes in O(t).
+
+        :param source: The name or integer ID of the source node.
+        :param destination: The name or integer ID of the destination node.
+        :returns: The number of paths.
+        """
+
+        return len(self.getMeeting(self.getLocation(source), self.getLocation(destination))[1])
+
+    def getPathLength(self, source, destination):
+        """
+        :param source: The name or integer ID of the source node.
+        :param destination: The name or integer ID of the destination node.
+        :returns: The number of links in each of the paths, or None if there are no paths.
+        """
+
+        source, destination = self.getLocation(source), self.getLocation(destination)
+        meetingTier, slots = self.getMeeting(source, destination)
+
+        return 2*meetingTier - source[1] - destination[1] if slots else None
+
+    def iterPaths(self, source, destination):
+        """
+        Lazily enumerate the equal-cost paths between two nodes.
+
+        :param source: The name or integer ID of the source node.
+        :param destination: The name or integer ID of the destination node.
+        :returns: Yields one tuple of node names per path, from the source to the destination.
+        """
+
+        source, destination = self.getLocation(source), self.getLocation(destination)
+        meetingTier, slots = self.getMeeting(source, destination)
+        nodeName = self.layout.nodeName
+
+        for slot in slots:
+            north = [self.getPathNode(source, tier, slot) for tier in range(source[1], meetingTier+1)]
+            south = [self.getPathNode(destination, tier, slot) for tier in reversed(range(destination[1], meetingTier))]
+
+            yield tuple(nodeName(nodeId) for nodeId in north + south)
+
+    def iterLinks(self, source, destination):
+        """
+        Lazily enumerate the links used by any of the equal-cost paths between two nodes, each link once.
+        Links are given from the source up to the meeting tier, then from the meeting tier down to the destination.
+
+        :param source: The name or integer ID of the source node.
+        :param destination: The name or integer ID of the destination node.
+        :returns: Yields (north node, south node) tuples of names.
+        """
+
+        source, destination = self.getLocation(source), self.getLocation(destination)
+        meetingTier, slots = self.getMeeting(source, destination)
+
+        if(not slots):
+            return
+
+        for end, tiers in ((source, range(source[1], meetingTier)), (destination, reversed(range(destination[1], meetingTier)))):
+            for tier in tiers:
+                # Every path node of the tier above is linked to one path node of this tier, so each link comes from one slot.
+                for slot in self.getTierSlots(slots, tier+1):
+                    yield self.layout.nodeName(self.getPathNode(end, tier+1, slot)), self.layout.nodeName(self.getPathNode(end, tier, slot))
+
+    def getTierSlots(self, slots, tier):
+        """
+        :param slots: The range of the meeting tier slots that are the top of a path (see getMeeting).
+        :param tier: A tier at or below the meeting tier.
+        :returns: A range of slots, one for each distinct node of the paths at that tier on either side.
+        """
+
+        if(tier < ClosLayout.LOWEST_SPINE_TIER):
+            return range(1)
+
+        # Path nodes at a tier are the meeting slots modulo the tier's group size, which repeat once the step is as large.
+        period = min(slots.step, self.layout.groupSize[tier])
+
+        return range(slots.start % period, self.layout.groupSize[tier], period)
+
+    def getLeaves(self):
+        """
+        :returns: A list of the IDs of every leaf, in layout order.
+        """
+
+        layout = self.layout
+        tier = ClosLayout.LEAF_TIER
+        leaves = range(layout.tierOffset[tier], layout.tierOffset[tier] + layout.tierCount(tier))
+
+        return [leaf for leaf in leaves if layout.nodeExists(leaf)]
+
+    def getLeafGroups(self):
+        """
+        :returns: A tuple of (list of leaf IDs, dictionary of tier to a NumPy array of the group of each leaf's pod at that tier),
+                  with tiers from the tier-2 spines to the tier below the top tier.
+        """
+
+        layout = self.layout
+        leaves = self.getLeaves()
+
+        groups = {ClosLayout.LOWEST_SPINE_TIER: np.array([layout.nodeLocation(leaf)[1] for leaf in leaves], dtype=ClosLayout.ID_TYPE)}
+        for tier in range(ClosLayout.LOWEST_SPINE_TIER+1, self.numTiers):
+            groups[tier] = groups[tier-1] // layout.southboundPorts[tier]
+
+        return leaves, groups
+
+    def getLeafPairs(self):
+        """
+        Count the equal-cost paths between every pair of leaves at once. Leaves are planeless, so two leaves have one path per
+        node of their meeting tier's group.
+
+        :returns: A tuple of (list of leaf names, NumPy matrix of path counts, NumPy matrix of meeting tiers), indexed by leaf.
+                  Path lengths are twice the meeting tier minus two. Pairs with a leaf without uplinks (see hasUplinks) have no paths,
+                  whatever their meeting tier.
+        """
+
+        layout = self.layout
+        leaves, groups = self.getLeafGroups()
+
+        meetingTiers = np.full((len(leaves), len(leaves)), self.numTiers, dtype=np.int8)
+
+        # From the top down, so that each pair is left with the lowest tier whose group holds both leaves.
+        for tier in reversed(range(ClosLayout.LOWEST_SPINE_TIER, self.numTiers)):
+            meetingTiers[groups[tier][:, None] == groups[tier][None, :]] = tier
+
+        np.fill_diagonal(meetingTiers, ClosLayout.LEAF_TIER)
+
+        counts = np.array(layout.groupSize, dtype=np.int64)[meetingTiers]
+
+        hasUplinks = np.array([layout.nodeLocation(leaf)[2] < layout.southboundPorts[ClosLayout.LOWEST_SPINE_TIER] for leaf in leaves], dtype=bool)
+        counts[~hasUplinks, :] = 0
+        counts[:, ~hasUplinks] = 0
+
+        np.fill_diagonal(counts, 1)
+
+        return [layout.nodeName(leaf) for leaf in leaves], counts, meetingTiers
@@ -0,0 +1,296 @@
+"""
+Author: Peter Willis
+Desc: Sweeps of simulated link failures over a folded-Clos fabric. Every core link is failed in each failure mode in a process
+      pool, each result is checkpointed as soon as it comes in so an interrupted sweep can resume, and the links are ranked by
+      how long and how widely the fabric takes to reconverge.
+"""
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from ClosGenerator import BGPDCNConfig, MTPConfig
+from ClosBGPSimulator import BGPSimulator, FAILURE_MODES, HYBRID_FAILURE
+from ClosMTPSimulator import MTPSimulator
+from ClosSweep import CSVTableWriter, ParquetTableWriter
+
+# Generator and simulator classes used for each protocol.
+GENERATORS = {BGPDCNConfig.PROTOCOL: BGPDCNConfig, MTPConfig.PROTOCOL: MTPConfig}
+SIMULATORS = {BGPDCNConfig.PROTOCOL: BGPSimulator, MTPConfig.PROTOCOL: MTPSimulator}
+
+# Columns of the ranked table. overhead is the packet overhead for BGP, and the FAILURE UPDATE overhead for MTP. multiplicity is
+# the number of equivalent links a row stands for (1 unless only distinct links are simulated).
+COLUMNS = ["rank", "node", "neighbor", "nodeTier", "neighborTier", "failureMode", "multiplicity", "reconvergenceTime", "overhead",
+           "withdrawnRoutesOverhead", "addedRoutesOverhead", "effectedNodeCount", "totalNodeCount", "blastRadius",
+           "messagesSent", "messagesLost", "numEvents"]
+
+# Worst links first: by reconvergence time, then overhead, then blast radius.
+RANK_KEYS = ("reconvergenceTime", "overhead", "blastRadius")
+
+# Each worker is given a few chunks of links, so a slow chunk doesn't hold up the end of the sweep.
+CHUNKS_PER_WORKER = 4
+
+# Simulator of this process, built once per worker by loadSimulator.
+simulator = None
+
+def getCoreLinks(topology, distinctOnly=False):
+    """
+    :param topology: A built BGPDCNConfig or MTPConfig object.
+    :param distinctOnly: Only return one link of each class of equivalent links (see ClosGenerator.getLinkOrbits).
+    :returns: A list of ((northbound node, southbound node), multiplicity) tuples, one per link between two network nodes (or
+              class of them), in node order.
+    """
+
+    if(distinctOnly):
+        return topology.getLinkOrbits(noComputeNodes=True)
+
+    graph = topology.clos
+
+    return [((node, south), 1) for node in topology.iterNodes(noComputeNodes=True) if topology.isNetworkNode(node)
+            for south in graph.nodes[node]["southbound"] if topology.isNetworkNode(south)]
+
+def getTasks(topology, failureModes=FAILURE_MODES, bothEnds=False, distinctOnly=False):
+    """
+    :param topology: A built BGPDCNConfig or MTPConfig object.
+    :param failureModes: Failure modes to simulate on every link.
+    :param bothEnds: Hybrid failures only take NODE_TO_FAIL's interface down, so they can also be simulated from the southbound end.
+    :param distinctOnly: Only simulate one link of each class of equivalent links.
+    :returns: A dictionary of (NODE_TO_FAIL, NEIGHBOR_TO_FAIL, failure mode) tuple to the number of links it stands for, in task order.
+    """
+
+    tasks = {}
+    for (north, south), multiplicity in getCoreLinks(topology, distinctOnly):
+        for failureMode in failureModes:
+            tasks[north, south, failureMode] = multiplicity
+
+            if(bothEnds and failureMode == HYBRID_FAILURE):
+                tasks[south, north, failureMode] = multiplicity
+
+    return tasks
+
+def getTaskKey(row):
+    return (row["node"], row["neighbor"], row["failureMode"])
+
+def getGraphHash(topology):
+    """
+    :param topology: A built BGPDCNConfig or MTPConfig object.
+    :returns: A hash of the topology's links, which tells apart fabrics changed after their build (ex: with addLeaf).
+    """
+
+    links = sorted(sorted(link) for link in topology.clos.edges)
+
+    return hashlib.sha256(json.dumps(links).encode()).hexdigest()
+
+def loadSimulator(protocol, k, t, buildArguments, graph, simulatorArguments):
+    """
+    Set up the topology and its simulator once in a worker process. The worker gets the topology's clos graph as it is (changed
+    after its build or read back from a file included), and a generator made with the same arguments takes it over without being
+    built (see ClosGenerator.restoreGraph), so the simulator sees the same fabric as the sweep.
+    """
+
+    global simulator
+
+    topology = GENERATORS[protocol](k, t, **buildArguments)
+    topology.restoreGraph(graph)
+    simulator = SIMULATORS[protocol](topology, **simulatorArguments)
+
+    return
+
+def getResultRow(result, topology):
+    """
+    :param result: A ConvergenceResult or MTPConvergenceResult object.
+    :param topology: The simulated topology.
+    :returns: The result as a row of the ranked table, without its rank.
+    """
+
+    node, neighbor = result.link
+    values = result.toDict()
+
+    row = {column: values[column] for column in ("reconvergenceTime", "effectedNodeCount", "totalNodeCount", "blastRadius",
+                                                 "messagesSent", "messagesLost", "numEvents")}
+    row.update({"node": node, "neighbor": neighbor, "failureMode": result.failureMode,
+                "nodeTier": topology.clos.nodes[node]["tier"], "neighborTier": topology.clos.nodes[neighbor]["tier"],
+                "overhead": values.get("packetOverhead", values.get("overhead")),
+                "withdrawnRoutesOverhead": values.get("withdrawnRoutesOverhead", ""),
+                "addedRoutesOverhead": values.get("addedRoutesOverhead", "")})
+
+    return row
+
+def simulateChunk(tasks, seed):
+    """
+    Simulate a chunk of link failures with the simulator of this process.
+
+    :param tasks: A list of (NODE_TO_FAIL, NEIGHBOR_TO_FAIL, failure mode) tuples.
+    :param seed: Seed of the sweep.
+    :returns: A list of result rows, in task order.
+    """
+
+    rows = []
+    for node, neighbor, failureMode in tasks:
+        # Every failure gets its own timer phase, so a row doesn't depend on which worker ran it or what it ran before.
+        simulator.random.seed(f"{seed}:{node}:{neighbor}:{failureMode}")
+        rows.append(getResultRow(simulator.simulateLinkFailure(node, neighbor, failureMode), simulator.topology))
+
+    return rows
+
+def readCheckpoint(checkpointPath, header):
+    """
+    Read the rows of an earlier run of the same sweep.
+
+    :param checkpointPath: A JSON lines file, the sweep's header followed by one row per line.
+    :param header: The header of this sweep. A checkpoint of a different fabric or simulator can't be resumed.
+    :returns: A dictionary of task key to row, empty if there is no checkpoint.
+    """
+
+    if(not os.path.exists(checkpointPath)):
+        return {}
+
+    rows = {}
+    with open(checkpointPath) as checkpointFile:
+        lines = iter(checkpointFile)
+        savedHeader = json.loads(next(lines, "null"))
+
+        if(savedHeader is not None and savedHeader != header):
+            raise ValueError(f"{checkpointPath} is the checkpoint of a different sweep: {savedHeader}")
+
+        for line in lines:
+            # The last line is cut short if the sweep was killed while writing it, that row is simulated again.
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            rows[getTaskKey(row)] = row
+
+    return rows
+
+def rankRows(rows, rankBy=RANK_KEYS):
+    """
+    Sort result rows worst first and number them.
+
+    :param rows: Result rows.
+    :param rankBy: Columns to sort by, from most to least significant. Larger values rank higher.
+    :returns: The sorted rows, with their rank (starting at 1) set.
+    """
+
+    rows = sorted(rows, key=lambda row: tuple(-row[column] for column in rankBy) + getTaskKey(row))
+
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+
+    return rows
+
+def sweepLinkFailures(topology, outputPath="clos_failure_sweep.csv", checkpointPath=None, failureModes=FAILURE_MODES, bothEnds=False,
+                      distinctOnly=False, workers=None, seed=0, rankBy=RANK_KEYS, **simulatorArguments):
+    """
+    Simulate the failure of every core link of a fabric in each failure mode, in a process pool, and write the links ranked worst
+    first. Every row is appended to a checkpoint as soon as its chunk finishes, and a sweep started again with the same checkpoint
+    only simulates the failures that aren't in it yet.
+
+    Example:
+        topology = BGPDCNConfig(8, 3)
+        topology.buildGraph()
+        sweepLinkFailures(topology, "k8t3_failures.csv", mrai=0.5)
+
+    :param topology: A built BGPDCNConfig or MTPConfig object.
+    :param outputPath: The ranked table. A path ending in .parquet is written as Parquet (requires pyarrow), anything else as CSV.
+    :param checkpointPath: The checkpoint, defaults to outputPath with a .checkpoint.jsonl suffix. It is kept after the sweep.
+    :param failureModes: Failure modes to simulate on every link (see FAILURE_MODES).
+    :param bothEnds: Also simulate hybrid failures from the southbound end of each link (see getTasks).
+    :param distinctOnly: Only simulate one link of each class of equivalent links, each row counting for its whole class.
+    :param workers: Number of worker processes, defaults to the number of CPUs. 1 simulates every failure in this process.
+    :param seed: Seed for the timer phases of the simulations.
+    :param rankBy: Columns to rank the links by (see rankRows).
+    :param simulatorArguments: Keyword arguments of BGPSimulator or MTPSimulator (ex: processingDelay, mrai).
+    :returns: The list of ranked rows.
+    """
+
+    global simulator
+
+    protocol = topology.PROTOCOL
+    if(protocol not in SIMULATORS):
+        raise ValueError(f"Link failures can only be simulated on a {' or '.join(SIMULATORS)} topology, not {protocol}")
+
+    buildArguments = topology.getBuildArguments()
+    header = {"protocol": protocol, "k": topology.sharedDegree, "t": topology.numTiers, "buildArguments": buildArguments,
+              "graphHash": getGraphHash(topology), "simulatorArguments": simulatorArguments, "seed": seed}
+
+    # JSON turns tuples into lists and integer keys into strings, so the header is compared the way it is saved.
+    header = json.loads(json.dumps(header))
+
+    checkpointPath = checkpointPath or os.path.splitext(outputPath)[0] + ".checkpoint.jsonl"
+    completed = readCheckpoint(checkpointPath, header)
+    multiplicities = getTasks(topology, failureModes, bothEnds, distinctOnly)
+    tasks = [task for task in multiplicities if task not in completed]
+
+    checkpointFile = open(checkpointPath, "a+")
+    if(checkpointFile.tell() == 0):
+        checkpointFile.write(json.dumps(header) + "\n")
+    else:
+        # Start after a row that was cut short, instead of running on from it.
+        checkpointFile.seek(checkpointFile.tell() - 1)
+        if(checkpointFile.read(1) != "\n"):
+            checkpointFile.write("\n")
+
+    def checkpoint(rows):
+        for row in rows:
+            checkpointFile.write(json.dumps(row) + "\n")
+            completed[getTaskKey(row)] = row
+
+        checkpointFile.flush()
+
+    def simulateSerially():
+        global simulator
+        simulator = SIMULATORS[protocol](topology, **simulatorArguments)
+
+        for task in tasks:
+            if(task not in completed):
+                checkpoint(simulateChunk([task], seed))
+
+    workers = workers or os.cpu_count()
+
+    try:
+        if(workers == 1 or len(tasks) <= 1):
+            simulateSerially()
+        elif(tasks):
+            chunkSize = max(1, -(-len(tasks) // (workers*CHUNKS_PER_WORKER)))
+            chunks = [tasks[start:start+chunkSize] for start in range(0, len(tasks), chunkSize)]
+            initargs = (protocol, topology.sharedDegree, topology.numTiers, buildArguments, topology.clos, simulatorArguments)
+
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=loadSimulator, initargs=initargs) as executor:
+                    futures = [executor.submit(simulateChunk, chunk, seed) for chunk in chunks]
+
+                    for future in as_completed(futures):
+                        checkpoint(future.result())
+            except BrokenProcessPool:
+                # A worker that died (ex: its simulator couldn't be set up) breaks the whole pool. The failures not simulated yet are
+                # simulated in this process instead, where a real error is raised with its cause.
+                print(f"The worker pool broke, simulating the {sum(task not in completed for task in tasks)} remaining failures in this process")
+                simulateSerially()
+    finally:
+        checkpointFile.close()
+        simulator = None
+
+    # Rows of failures no longer asked for (ex: a narrower list of failure modes) stay in the checkpoint but aren't ranked.
+    rows = rankRows([dict(completed[task], multiplicity=multiplicity) for task, multiplicity in multiplicities.items()], rankBy)
+
+    writerClass = ParquetTableWriter if outputPath.endswith(".parquet") else CSVTableWriter
+    writer = writerClass(outputPath, COLUMNS)
+
+    try:
+        for row in rows:
+            writer.write(row)
+    finally:
+        writer.close()
+
+    return rows
+
+if __name__ == "__main__":
+    topology = BGPDCNConfig(4, 3)
+    topology.buildGraph()
+
+    for row in sweepLinkFailures(topology)[:5]:
+        print(f"{row['rank']}. {row['failureMode']} {row['node']} <--> {row['neighbor']}: {row['reconvergenceTime']} ms, "
+              f"{row['overhead']} bytes, blast radius {row['blastRadius']:.2f}%")
@@ -0,0 +1,204 @@
+"""
+Author: Peter Willis
+Desc: Inverse index from the core links of a folded-Clos to the (source leaf, destination leaf) pairs whose equal-cost paths use
+      them, and selection of the compute pairs a link failure affects the most (ex: for TRAFFIC_GENERATION in BGP_Test/MTP_Test).
+"""
+
+import numpy as np
+from ClosLayout import ClosLayout
+
+class LinkFlowIndex:
+    def __init__(self, ecmp):
+        """
+        Index the leaf pairs whose equal-cost paths (see ClosECMP) cross each core link.
+
+        A link's south end reaches every leaf below it, and a leaf pair only climbs out of the group of those leaves when its other
+        leaf is outside of it, where every path north of the group is used. So the pairs crossing a link northbound are exactly the
+        leaves below it (S) to every other leaf, and southbound every other leaf to S. Instead of a bit per leaf pair, each link is
+        stored as the bitset of S over the leaves, which links under the same group share, and every pair set comes from it.
+
+        :param ecmp: A ClosECMP object (see ClosGenerator.getECMP).
+        """
+
+        self.ecmp = ecmp
+        self.layout = ecmp.layout
+
+        leaves, self.leafGroups = ecmp.getLeafGroups()
+        self.leaves = np.array(leaves, dtype=ClosLayout.ID_TYPE)
+        self.leafNames = [self.layout.nodeName(leaf) for leaf in leaves]
+        self.leafIndex = {leaf: index for index, leaf in enumerate(leaves)}
+        self.numLeaves = len(leaves)
+
+        # Leaves reached from above beyond the number of leaves iterated in a pod have no compute nodes, and leaves beyond the
+        # tier-2 spines' southbound ports have no uplinks, so no pair of theirs crosses a core link.
+        slots = (self.leaves - self.layout.tierOffset[ClosLayout.LEAF_TIER]) % self.layout.groupWidth[ClosLayout.LEAF_TIER]
+        self.hasCompute = slots < self.layout.groupSize[ClosLayout.LEAF_TIER]
+        self.hasUplinks = slots < self.layout.southboundPorts[ClosLayout.LOWEST_SPINE_TIER]
+        self.numUplinkedLeaves = int(self.hasUplinks.sum())
+
+        # Packed leaf bitsets, keyed by the (tier, group) of the links' south end, or (leaf tier, leaf index) for leaf links.
+        self.bitsets = {}
+
+    def getLink(self, nodeA, nodeB):
+        """
+        :param nodeA: The name of one end of a core link.
+        :param nodeB: The name of the other end.
+        :returns: A tuple of the (north node ID, south node ID) of the link.
+        """
+
+        layout = self.layout
+        northId, southId = sorted((layout.parseName(nodeA), layout.parseName(nodeB)), key=layout.nodeTier, reverse=True)
+
+        try:
+            layout.edgeIndex(northId, southId)
+        except KeyError:
+            raise ValueError(f"{nodeA} and {nodeB} are not linked in this folded-Clos topology")
+
+        if(layout.nodeTier(southId) < ClosLayout.LEAF_TIER):
+            raise ValueError(f"{nodeA} <--> {nodeB} is a compute link, not a core link")
+
+        return northId, southId
+
+    def getLinkKey(self, link):
+        tier, group, _ = self.layout.nodeLocation(link[1])
+
+        return (tier, self.leafIndex[link[1]]) if tier == ClosLayout.LEAF_TIER else (tier, group)
+
+    def getLeafMask(self, link):
+        """
+        :param link: A (north node ID, south node ID) tuple (see getLink).
+        :returns: A NumPy boolean array over the leaves, True for the leaves below the link that have uplinks.
+        """
+
+        tier, group = self.getLinkKey(link)
+
+        if(tier == ClosLayout.LEAF_TIER):
+            mask = np.zeros(self.numLeaves, dtype=bool)
+            mask[group] = True
+            return mask
+
+        return (self.leafGroups[tier] == group) & self.hasUplinks
+
+    def getLeafBitset(self, nodeA, nodeB):
+        """
+        :param nodeA: The name of one end of a core link.
+        :param nodeB: The name of the other end.
+        :returns: The packed bitset (NumPy uint8 array, see numpy.packbits) of the leaves below the link, in leaf order.
+        """
+
+        link = self.getLink(nodeA, nodeB)
+        key = self.getLinkKey(link)
+
+        if(key not in self.bitsets):
+            self.bitsets[key] = np.packbits(self.getLeafMask(link))
+
+        return self.bitsets[key]
+
+    def getPairs(self, nodeA, nodeB):
+        """
+        :param nodeA: The name of one end of a core link.
+        :param nodeB: The name of the other end.
+        :returns: A tuple of (northbound, southbound) pair sets, each a (source leaf bitset, destination leaf bitset) tuple whose
+                  product is the set of leaf pairs crossing the link in that direction.
+        """
+
+        below = self.getLeafBitset(nodeA, nodeB)
+        above = np.packbits(~np.unpackbits(below, count=self.numLeaves).astype(bool) & self.hasUplinks)
+
+        return (below, above), (above, below)
+
+    def getPairBitset(self, nodeA, nodeB):
+        """
+        Expand the pairs crossing a link into one bit per leaf pair. This takes a bit per leaf pair, so it's meant for small fabrics.
+
+        :param nodeA: The name of one end of a core link.
+        :param nodeB: The name of the other end.
+        :returns: The packed bitset of every (source leaf, destination leaf) pair, pairs numbered source*numLeaves + destination.
+        """
+
+        below = np.unpackbits(self.getLeafBitset(nodeA, nodeB), count=self.numLeaves).astype(bool)
+        above = ~below & self.hasUplinks
+
+        return np.packbits((np.outer(below, above) | np.outer(above, below)).ravel())
+
+    def countPairs(self, nodeA, nodeB):
+        numBelow = int(np.unpackbits(self.getLeafBitset(nodeA, nodeB), count=self.numLeaves).sum())
+
+        return 2 * numBelow * (self.numUplinkedLeaves - numBelow)
+
+    def getPathShare(self, nodeA, nodeB):
+        """
+        :param nodeA: The name of one end of a core link.
+        :param nodeB: The name of the other end.
+        :returns: The share of the equal-cost paths of each pair crossing the link that go through it, which is the same for every pair.
+        """
+
+        northId, _ = self.getLink(nodeA, nodeB)
+
+        # Every node of the north end's tier in the pair's planes is on as many paths, and leaves are planeless.
+        return 1 / self.layout.groupSize[self.layout.nodeTier(northId)]
+
+    @staticmethod
+    def getFailedLink(failure, neighbor=None):
+        """
+        :param failure: The failure_dict of BGP_Test/MTP_Test (NODE_TO_FAIL first), or a (NODE_TO_FAIL, NEIGHBOR_TO_FAIL) tuple.
+        :param neighbor: NEIGHBOR_TO_FAIL, needed when failure_dict only holds NODE_TO_FAIL (soft and hybrid failures).
+        :returns: A (NODE_TO_FAIL, NEIGHBOR_TO_FAIL) tuple.
+        """
+
+        nodes = list(failure)
+
+        if(neighbor is not None and neighbor not in nodes):
+            nodes.append(neighbor)
+
+        if(len(nodes) != 2):
+            raise ValueError(f"A failed link needs exactly two nodes, got {nodes} (pass NEIGHBOR_TO_FAIL as neighbor)")
+
+        return tuple(nodes)
+
+    def selectTrafficPairs(self, failure, numPairs=2, neighbor=None):
+        """
+        Select the compute pairs whose traffic the failure of a link affects the most, as TRAFFIC_GENERATION of BGP_Test/MTP_Test.
+
+        Every pair crossing the link has the same share of its paths through it (see getPathShare), so pairs sending traffic from
+        NEIGHBOR_TO_FAIL's side into NODE_TO_FAIL come first: with soft MTP failures and hybrid failures only NODE_TO_FAIL stops
+        taking traffic, and the neighbor keeps sending into the link until it notices. Pairs are spread over as many leaves as
+        possible, so that they aren't all hashed onto paths the same way. Only leaf bitsets are read, so selecting takes time linear
+        in the number of leaves and pairs.
+
+        :param failure: The failure_dict of BGP_Test/MTP_Test (NODE_TO_FAIL first), or a (NODE_TO_FAIL, NEIGHBOR_TO_FAIL) tuple.
+        :param numPairs: Number of compute pairs to select.
+        :param neighbor: NEIGHBOR_TO_FAIL, needed when failure_dict only holds NODE_TO_FAIL (soft and hybrid failures).
+        :returns: A list of (source compute node, destination compute node) tuples, at most numPairs long.
+        """
+
+        nodeToFail, neighborToFail = self.getFailedLink(failure, neighbor)
+        link = self.getLink(nodeToFail, neighborToFail)
+
+        mask = np.unpackbits(self.getLeafBitset(nodeToFail, neighborToFail), count=self.numLeaves).astype(bool)
+        below = np.flatnonzero(mask & self.hasCompute)
+        above = np.flatnonzero(~mask & self.hasCompute & self.hasUplinks)
+
+        # Traffic into NODE_TO_FAIL over the link goes south when it is the link's south end, and north when it is the north end.
+        intoNode = (above, below) if self.layout.parseName(nodeToFail) == link[1] else (below, above)
+
+        pairs = []
+        uses = {}
+
+        for sources, destinations in (intoNode, intoNode[::-1]):
+            # Every source takes a turn before any takes a second one, pairing with the next destination each round.
+            for index in range(min(numPairs - len(pairs), len(sources) * len(destinations))):
+                sourceIndex, turn = index % len(sources), index // len(sources)
+                source, destination = sources[sourceIndex], destinations[(sourceIndex + turn) % len(destinations)]
+
+                pairs.append((self.getComputeNode(source, uses), self.getComputeNode(destination, uses)))
+
+        return pairs
+
+    def getComputeNode(self, leaf, uses):
+        # Take turns between the compute nodes of a leaf, so a compute node isn't in more than one pair while others are free.
+        computeNodes = self.layout.southNeighbors(int(self.leaves[leaf]))
+        count = uses.get(leaf, 0)
+        uses[leaf] = count + 1
+
+        return self.layout.nodeName(computeNodes[count % len(computeNodes)])
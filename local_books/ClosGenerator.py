@@ -3,10 +3,22 @@ Author: Peter Willis
 Desc: Class to help build Clos topologies and the node attributes required.
 """
 
+import os
 import networkx as nx
+import numpy as np
 from copy import deepcopy
 from ipaddress import IPv4Network
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from ClosLayout import ClosLayout
+from ClosSerializer import writeJsonGraphInfo, writeBinaryGraphInfo
+from ClosGraphml import writeGraphml, iterGraphml, isClosGraphml
+from ClosAddressing import SubnetPool, formatIPv4
+from ClosAddressIndex import AddressIndex
+from ClosASN import ASNPool, PRIVATE_ASN_RANGES
+from ClosDiff import TopologyDiff
+from ClosStats import ClosStats
+from ClosECMP import ClosECMP
 
 class ClosGenerator:
     # Vertex prefixes to denote position in topology (TOF = Top of Fabric).
@@ -20,6 +32,11 @@ class ClosGenerator:
     LEAF_TIER = 1
     COMPUTE_TIER = 0
 
+    # Engines available to build the graph.
+    BFS_ENGINE = "bfs"
+    VECTORIZED_ENGINE = "vectorized"
+    SHARDED_ENGINE = "sharded"
+
     # To be filled in by subclasses built for a specific network protocol.
     PROTOCOL = None
 
@@ -48,6 +65,18 @@ class ClosGenerator:
         if(southboundPortsConfig):
             self.setSouthboundPorts(southboundPortsConfig)
 
+        # Nodes indexed by tier (and by pod within a tier) as they are added, so exports don't have to scan the graph.
+        self.tierIndex = defaultdict(list)
+        self.podIndex = defaultdict(lambda: defaultdict(list))
+        self.sortedTiers = set()
+
+        # Nodes and links touched by the topology change in progress, see applyChange.
+        self.changedNodes = None
+        self.changedLinks = None
+
+        # Layout the graph was built from. Protocol subclasses address its links by their position in it, see getLayoutLinkIndex.
+        self.buildLayout = None
+
     def isNotValidClosInput(self):
         """
         Checks if the shared degree inputted is an even number and that the number of tiers is at least 2. This confirms that the folded-Clos will have a 1:1 oversubscription ratio.
@@ -142,6 +171,59 @@ class ClosGenerator:
         return
 
     
+    def getPodName(self, node, tier):
+        """
+        Determine the pod a node belongs to from its name. This is the naming prefix shared by the node's group at its tier (ex: S-1-2-1 is in pod 1-2). 
+        Compute nodes are placed in the pod of their leaf, and top-tier nodes are in pod "".
+
+        :param node: The name of the node.
+        :param tier: The tier of the node.
+        :returns: The pod name.
+        """
+
+        podParts = node.split("-")[1:-1]
+
+        if(tier == self.COMPUTE_TIER):
+            podParts = podParts[:-1]
+
+        return "-".join(podParts)
+
+    def indexNode(self, node, tier):
+        """
+        Add a node to the tier and pod indexes. Must be called exactly once per node, when its tier is known.
+
+        :param node: The name of the node.
+        :param tier: The tier of the node.
+        """
+
+        self.tierIndex[tier].append(node)
+        self.podIndex[tier][self.getPodName(node, tier)].append(node)
+        self.sortedTiers.discard(tier)
+
+        return
+
+    def getTierNodes(self, tier, pod=None):
+        """
+        Get the nodes in a tier, or in a pod within that tier, in sorted order. Sorting is done once per tier after nodes are added.
+
+        :param tier: The folded-Clos tier.
+        :param pod: The pod name (see getPodName), or None for the whole tier.
+        :returns: A sorted list of node names. It should not be modified.
+        """
+
+        if(tier not in self.tierIndex):
+            return []
+
+        if(tier not in self.sortedTiers):
+            self.tierIndex[tier].sort()
+
+            for podNodes in self.podIndex[tier].values():
+                podNodes.sort()
+
+            self.sortedTiers.add(tier)
+
+        return self.tierIndex[tier] if pod is None else self.podIndex[tier].get(pod, [])
+
     def connectNodes(self, northNode, southNode, northTier, southTier):
         """
         Connect two nodes together via an edge. The nodes must be in adjacent tiers (ex: tier 2 and tier 3). The nodes also understand if their new neighbor is above them (northbound) or below them (southbound). Subclasses specific to a protocol should override this method with its specific attribute needs beyond north-south interconnection. This base method is provided to simply view the output of a given folded-Clos topology.
@@ -155,8 +237,10 @@ class ClosGenerator:
         # Only add the nodes to the topology if they haven't already been added prior.
         if(northNode not in self.clos):
             self.clos.add_node(northNode, northbound=[], southbound=[], tier=northTier)
+            self.indexNode(northNode, northTier)
         if(southNode not in self.clos):
             self.clos.add_node(southNode, northbound=[], southbound=[], tier=southTier)
+            self.indexNode(southNode, southTier)
         
         # Note that they are connected to each other in the appropriate direction.
         self.clos.nodes[northNode]["southbound"].append(southNode)
@@ -167,12 +251,73 @@ class ClosGenerator:
 
         return
 
-    def buildGraph(self):
+    def getLayout(self):
+        """
+        Get the closed-form layout (node IDs, names, and edges) of the folded-Clos described by this generator.
+
+        :returns: A ClosLayout object.
+        """
+
+        return ClosLayout(self.sharedDegree, self.numTiers, self.southboundPorts)
+
+    def getECMP(self):
+        """
+        Get the closed-form equal-cost multipath engine of the folded-Clos described by this generator. Like the layout, it
+        doesn't need the graph, and doesn't see changes made to the graph after it was built.
+
+        :returns: A ClosECMP object.
+        """
+
+        return ClosECMP(self.getLayout())
+
+    def setBuildLayout(self, layout):
+        """
+        Record the layout the graph is being built from. Subclasses specific to a protocol should override this method to keep the
+        resources given out by position in the layout (see getLayoutLinkIndex) from being handed out to any other link.
+
+        :param layout: A ClosLayout object.
+        """
+
+        self.buildLayout = layout
+
+        return
+
+    def getLayoutLinkIndex(self, northNode, southNode):
+        """
+        Get the position of a link in the layout the graph was built from. The position only depends on the link, not on the order
+        links are connected in, so it can be used to give each link the same resources (ex: a subnet) however the graph is built.
+
+        :param northNode: The node in tier N.
+        :param southNode: The node in tier N-1.
+        :returns: The index of the link, or None if the link is not part of the layout (ex: it was added after the build).
+        """
+
+        if(self.buildLayout is None):
+            return None
+
+        try:
+            return self.buildLayout.edgeIndex(self.buildLayout.parseName(northNode), self.buildLayout.parseName(southNode))
+        except (KeyError, ValueError):
+            return None
+
+    def buildGraph(self, engine=BFS_ENGINE, workers=None):
         """
         Build a folded-Clos with t tiers and each node containing k interfaces. It is built using a modified BFS algorithm, 
         starting with the top tier of the spines and working its way down to the leaf nodes and compute nodes.
+
+        :param engine: The construction engine to use, either "bfs" (default), "vectorized", or "sharded". All of them build the same graph.
+        :param workers: Number of worker processes used by the "sharded" engine, defaults to the number of CPUs.
         """
 
+        self.setBuildLayout(self.getLayout())
+
+        if(engine == self.VECTORIZED_ENGINE):
+            return self.buildGraphVectorized()
+        elif(engine == self.SHARDED_ENGINE):
+            return self.buildGraphSharded(workers)
+        elif(engine != self.BFS_ENGINE):
+            raise ValueError(f"Unknown graph construction engine: {engine}")
+
         k = self.sharedDegree
         t = self.numTiers
 
@@ -235,7 +380,801 @@ class ClosGenerator:
 
                 currentTier -= 1 # Now that the current tier is complete, move down to the next one
         return
+
+    def buildGraphVectorized(self):
+        """
+        Build the same folded-Clos as buildGraph, but compute every node and north/south edge directly from (k, t, southboundPorts) 
+        with array arithmetic instead of a BFS. Protocol attributes such as ASNs and addresses are computed from the same arrays 
+        (see getLayoutAttributes), so they come out identical. A subclass that adds attributes through generateNode/connectNodes 
+        without computing them in getLayoutAttributes has those methods called in the same order the BFS calls them instead.
+        """
+
+        layout = self.getLayout()
+        topTier = self.numTiers
+
+        # Subclasses with node/edge attributes that aren't computed from the layout need every node and edge passed through their methods.
+        if(not self.hasLayoutAttributes()):
+            for tier in reversed(range(self.LEAF_TIER, topTier+1)):
+                north, south = layout.tierEdges(tier)
+                self.connectLayoutEdges(layout, tier, north, south)
+
+            return
+
+        names, tiers, north, south, linkIndexes = self.getLayoutLinks(layout)
+        names = np.array(names, dtype=object)
+        numNodes = len(names)
+
+        northNames = names[north]
+        southNames = names[south]
+
+        # Southbound neighbors are contiguous, as edges are already grouped by their north node.
+        southStart = np.concatenate(([0], np.cumsum(np.bincount(north, minlength=numNodes))))
+
+        # Northbound neighbors are grouped by a stable sort on the south node, keeping the order they were connected in.
+        northOrder = np.argsort(south, kind="stable")
+        northbound = northNames[northOrder]
+        northStart = np.concatenate(([0], np.cumsum(np.bincount(south, minlength=numNodes))))
+
+        nodeOrder = layout.appearanceOrder(north, south).tolist()
+        nodeAttributes, linkAttributes = self.getLayoutAttributes(layout, names, tiers, north, south, linkIndexes, nodeOrder)
+
+        def iterNodes():
+            for node in nodeOrder:
+                attributes = {"northbound": northbound[northStart[node]:northStart[node+1]].tolist(),
+                              "southbound": southNames[southStart[node]:southStart[node+1]].tolist(),
+                              "tier": int(tiers[node])}
+
+                if(nodeAttributes is not None):
+                    attributes.update(nodeAttributes[node])
+
+                yield names[node], attributes
+
+        self.clos.add_nodes_from(iterNodes())
+
+        for node in nodeOrder:
+            self.indexNode(names[node], int(tiers[node]))
+
+        if(linkAttributes is None):
+            self.clos.add_edges_from(zip(northNames.tolist(), southNames.tolist()))
+        else:
+            self.clos.add_edges_from(zip(northNames.tolist(), southNames.tolist(), linkAttributes))
+
+        return
+
+    def hasLayoutAttributes(self):
+        """
+        :returns: If the attributes generateNode and connectNodes give nodes and edges are all computed by getLayoutAttributes, 
+                  which is the case when no class overrides those methods after the last one that overrides getLayoutAttributes.
+        """
+
+        classes = type(self).__mro__
+
+        def getDefiningClass(method):
+            return classes.index(next(cls for cls in classes if method in vars(cls)))
+
+        return getDefiningClass("getLayoutAttributes") <= min(getDefiningClass("generateNode"), getDefiningClass("connectNodes"))
+
+    def getLayoutLinks(self, layout):
+        """
+        Get the nodes and links the vectorized build connects, in the order buildGraph connects them. Subclasses specific to a 
+        protocol should override this method to add the links connectNodes makes outside of the layout (ex: the security link).
+
+        :param layout: A ClosLayout object.
+        :returns: A tuple of (names, tiers, north, south, link indexes). Names and tiers are a list and a NumPy array indexed by node ID,
+                  north and south are NumPy arrays of the node IDs of each link, and link indexes are the position of each link in the
+                  layout (-1 for links outside of it).
+        """
+
+        north, south = layout.edgeArrays()
+
+        return layout.nodeNames(), layout.tierArray(), north, south, np.arange(len(north))
+
+    def getLayoutAttributes(self, layout, names, tiers, north, south, linkIndexes, nodeOrder):
+        """
+        Compute the attributes generateNode and connectNodes give nodes and links beyond north-south interconnection, for the vectorized 
+        build. Subclasses specific to a protocol should override this method along with those methods, handing out the same resources 
+        (and leaving the generator in the same state) as if every link was connected in order.
+
+        :param layout: A ClosLayout object.
+        :param names: The name of each node ID (see getLayoutLinks).
+        :param tiers: The tier of each node ID.
+        :param north: North node IDs of the links.
+        :param south: South node IDs of the links.
+        :param linkIndexes: The position of each link in the layout, -1 for links outside of it.
+        :param nodeOrder: The IDs of the nodes that are part of a link, in the order they are added to the graph.
+        :returns: A tuple of (node attributes, link attributes). Node attributes are a dictionary per node ID (only needed for the IDs in
+                  nodeOrder), link attributes a dictionary per link. Either is None if there aren't any.
+        """
+
+        return None, None
+
+    def getLayoutComputeAddresses(self, names, north, south, linkIndexes):
+        """
+        Address leaf-compute links of the build layout the way addressEdgeNodes does, for subclasses that address them from a compute
+        subnet pool (edgePool, see getLayoutComputeSubnet). Subnets and hosts are computed for every link at once.
+
+        :param names: The name of each node ID.
+        :param north: North (leaf) node IDs of the links, grouped by leaf.
+        :param south: South (compute) node IDs of the links.
+        :param linkIndexes: The position of each link in the build layout.
+        :returns: A tuple of (leaf keys, leaf addresses, compute addresses, prefixes), with a value per link. The leaf key is where the
+                  leaf's ipv4 attribute stores its address, and it and the prefix are None when the link reuses the leaf's compute subnet.
+        """
+
+        pool = self.edgePool
+        subnets, hosts = self.getLayoutComputeSubnet(linkIndexes)
+        hosts = np.broadcast_to(hosts, subnets.shape)
+
+        # Compute nodes take the low host addresses, and can't use the leaf's address.
+        if(len(subnets)):
+            pool.checkSubnet(int(subnets.max()))
+
+            if(hosts.max() >= pool.subnetSize + self.EDGE_NORTH_HOST):
+                raise IndexError(f"No host addresses left for compute nodes in a /{pool.prefixLength} compute subnet")
+
+        # Only the first link of a leaf gives it a subnet if a single compute subnet is used.
+        newSubnet = np.ones(len(north), dtype=bool)
+        if(self.singleComputeSubnet):
+            newSubnet[1:] = north[1:] != north[:-1]
+
+        networks = pool.base + subnets*pool.subnetSize
+        northAddresses = [formatIPv4(address) for address in (networks + self.EDGE_NORTH_HOST % pool.subnetSize).tolist()]
+        southAddresses = [formatIPv4(address) for address in (networks + hosts).tolist()]
+
+        northKeys = [None] * len(north)
+        prefixes = [None] * len(north)
+        nextHost = self.FIRST_EDGE_SOUTH_HOST + self.buildLayout.southboundPorts[self.LEAF_TIER]
+
+        for link in np.flatnonzero(newSubnet).tolist():
+            prefixes[link] = f"{formatIPv4(int(networks[link]))}/{pool.prefixLength}"
+
+            if(self.singleComputeSubnet):
+                northKeys[link] = "compute"
+                self.leafComputeSubnets[names[north[link]]] = [int(subnets[link]), nextHost]
+            else:
+                northKeys[link] = names[south[link]]
+
+        return northKeys, northAddresses, southAddresses, prefixes
                 
+    def connectLayoutEdges(self, layout, tier, north, south):
+        """
+        Generate and connect links of a layout through generateNode and connectNodes, in the order given.
+
+        :param layout: A ClosLayout object.
+        :param tier: The northern tier of the links.
+        :param north: North node IDs of the links.
+        :param south: South node IDs of the links.
+        :returns: A list of (north node, south node) names of the links.
+        """
+
+        topTier = self.numTiers
+        links = []
+
+        northGroup, northSlot = np.divmod(north - layout.tierOffset[tier], layout.groupWidth[tier])
+        southGroup, southSlot = np.divmod(south - layout.tierOffset[tier-1], layout.groupWidth[tier-1])
+
+        northPrefixes = layout.groupPrefixes(tier)
+        southPrefixes = layout.groupPrefixes(tier-1)
+
+        lastNorth = None
+        for northId, northG, northS, southG, southS in zip(north.tolist(), northGroup.tolist(), northSlot.tolist(), southGroup.tolist(), southSlot.tolist()):
+            if(northId != lastNorth):
+                northNode = self.generateNode(northPrefixes[northG], str(northS+1), tier, topTier)
+                lastNorth = northId
+
+            southNode = self.generateNode(southPrefixes[southG], str(southS+1), tier-1, topTier)
+            self.connectNodes(northNode, southNode, tier, tier-1)
+            links.append((northNode, southNode))
+
+        return links
+
+    def getBuildArguments(self):
+        """
+        :returns: The keyword arguments (besides k and t) that create a generator of the same topology.
+        """
+
+        return {"southboundPortsConfig": {tier: self.southboundPorts[tier] for tier in range(self.LEAF_TIER, self.numTiers+1)}}
+
+    def buildGraphSharded(self, workers=None):
+        """
+        Build the same folded-Clos as buildGraph with every pod (see ClosLayout.podEdges) generated in its own worker process. 
+        Resources are given out by position in the layout, so each pod only takes its own slice of them, and the pods are merged 
+        back into one topology in layout order. The result doesn't depend on the number of workers.
+
+        :param workers: Number of worker processes, defaults to the number of CPUs. 1 builds every pod in this process.
+        """
+
+        layout = self.getLayout()
+        arguments = self.getBuildArguments()
+
+        # Links north of the tier-3 spines aren't in any pod, so they are built as a shard of their own.
+        pods = ([None] if layout.upperEdges() else []) + list(range(layout.numPods()))
+        tasks = [(type(self), self.sharedDegree, self.numTiers, arguments, pod) for pod in pods]
+
+        nodeAttributes = {}
+        links = [None] * layout.numEdges()
+        extraLinks = defaultdict(list)
+        executor = None
+
+        try:
+            if(workers == 1):
+                shards = map(buildShard, tasks)
+            else:
+                executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+                shards = executor.map(buildShard, tasks)
+
+            for shardNodes, shardLinks, shardExtraLinks, shardAllocations in shards:
+                for node, attributes in shardNodes:
+                    mergedAttributes = nodeAttributes.setdefault(node, attributes)
+
+                    # Nodes linked from several pods (tier 3 and up) get part of their neighbors and addresses from each, in port order.
+                    if(mergedAttributes is not attributes):
+                        for name, value in attributes.items():
+                            if(isinstance(value, list)):
+                                mergedAttributes[name].extend(value)
+                            elif(isinstance(value, dict)):
+                                mergedAttributes[name].update(value)
+
+                for linkIndex, northNode, southNode, linkAttributes in shardLinks:
+                    links[linkIndex] = (northNode, southNode, linkAttributes)
+
+                for linkIndex, northNode, southNode, linkAttributes in shardExtraLinks:
+                    extraLinks[linkIndex].append((northNode, southNode, linkAttributes))
+
+                self.mergeAllocations(shardAllocations)
+        finally:
+            if(executor):
+                executor.shutdown()
+
+        def iterLinks():
+            for linkIndex, link in enumerate(links):
+                yield link
+                yield from extraLinks.get(linkIndex, ())
+
+        # Adding the links in layout order adds the nodes in the order the BFS generates them.
+        self.clos.add_edges_from(iterLinks())
+
+        for node in list(self.clos):
+            self.restoreNode(node, nodeAttributes[node])
+
+        return
+
+    def prepareShard(self, layout, tierLinks):
+        """
+        Get ready to build one shard of the topology (see buildShard). Subclasses specific to a protocol should override this method
+        to hand out anything not given out by layout position (ex: ASNs) the way a full build would.
+
+        :param layout: The ClosLayout object being built.
+        :param tierLinks: The links of the shard, as a list of (tier, link indexes) tuples (see ClosLayout.podEdges).
+        """
+
+        return
+
+    def getAllocations(self):
+        """
+        Get what the generator has handed out that isn't part of the graph or given out by layout position, to send a shard's
+        allocations back to the main process (see buildShard). Subclasses specific to a protocol should override this method.
+
+        :returns: A dictionary of allocations, as read by mergeAllocations.
+        """
+
+        return {}
+
+    def mergeAllocations(self, allocations):
+        """
+        Take in the allocations of a shard built by another generator (see getAllocations).
+
+        :param allocations: A dictionary of allocations.
+        """
+
+        return
+
+    def buildShard(self, pod):
+        """
+        Build the links of a single pod, as a worker of buildGraphSharded.
+
+        :param pod: The group number of the pod's tier-2 spines, or None for the links north of the tier-3 spines.
+        :returns: A tuple of (nodes, links, extra links, allocations). Nodes is a list of (name, attributes) tuples, holding what the shard's
+                  links gave each node. Links is a list of (layout link index, north node, south node, attributes) tuples. Extra links are
+                  the links connectNodes added outside of the layout (ex: the security link), each with the index of the layout link it 
+                  followed. Allocations are from getAllocations.
+        """
+
+        layout = self.getLayout()
+        self.setBuildLayout(layout)
+
+        tierLinks = layout.upperEdges() if pod is None else layout.podEdges(pod)
+        self.prepareShard(layout, tierLinks)
+
+        links = []
+        for tier, linkIndexes in tierLinks:
+            north, south = layout.tierEdges(tier, linkIndexes)
+            connectedLinks = self.connectLayoutEdges(layout, tier, north, south)
+            links.extend((linkIndex, northNode, southNode, self.clos.edges[northNode, southNode])
+                         for linkIndex, (northNode, southNode) in zip((layout.tierEdgeOffset[tier] + linkIndexes).tolist(), connectedLinks))
+
+        # Links outside of the layout were connected right after the first layout link of their northern node.
+        extraLinks = []
+        if(self.clos.number_of_edges() > len(links)):
+            layoutLinks = {(northNode, southNode) for _, northNode, southNode, _ in links}
+            firstLinks = {}
+            for linkIndex, northNode, _, _ in links:
+                firstLinks.setdefault(northNode, linkIndex)
+
+            for nodeA, nodeB, linkAttributes in self.clos.edges(data=True):
+                northNode, southNode = (nodeA, nodeB) if self.clos.nodes[nodeA]["tier"] > self.clos.nodes[nodeB]["tier"] else (nodeB, nodeA)
+
+                if((northNode, southNode) not in layoutLinks):
+                    extraLinks.append((firstLinks[northNode], northNode, southNode, linkAttributes))
+
+        # Defaultdicts (ex: MTPConfig's ipv4) can't be sent back to the main process. restoreNode turns them back.
+        nodes = [(node, {name: dict(value) if isinstance(value, defaultdict) else value for name, value in attributes.items()})
+                 for node, attributes in self.clos.nodes(data=True)]
+
+        return nodes, links, extraLinks, self.getAllocations()
+
+    def parseNodeName(self, node):
+        """
+        Split a node name back into the parts generateNode builds it from.
+
+        :param node: The name of the node (ex: S-1-2-3).
+        :returns: A tuple of (prefix, node number, tier) (ex: ("-1-2", "3", 2) in a 4-tier topology).
+        """
+
+        title, _, numbers = node.partition("-")
+        numbers = numbers.split("-")
+
+        if(not all(number.isdigit() for number in numbers)):
+            raise ValueError(f"Invalid node name: {node}")
+
+        prefix = "".join(f"-{number}" for number in numbers[:-1])
+
+        if(title == self.TOF_NAME and not prefix):
+            tier = self.numTiers
+        elif(title == self.SPINE_NAME and 0 < len(numbers)-1 <= self.numTiers-self.LOWEST_SPINE_TIER):
+            tier = self.numTiers - (len(numbers)-1)
+        elif(title == self.LEAF_NAME and len(numbers)-1 == self.numTiers-self.LOWEST_SPINE_TIER):
+            tier = self.LEAF_TIER
+        elif(title == self.COMPUTE_NAME and len(numbers)-1 == self.numTiers-self.LEAF_TIER):
+            tier = self.COMPUTE_TIER
+        else:
+            raise ValueError(f"Invalid node name: {node}")
+
+        return prefix, numbers[-1], tier
+
+    def unindexNode(self, node, tier):
+        self.tierIndex[tier].remove(node)
+        self.podIndex[tier][self.getPodName(node, tier)].remove(node)
+
+        return
+
+    def disconnectNodes(self, northNode, southNode):
+        """
+        Remove the edge between two connected nodes, the reverse of connectNodes. Subclasses specific to a protocol should override 
+        this method to also remove the addressing given to the edge.
+
+        :param northNode: The node in tier N.
+        :param southNode: The node in tier N-1.
+        """
+
+        self.clos.nodes[northNode]["southbound"].remove(southNode)
+        self.clos.nodes[southNode]["northbound"].remove(northNode)
+
+        self.clos.remove_edge(northNode, southNode)
+
+        return
+
+    def trackNode(self, node):
+        # Only the state from before the first time a node is touched matters to the diff.
+        if(self.changedNodes is not None and node not in self.changedNodes):
+            self.changedNodes[node] = TopologyDiff.getNodeState(self.clos, node)
+
+        return
+
+    def trackLink(self, northNode, southNode, change):
+        # A link that is added and then removed (or the reverse) in the same change cancels out.
+        if(self.changedLinks is not None):
+            total = self.changedLinks.pop((northNode, southNode), 0) + change
+
+            if(total):
+                self.changedLinks[(northNode, southNode)] = total
+
+        return
+
+    def applyChange(self, change, *args):
+        """
+        Run a mutation of the topology and record what it changed.
+
+        :param change: The method making the change.
+        :returns: A TopologyDiff object.
+        """
+
+        self.changedNodes = {}
+        self.changedLinks = {}
+
+        try:
+            change(*args)
+        finally:
+            diff = TopologyDiff.fromChanges(self.clos, self.changedNodes, self.changedLinks)
+            self.changedNodes = self.changedLinks = None
+
+        return diff
+
+    def linkNodes(self, northNode, southNode):
+        """
+        Connect two nodes, creating either of them first if they don't exist yet. New nodes are generated the same way buildGraph 
+        generates them, so protocol attributes (ASNs, addresses) come from the same pools and existing ones are untouched.
+
+        :param northNode: The name of the node in tier N.
+        :param southNode: The name of the node in tier N-1.
+        """
+
+        northPrefix, northNum, northTier = self.parseNodeName(northNode)
+        southPrefix, southNum, southTier = self.parseNodeName(southNode)
+
+        # Nodes below the compute tier (ex: a security node) can hang off of any tier.
+        if(northTier <= southTier or (northTier-southTier != 1 and southTier >= self.COMPUTE_TIER)):
+            raise ValueError(f"{northNode} (tier {northTier}) cannot be connected north of {southNode} (tier {southTier})")
+        if(self.clos.has_edge(northNode, southNode)):
+            raise ValueError(f"{northNode} and {southNode} are already connected")
+
+        self.trackNode(northNode)
+        self.trackNode(southNode)
+
+        northNode = self.generateNode(northPrefix, northNum, northTier, self.numTiers)
+        southNode = self.generateNode(southPrefix, southNum, southTier, self.numTiers)
+        self.connectNodes(northNode, southNode, northTier, southTier)
+
+        self.trackLink(northNode, southNode, 1)
+
+        return
+
+    def unlinkNodes(self, nodeA, nodeB, keepNodes=()):
+        """
+        Disconnect two nodes. Either node is removed from the topology if it has no links left, unless it is in keepNodes.
+
+        :param nodeA: The name of one node on the link.
+        :param nodeB: The name of the other node on the link.
+        :param keepNodes: Nodes that should stay in the topology even without any links.
+        """
+
+        if(not self.clos.has_edge(nodeA, nodeB)):
+            raise ValueError(f"{nodeA} and {nodeB} are not connected")
+
+        northNode, southNode = (nodeA, nodeB) if self.clos.nodes[nodeA]["tier"] > self.clos.nodes[nodeB]["tier"] else (nodeB, nodeA)
+
+        self.trackNode(northNode)
+        self.trackNode(southNode)
+
+        self.disconnectNodes(northNode, southNode)
+        self.trackLink(northNode, southNode, -1)
+
+        for node in (northNode, southNode):
+            if(self.clos.degree(node) == 0 and node not in keepNodes):
+                self.deleteNode(node)
+
+        return
+
+    def deleteNode(self, node):
+        """
+        Remove a node and all of its links. Neighbors left without any links are removed as well (ex: a leaf's compute nodes).
+
+        :param node: The name of the node.
+        """
+
+        if(node not in self.clos):
+            return
+
+        self.trackNode(node)
+
+        for neighbor in self.clos.nodes[node]["northbound"] + self.clos.nodes[node]["southbound"]:
+            self.unlinkNodes(node, neighbor, keepNodes=(node,))
+
+        self.unindexNode(node, self.clos.nodes[node]["tier"])
+        self.clos.remove_node(node)
+
+        return
+
+    def getPodNode(self, title, pod, nodeNum):
+        return title + (f"-{pod}" if pod else "") + f"-{nodeNum}"
+
+    def getNodeNumber(self, node):
+        return int(node.rsplit("-", 1)[1])
+
+    def getPodSortKey(self, pod):
+        return tuple(int(number) for number in pod.split("-")) if pod else ()
+
+    def getParentPod(self, pod):
+        return pod.rsplit("-", 1)[0] if "-" in pod else ""
+
+    def getNodeSortKey(self, node):
+        return tuple(int(number) for number in node.split("-")[1:])
+
+    def addLink(self, northNode, southNode):
+        """
+        Add a link between two nodes in adjacent tiers. A node that doesn't exist yet is created (ex: a new compute node).
+
+        :param northNode: The name of the node in tier N.
+        :param southNode: The name of the node in tier N-1.
+        :returns: A TopologyDiff object describing the change.
+        """
+
+        return self.applyChange(self.linkNodes, northNode, southNode)
+
+    def removeLink(self, nodeA, nodeB):
+        """
+        Remove the link between two nodes. A node left without any links is removed as well.
+
+        :param nodeA: The name of one node on the link.
+        :param nodeB: The name of the other node on the link.
+        :returns: A TopologyDiff object describing the change.
+        """
+
+        return self.applyChange(self.unlinkNodes, nodeA, nodeB)
+
+    def addLeaf(self, pod=None):
+        """
+        Add a leaf to a pod. It is connected to every tier-2 node of the pod and given as many compute nodes as the leaf tier has southbound ports.
+        Each tier-2 node of the pod needs a free southbound port (see changeSouthboundPorts), otherwise a ValueError is raised.
+
+        :param pod: The pod (see getPodName) to add the leaf to. Only optional for 2-tier topologies, which have a single pod.
+        :returns: A TopologyDiff object describing the change.
+        """
+
+        if(pod is None):
+            if(self.numTiers != self.LOWEST_SPINE_TIER):
+                raise ValueError("A pod must be given to add a leaf to")
+
+            pod = ""
+
+        return self.applyChange(self.createLeaf, pod)
+
+    def createLeaf(self, pod):
+        spines = list(self.getTierNodes(self.LOWEST_SPINE_TIER, pod))
+
+        if(not spines):
+            raise ValueError(f"Pod {pod} does not exist")
+
+        self.checkSouthboundPorts(spines)
+
+        leafNum = max((self.getNodeNumber(leaf) for leaf in self.getTierNodes(self.LEAF_TIER, pod)), default=0) + 1
+        leaf = self.getPodNode(self.LEAF_NAME, pod, leafNum)
+
+        for spine in spines:
+            self.linkNodes(spine, leaf)
+
+        for computeNum in range(1, self.southboundPorts[self.LEAF_TIER]+1):
+            self.linkNodes(leaf, f"{self.COMPUTE_NAME}{leaf.strip(self.LEAF_NAME)}-{computeNum}")
+
+        return
+
+    def removeLeaf(self, leaf):
+        """
+        Remove a leaf, its links, and its compute nodes.
+
+        :param leaf: The name of the leaf.
+        :returns: A TopologyDiff object describing the change.
+        """
+
+        if(leaf not in self.clos or self.clos.nodes[leaf]["tier"] != self.LEAF_TIER):
+            raise ValueError(f"{leaf} is not a leaf in the topology")
+
+        return self.applyChange(self.deleteNode, leaf)
+
+    def addPod(self, parentPod=None):
+        """
+        Add a pod (a tier-2 group of spines, with its leaves and compute nodes) next to the existing pods sharing the same parent.
+        It is wired exactly like the first of those pods, so the northern nodes that pod connects to each gain a southbound link, and
+        a ValueError is raised if any of them has no free southbound port.
+
+        :param parentPod: The prefix shared by the sibling pods (ex: "1" for pods 1-1, 1-2, ...). Defaults to the parent of the last pod.
+        :returns: A TopologyDiff object describing the change.
+        """
+
+        if(self.numTiers == self.LOWEST_SPINE_TIER):
+            raise ValueError("A 2-tier folded-Clos has a single pod")
+
+        return self.applyChange(self.createPod, parentPod)
+
+    def createPod(self, parentPod):
+        pods = sorted((pod for pod, nodes in self.podIndex[self.LOWEST_SPINE_TIER].items() if nodes), key=self.getPodSortKey)
+
+        if(parentPod is None and pods):
+            parentPod = self.getParentPod(pods[-1])
+
+        siblings = [pod for pod in pods if self.getParentPod(pod) == parentPod]
+
+        if(not siblings):
+            raise ValueError(f"There are no pods under {parentPod} to model a new pod on")
+
+        templatePod = siblings[0]
+        newPod = self.generatePrefix(parentPod, str(self.getPodSortKey(siblings[-1])[-1]+1)).lstrip("-")
+
+        def rename(node):
+            # The pod comes right after the title, so only the first match is replaced.
+            return node.replace(f"-{templatePod}-", f"-{newPod}-", 1)
+
+        # Links are added top-down, like buildGraph, so ASNs and subnets are handed out in the same order.
+        spines = sorted(self.getTierNodes(self.LOWEST_SPINE_TIER, templatePod), key=self.getNodeNumber)
+
+        self.checkSouthboundPorts({northNode for spine in spines for northNode in self.clos.nodes[spine]["northbound"]})
+
+        for spine in spines:
+            for northNode in self.clos.nodes[spine]["northbound"]:
+                self.linkNodes(northNode, rename(spine))
+
+        for spine in spines:
+            for leaf in self.clos.nodes[spine]["southbound"]:
+                self.linkNodes(rename(spine), rename(leaf))
+
+        for leaf in sorted(self.getTierNodes(self.LEAF_TIER, templatePod), key=self.getNodeNumber):
+            for computeNode in self.clos.nodes[leaf]["southbound"]:
+                self.linkNodes(rename(leaf), rename(computeNode))
+
+        return
+
+    def removePod(self, pod):
+        """
+        Remove a pod: its tier-2 spines, leaves, compute nodes, and all of their links.
+
+        :param pod: The pod (see getPodName) to remove.
+        :returns: A TopologyDiff object describing the change.
+        """
+
+        if(not self.getTierNodes(self.LOWEST_SPINE_TIER, pod) or self.numTiers == self.LOWEST_SPINE_TIER):
+            raise ValueError(f"Pod {pod} does not exist")
+
+        return self.applyChange(self.deletePod, pod)
+
+    def deletePod(self, pod):
+        for tier in (self.LOWEST_SPINE_TIER, self.LEAF_TIER, self.COMPUTE_TIER):
+            for node in list(self.getTierNodes(tier, pod)):
+                self.deleteNode(node)
+
+        return
+
+    def changeSouthboundPorts(self, tier, ports):
+        """
+        Change the number of southbound ports of a tier in place. Every node of the tier is given that many southbound links, starting
+        from the links it has now, so earlier changes (ex: added or removed leaves and pods) are kept. Links to the highest numbered
+        neighbors are dropped first, and neighbors left without any northbound link are removed with everything below them. New
+        neighbors are existing nodes the node isn't linked to yet, then new nodes built out like buildGraph would (ex: a new leaf
+        gets its compute nodes). Links that are kept, and the addresses and ASNs of nodes that stay, are not changed.
+
+        :param tier: The folded-Clos tier to change.
+        :param ports: The new number of southbound ports for the tier.
+        :returns: A TopologyDiff object describing the change.
+        """
+
+        if(not self.LEAF_TIER <= tier <= self.numTiers or ports < 0):
+            raise ValueError(f"Invalid southbound port change: tier {tier}, {ports} ports")
+
+        return self.applyChange(self.matchSouthboundPorts, tier, ports)
+
+    def matchSouthboundPorts(self, tier, ports):
+        self.southboundPorts[tier] = ports
+
+        for node in list(self.getTierNodes(tier)):
+            self.setSouthboundLinks(node, ports)
+
+        return
+
+    def getSouthboundLinks(self, node):
+        # The security node hangs off of a top-tier node without taking one of its fabric ports.
+        return [southNode for southNode in self.clos.nodes[node]["southbound"] if self.clos.nodes[southNode]["tier"] >= self.COMPUTE_TIER]
+
+    def checkSouthboundPorts(self, nodes):
+        """
+        Make sure nodes have a free southbound port before a change links them to a new node.
+
+        :param nodes: The names of the nodes that would each gain a southbound link.
+        """
+
+        for node in nodes:
+            tier = self.clos.nodes[node]["tier"]
+
+            if(len(self.getSouthboundLinks(node)) >= self.southboundPorts[tier]):
+                raise ValueError(f"{node} has no free southbound port (tier {tier} has {self.southboundPorts[tier]}), "
+                                 f"add ports with changeSouthboundPorts first")
+
+        return
+
+    def setSouthboundLinks(self, node, ports):
+        """
+        Add or drop southbound links of a node until it has the given number of them (see changeSouthboundPorts).
+
+        :param node: The name of the node.
+        :param ports: The number of southbound links it should have.
+        """
+
+        tier = self.clos.nodes[node]["tier"]
+        southNodes = sorted(self.getSouthboundLinks(node), key=self.getNodeSortKey)
+
+        for southNode in reversed(southNodes[ports:]):
+            self.unlinkNodes(node, southNode, keepNodes=(node,))
+            self.pruneNode(southNode)
+
+        for southNode in self.getNewSouthNodes(node, ports - len(southNodes)):
+            isNewNode = southNode not in self.clos
+            self.linkNodes(node, southNode)
+
+            # A new node is built out below, like buildGraph would.
+            if(isNewNode and tier-1 > self.COMPUTE_TIER):
+                self.setSouthboundLinks(southNode, self.southboundPorts[tier-1])
+
+        return
+
+    def pruneNode(self, node):
+        """
+        Remove a node cut off from the north (ex: a leaf dropped by every spine of its pod), and whatever only hangs off of it.
+
+        :param node: The name of the node.
+        """
+
+        if(node not in self.clos or self.clos.nodes[node]["northbound"]):
+            return
+
+        southNodes = list(self.clos.nodes[node]["southbound"])
+        self.deleteNode(node)
+
+        for southNode in southNodes:
+            self.pruneNode(southNode)
+
+        return
+
+    def getNewSouthNodes(self, node, count):
+        """
+        Name the nodes a node should gain southbound links to: existing nodes it would be linked to in a fully built pod first,
+        then new nodes numbered after the existing ones.
+
+        :param node: The name of the node.
+        :param count: The number of southbound links to add.
+        :returns: A list of node names, empty if count isn't positive.
+        """
+
+        if(count <= 0):
+            return []
+
+        tier = self.clos.nodes[node]["tier"]
+        pod = self.getPodName(node, tier)
+        linked = set(self.clos.nodes[node]["southbound"])
+
+        # Compute nodes only belong to their leaf, so the lowest free numbers are used.
+        if(tier == self.LEAF_TIER):
+            computeNodes = [f"{self.COMPUTE_NAME}{node[len(self.LEAF_NAME):]}-{number}" for number in range(1, len(linked)+count+1)]
+            return [computeNode for computeNode in computeNodes if computeNode not in linked][:count]
+
+        # Tier-2 spines link to the leaves of their pod.
+        if(tier == self.LOWEST_SPINE_TIER):
+            leaves = sorted(self.getTierNodes(self.LEAF_TIER, pod), key=self.getNodeSortKey)
+            newNumber = max((self.getNodeNumber(leaf) for leaf in leaves), default=0) + 1
+            candidates = [leaf for leaf in leaves if leaf not in linked]
+            candidates += [self.getPodNode(self.LEAF_NAME, pod, number) for number in range(newNumber, newNumber+count)]
+
+            return candidates[:count]
+
+        # Higher nodes link to the node with their number (modulo the group size below) in each pod under their own.
+        southNodes = self.getSouthboundLinks(node)
+        nodeNum = self.getNodeNumber(southNodes[0]) if southNodes else (self.getNodeNumber(node)-1) % self.getLayout().groupSize[tier-1] + 1
+
+        childPods = sorted((childPod for childPod, nodes in self.podIndex[tier-1].items() if nodes and self.getParentPod(childPod) == pod), key=self.getPodSortKey)
+        newNumber = max((self.getPodSortKey(childPod)[-1] for childPod in childPods), default=0) + 1
+
+        candidates = [self.getPodNode(self.SPINE_NAME, childPod, nodeNum) for childPod in childPods]
+        candidates = [southNode for southNode in candidates if southNode not in linked]
+        candidates += [self.getPodNode(self.SPINE_NAME, self.generatePrefix(pod, str(number)).lstrip("-"), nodeNum) for number in range(newNumber, newNumber+count)]
+
+        return candidates[:count]
+
+    def getStats(self):
+        """
+        Compute exact stats about the folded-Clos topology from its port configuration, without needing the graph.
+
+        :returns: A ClosStats object.
+        """
+
+        return ClosStats(self)
+
     def getClosStats(self):
         """
         Compute stats about the folded-Clos topology built.
@@ -243,19 +1182,7 @@ class ClosGenerator:
         :returns: A string containing a number of facts about the folded-Clos topology.
         """
 
-        numTofNodes = (self.sharedDegree//2)**(self.numTiers-1)
-        numServers = 2*((self.sharedDegree//2)**self.numTiers)
-        numSwitches = ((2*self.numTiers)-1)*((self.sharedDegree//2)**(self.numTiers-1))
-        numLeaves = 2*((self.sharedDegree//2)**(self.numTiers-1))
-        
-        if(self.numTiers == 2):
-            numPods = 1
-        else:
-            numPods = 2*((self.sharedDegree//2)**(self.numTiers-2))
-
-        stats = f"Number of ToF Nodes: {numTofNodes}\nNumber of physical servers: {numServers}\nNumber of networking nodes: {numSwitches}\nNumber of leaves: {numLeaves}\nNumber of Pods: {numPods}\n"
-        
-        return stats
+        return str(self.getStats())
     
     def getNetworks(self):
         """
@@ -276,18 +1203,113 @@ class ClosGenerator:
         return self.clos.nodes
 
     def iterNodes(self, noComputeNodes=False):
-        for node in self.getNodes():
-            if(noComputeNodes and not self.isNetworkNode(node)):
-                continue
-            else:
-                yield node
+        # Network nodes can be pulled straight from the tier index, top tier first.
+        if(noComputeNodes):
+            for tier in reversed(range(self.COMPUTE_TIER+1, self.numTiers+1)):
+                yield from self.getTierNodes(tier)
+
+            return
+
+        yield from self.getNodes()
 
     def isNetworkNode(self, node):
         return self.clos.nodes[node]["tier"] > self.COMPUTE_TIER
-    
+
+    def getSymmetryClasses(self):
+        """
+        Partition the nodes into classes of nodes the fabric's symmetry makes interchangeable (ex: every leaf of an unmodified
+        fabric). Nodes start out grouped by tier and by the number of routes they advertise, and each round splits a class whose
+        nodes see different classes north or south of them, until no class splits. Each round is linear in the number of links,
+        and a folded-Clos settles within a few rounds per tier, so a modified fabric (ex: a removed link) only splits the
+        classes that can tell the change apart.
+
+        :returns: A dictionary of node to class number, classes numbered in the order their first node is iterated.
+        """
+
+        graph = self.clos
+        nodes = list(self.iterNodes())
+        classes = {node: (graph.nodes[node]["tier"], len(graph.nodes[node].get("advertise") or ())) for node in nodes}
+        numClasses = 0
+
+        while(True):
+            signatures = {}
+            refinedClasses = {}
+
+            for node in nodes:
+                signature = (classes[node],
+                             tuple(sorted(classes[north] for north in graph.nodes[node]["northbound"])),
+                             tuple(sorted(classes[south] for south in graph.nodes[node]["southbound"])))
+                refinedClasses[node] = signatures.setdefault(signature, len(signatures))
+
+            # A node's signature holds its class, so a round can only split classes. No split means no later round will either.
+            if(len(signatures) == numClasses):
+                return refinedClasses
+
+            numClasses = len(signatures)
+            classes = refinedClasses
+
+    def getNodeOrbits(self, noComputeNodes=False):
+        """
+        :param noComputeNodes: If only network nodes should be returned.
+        :returns: A list of (representative node, number of nodes in its class) tuples, one per class (see getSymmetryClasses).
+        """
+
+        orbits = {}
+        for node, nodeClass in self.getSymmetryClasses().items():
+            if(noComputeNodes and not self.isNetworkNode(node)):
+                continue
+
+            representative, multiplicity = orbits.get(nodeClass, (node, 0))
+            orbits[nodeClass] = (representative, multiplicity+1)
+
+        return list(orbits.values())
+
+    def getLinkOrbits(self, noComputeNodes=False):
+        """
+        Group the links by the classes of their ends (see getSymmetryClasses), so that failing any link of a group is the same
+        experiment, and only one of them needs to be run.
+
+        :param noComputeNodes: If only links between two network nodes should be returned.
+        :returns: A list of ((north node, south node) representative link, number of links in its class) tuples, one per class.
+        """
+
+        graph = self.clos
+        classes = self.getSymmetryClasses()
+
+        orbits = {}
+        for node in classes:
+            for south in graph.nodes[node]["southbound"]:
+                if(noComputeNodes and not (self.isNetworkNode(node) and self.isNetworkNode(south))):
+                    continue
+
+                linkClass = (classes[node], classes[south])
+                representative, multiplicity = orbits.get(linkClass, ((node, south), 0))
+                orbits[linkClass] = (representative, multiplicity+1)
+
+        return list(orbits.values())
+
     def getNodeAttribute(self, node, attribute, subattribute=None):
         return self.clos.nodes[node][attribute] if subattribute is None else self.clos.nodes[node][attribute][subattribute]
 
+    def getFabricInterfaceName(self, node, neighbor):
+        """
+        :param node: The name of the node.
+        :param neighbor: The neighbor the interface faces, as keyed in the node's ipv4 attribute (ex: "compute").
+        :returns: The name FABRIC gives the interface added by generateFabricIntfName (ex: S-1-1-intf-L-1-1-p1).
+        """
+
+        return f"{node}-intf-{neighbor}-p1"
+
+    def getAddressIndex(self):
+        """
+        Build the reverse index of the topology's IPv4 addresses, mapping each one to its node, neighbor, FABRIC interface, subnet, and
+        type of link. Save it (see AddressIndex.save) alongside experiment results to resolve the addresses in their logs.
+
+        :returns: An AddressIndex object.
+        """
+
+        return AddressIndex.fromTopology(self)
+
     def logGraphInfo(self):
         """
         Output folded-Clos topology information into a log file.
@@ -297,11 +1319,12 @@ class ClosGenerator:
         t = self.numTiers
         topTier = t
 
-        numTofNodes = (k//2)**(t-1)
-        numServers = 2*((k//2)**t)
-        numSwitches = ((2*t)-1)*((k//2)**(t-1))
-        numLeaves = 2*((k//2)**(t-1))
-        numPods = 2*((k//2)**(t-2))
+        stats = self.getStats()
+        numTofNodes = stats.numTofNodes()
+        numServers = stats.numServers()
+        numSwitches = stats.numSwitches()
+        numLeaves = stats.numLeaves()
+        numPods = stats.numPods
         
         with open(f'clos_k{self.sharedDegree}_t{self.numTiers}.log', 'w') as logFile:
             logFile.write("=============\nFOLDED CLOS\nk = {k}, t = {t}\n{k}-port devices with {t} tiers.\n=============\n".format(k=k, t=t))
@@ -313,10 +1336,9 @@ class ClosGenerator:
             logFile.write("Number of Pods: {}\n".format(numPods))
 
             for tier in reversed(range(topTier+1)):
-                nodes = [v for v in self.clos if self.clos.nodes[v]["tier"] == tier]
                 logFile.write("\n== TIER {} ==\n".format(tier))
 
-                for node in sorted(nodes):
+                for node in self.getTierNodes(tier):
                     logFile.write(node)
                     logFile.write("\n\tnorthbound:\n")
                     
@@ -330,76 +1352,205 @@ class ClosGenerator:
                         
         return
 
-    def jsonGraphInfo(self):
-        '''
-        Get a JSON-formatted output of the graph information
-        
-        :returns: JSON object containing the folded-Clos configuration.
-        '''
+    def graphInfoHeader(self):
+        """
+        Get the topology-wide facts that start the JSON-formatted graph information.
+
+        :returns: A dictionary of folded-Clos facts.
+        """
+
+        stats = self.getStats()
+
+        return {"sharedDegree": self.sharedDegree, 
+                "numTiers": self.numTiers,
+                "numTofNodes": stats.numTofNodes(),
+                "numServers": stats.numServers(),
+                "numSwitches": stats.numSwitches(),
+                "numLeaves": stats.numLeaves(),
+                "numPods": stats.numPods}
+
+    def graphInfoTiers(self):
+        """
+        :returns: The tiers included in the graph information, top tier first.
+        """
+
+        return reversed(range(self.numTiers+1))
+
+    def nodeGraphInfo(self, node, tier):
+        """
+        Get the graph information record of a single node.
+
+        :param node: The name of the node.
+        :param tier: The tier of the node.
+        :returns: A dictionary containing the node's configuration.
+        """
+
+        return {"northbound": list(self.clos.nodes[node]["northbound"]), 
+                "southbound": list(self.clos.nodes[node]["southbound"])}
+
+    def jsonGraphInfo(self):
+        '''
+        Get a JSON-formatted output of the graph information
+        
+        :returns: JSON object containing the folded-Clos configuration.
+        '''
+
+        jsonData = self.graphInfoHeader()
+
+        for tier in self.graphInfoTiers():
+            jsonData[f"tier_{tier}"] = {node: self.nodeGraphInfo(node, tier) for node in self.getTierNodes(tier)}
+
+        return jsonData
+
+    def writeGraphInfo(self, fileHandle, binary=False, extraInfo=None, nodeExtras=None):
+        """
+        Stream the graph information to a file, tier by tier and node by node, instead of building it all in memory first.
+        The JSON output is identical to json.dump(jsonGraphInfo()), the binary output can be read back lazily with ClosSerializer.GraphInfoReader.
+
+        :param fileHandle: The file to write to, opened in text mode for JSON or binary mode for the binary format.
+        :param binary: If the compact binary (MessagePack) format should be written instead of JSON.
+        :param extraInfo: A dictionary of additional top-level information (ex: slice name and site), written after the tiers.
+        :param nodeExtras: A function taking a node name and returning a dictionary of additional information for that node (ex: its SSH command).
+        """
+
+        if(binary):
+            writeBinaryGraphInfo(self, fileHandle, extraInfo, nodeExtras)
+        else:
+            writeJsonGraphInfo(self, fileHandle, extraInfo, nodeExtras)
+
+        return
+
+    def saveAsGraphml(self, path=None):
+        """
+        Stream the topology to a GraphML file, including the protocol attributes of its nodes and edges (see ClosGraphml.writeGraphml).
+
+        :param path: The GraphML file to write. Defaults to clos_k{k}_t{t}.graphml.
+        """
+
+        with open(path or f'clos_k{self.sharedDegree}_t{self.numTiers}.graphml', 'w') as graphmlFile:
+            writeGraphml(self, graphmlFile)
+        
+        return
+
+    @classmethod
+    def loadGraphml(cls, path):
+        """
+        Rebuild a topology from a GraphML file written by saveAsGraphml. The file is streamed, so only the rebuilt graph is held in memory.
+        The generator of the topology's protocol is returned, with its address and ASN allocations caught up so the topology can keep being changed.
+
+        :param path: The GraphML file.
+        :returns: A ClosGenerator, BGPDCNConfig, or MTPConfig object.
+        """
+
+        generatorClasses = {generatorClass.PROTOCOL: generatorClass for generatorClass in [ClosGenerator] + ClosGenerator.__subclasses__()}
+        generator = None
+
+        for item in iterGraphml(path):
+            if(item[0] == "graph"):
+                graphAttributes = item[1]
+
+                if(not isClosGraphml(graphAttributes)):
+                    raise ValueError(f"{path} was not written by saveAsGraphml, use ClosGraphml.readGraph to read it")
+
+                generatorClass = generatorClasses.get(graphAttributes.get("protocol"))
+                if(generatorClass is None):
+                    raise ValueError(f"Unknown protocol in {path}: {graphAttributes.get('protocol')}")
+
+                kwargs = {"southboundPortsConfig": {int(tier): ports for tier, ports in graphAttributes.get("southboundPorts", {}).items()}}
+
+                if(generatorClass.PROTOCOL):
+                    kwargs["singleComputeSubnet"] = graphAttributes.get("singleComputeSubnet", False)
+                if(graphAttributes.get("hasSecurityNode")):
+                    kwargs["addSecurityNode"] = True
+                if(graphAttributes.get("corePrefixLength")):
+                    kwargs["corePrefixLength"] = graphAttributes["corePrefixLength"]
+                if(graphAttributes.get("unnumbered")):
+                    kwargs["unnumbered"] = True
+
+                generator = generatorClass(graphAttributes["sharedDegree"], graphAttributes["numTiers"], **kwargs)
+
+            elif(item[0] == "node"):
+                generator.restoreNode(item[1], item[2])
+            else:
+                generator.clos.add_edge(item[1], item[2], **item[3])
+
+        generator.restoreAllocations()
+
+        return generator
+
+    def restoreNode(self, node, attributes):
+        """
+        Add a node read back from a file, with the attributes connectNodes would have given it.
+
+        :param node: The name of the node.
+        :param attributes: A dictionary of the node's attributes.
+        """
+
+        attributes.setdefault("northbound", [])
+        attributes.setdefault("southbound", [])
+
+        self.clos.add_node(node, **attributes)
+        self.indexNode(node, attributes["tier"])
 
-        jsonData = {"sharedDegree": self.sharedDegree, 
-                    "numTiers": self.numTiers,
-                    "numTofNodes": (self.sharedDegree//2)**(self.numTiers-1),
-                    "numServers": 2*((self.sharedDegree//2)**self.numTiers),
-                    "numSwitches": ((2*self.numTiers)-1)*((self.sharedDegree//2)**(self.numTiers-1)),
-                    "numLeaves": 2*((self.sharedDegree//2)**(self.numTiers-1)),
-                    "numPods": 2*((self.sharedDegree//2)**(self.numTiers-2))}
+        return
 
-        for tier in reversed(range(self.numTiers+1)):
-            nodes = [v for v in self.clos if self.clos.nodes[v]["tier"] == tier]
-            jsonData[f"tier_{tier}"] = {}
+    def restoreGraph(self, graph):
+        """
+        Take over the graph of a topology of this generator's protocol (ex: unpickled in another process) in place of the graph of a
+        generator that wasn't built, along with any change made to it after its build.
 
-            for node in sorted(nodes):
-                jsonData[f"tier_{tier}"][node] = {"northbound": [], "southbound": []}
+        :param graph: The clos graph of a topology, made with the same arguments as this generator.
+        """
 
-                for northNode in self.clos.nodes[node]["northbound"]:
-                    jsonData[f"tier_{tier}"][node]["northbound"].append(northNode)
+        self.clos = graph
 
-                for southNode in self.clos.nodes[node]["southbound"]:
-                    jsonData[f"tier_{tier}"][node]["southbound"].append(southNode)
+        for node, tier in graph.nodes(data="tier"):
+            self.indexNode(node, tier)
 
+        self.restoreAllocations()
 
-        return jsonData
+        return
 
-    def saveAsGraphml(self):
-        SMALL_PADDING = " " * 2
-        LARGE_PADDING = " " * 4
-        
-        with open(f'clos_k{self.sharedDegree}_t{self.numTiers}.graphml', 'w') as graphmlFile:
-            graphmlFile.write("<?xml version='1.0' encoding='utf-8'?>\n")
-            graphmlFile.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
-            graphmlFile.write(f'{SMALL_PADDING}<graph edgedefault="undirected">\n')
-            
-            # Fill in the nodes first
-            for node in self.getNodes():
-                graphmlFile.write(f'{LARGE_PADDING}<node id="{node}" />\n'.rjust(4))
+    def restoreAllocations(self):
+        """
+        Catch up the generator's allocations with a topology read back from a file. Subclasses specific to a protocol should override 
+        this method so the addresses and ASNs already in use are not handed out again.
+        """
 
-            # Then the edges
-            for node in self.getNetworks():
-                graphmlFile.write(f'{LARGE_PADDING}<edge source="{node[0]}" target="{node[1]}" />\n')
-                
-            graphmlFile.write(f"{SMALL_PADDING}</graph>\n</graphml>")
-        
         return
 
 class BGPDCNConfig(ClosGenerator):
     # BGP constants.
     PROTOCOL = "BGP"
-    PRIVATE_ASN_RANGE_START = 64512
+    PRIVATE_ASN_RANGES = PRIVATE_ASN_RANGES # 2-byte private ASNs first, then 4-byte ones.
 
     # IPv4 network constants.
     LEAF_SPINE_SUPERNET = '172.16.0.0/12'
     COMPUTE_SUPERNET = '192.168.0.0/16'
     LEAF_SPINE_SUBNET_BITS = 12
     COMPUTE_SUBNET_BITS = 8
-    NEXT_SUBNET = 0
+    FIRST_COMPUTE_SUBNET = 1 # Subnet 0 is not used for experiment purposes.
+
+    # Host offsets within a subnet. Negative offsets count back from the broadcast address.
+    CORE_NORTH_HOST = 1
+    CORE_SOUTH_HOST = 2
+    EDGE_NORTH_HOST = -2
+    FIRST_EDGE_SOUTH_HOST = 1
+
+    # RFC 3021 point-to-point core links have no network or broadcast address, so both hosts are used.
+    POINT_TO_POINT_PREFIX_LENGTH = 31
+    POINT_TO_POINT_NORTH_HOST = 0
+    POINT_TO_POINT_SOUTH_HOST = 1
+
+    # Shown in place of the address of a core interface when core links are unnumbered.
+    UNNUMBERED_ADDRESS = "unnumbered"
 
     # Security node Constants.
     FIRST_TOF_NODE_NAME = "T-1"
     SEC_NAME = "H" # H for hacker.
     SEC_TIER = -1
 
-    def __init__(self, k, t, southboundPortsConfig=None, singleComputeSubnet=False, addSecurityNode=False):
+    def __init__(self, k, t, southboundPortsConfig=None, singleComputeSubnet=False, addSecurityNode=False, corePrefixLength=None, unnumbered=False):
         """
         Initializes a graph and its data structures to hold network information.
 
@@ -407,28 +1558,356 @@ class BGPDCNConfig(ClosGenerator):
         :param t: Number of tiers in the graph.
         :param name: The name you want to give the topology.
         "param singleComputeSubnet: If only one compute subnet should be attached to a leaf node.
+        :param corePrefixLength: Prefix length of each core (leaf-spine and spine-spine) subnet, /24 by default. /30 or /31 (RFC 3021)
+                                 subnets fit 64 or 128 times as many core links in the core supernet.
+        :param unnumbered: If core links should not be given IPv4 addresses. BGP then peers over the IPv6 link-local addresses of the 
+                           interfaces (RFC 5549), and only leaf-compute links are addressed.
         """
 
         # Call superclass constructor to get graph setup
         super().__init__(k, t, southboundPortsConfig)
 
-        # Configure how BGP will assign ASNs and IPv4 addressing
-        self.ASNAssignment = {None : None}
-        self.currentASN = self.PRIVATE_ASN_RANGE_START
+        # Configure how BGP will assign ASNs and IPv4 addressing. Spine pods and leaves (see getASNKey) are mapped to their ASN.
+        self.ASNAssignment = {}
+        self.asnPool = ASNPool(self.PRIVATE_ASN_RANGES)
        
-        # Define the address space for the core and edge networks
-        self.coreNetworks = list(IPv4Network(self.LEAF_SPINE_SUPERNET).subnets(prefixlen_diff=self.LEAF_SPINE_SUBNET_BITS))
+        # Define the address space for the core and edge networks. Subnets are only ever computed from their index.
+        coreSupernetLength = IPv4Network(self.LEAF_SPINE_SUPERNET).prefixlen
+        self.corePrefixLength = corePrefixLength or coreSupernetLength + self.LEAF_SPINE_SUBNET_BITS
 
-        self.edgeNetworks = list(IPv4Network(self.COMPUTE_SUPERNET).subnets(prefixlen_diff=self.COMPUTE_SUBNET_BITS))
-        self.edgeNetworks.pop(self.NEXT_SUBNET) # remove subnet 0 for experiment purposes
+        if(not coreSupernetLength <= self.corePrefixLength <= self.POINT_TO_POINT_PREFIX_LENGTH):
+            raise ValueError(f"Core prefix length must be between /{coreSupernetLength} and /{self.POINT_TO_POINT_PREFIX_LENGTH}, not /{self.corePrefixLength}")
+
+        self.corePool = SubnetPool(self.LEAF_SPINE_SUPERNET, self.corePrefixLength - coreSupernetLength)
+        self.edgePool = SubnetPool(self.COMPUTE_SUPERNET, self.COMPUTE_SUBNET_BITS, firstSubnet=self.FIRST_COMPUTE_SUBNET)
+
+        self.unnumbered = unnumbered
+
+        if(self.corePrefixLength == self.POINT_TO_POINT_PREFIX_LENGTH):
+            self.coreHosts = (self.POINT_TO_POINT_NORTH_HOST, self.POINT_TO_POINT_SOUTH_HOST)
+        else:
+            self.coreHosts = (self.CORE_NORTH_HOST, self.CORE_SOUTH_HOST)
         
-        # If only one compute subnet should be hanging off a leaf, then each leaf needs to be given a specific subnet
+        # If only one compute subnet should be hanging off a leaf, then each leaf needs to be given a specific subnet.
+        # Leaves are mapped to [subnet index, next host offset to hand out].
         self.singleComputeSubnet = singleComputeSubnet
         self.leafComputeSubnets = {}
 
         # A security node can be added to a top-tier node if desired.
         self.addSecNode = True if addSecurityNode else False
+        self.hasSecurityNode = self.addSecNode # addSecNode is cleared once the node is added, this is not.
+
+        # The build keeps the first compute subnet for the security link, which only it may take, and only once.
+        self.securitySubnetFree = False
         
+    def getBuildArguments(self):
+        arguments = super().getBuildArguments()
+        arguments.update({"singleComputeSubnet": self.singleComputeSubnet,
+                          "addSecurityNode": self.hasSecurityNode,
+                          "corePrefixLength": self.corePrefixLength,
+                          "unnumbered": self.unnumbered})
+
+        return arguments
+
+    def getASNKey(self, node):
+        # Spines in a pod share an ASN and every leaf has its own (see generateNode).
+        return node if node.startswith(self.LEAF_NAME + "-") else node[:node.rfind("-")+1]
+
+    def getLayoutASNIndex(self, layout, tier, group, slot):
+        """
+        Compute the index (in the ASN pool) of the ASN generateNode gives a node of a layout from its position. ASNs are handed out in 
+        the order the BFS generates nodes: the top tier shares the first one, then the pods of each spine tier get one each, then every
+        leaf gets its own.
+
+        :param layout: A ClosLayout object.
+        :param tier: The tier of a spine or leaf node.
+        :param group: The group (pod) of the node in its tier.
+        :param slot: The slot of the node in its group.
+        :returns: The index of the ASN.
+        """
+
+        ports = layout.southboundPorts[layout.LOWEST_SPINE_TIER]
+
+        # Number of ASNs given out before the tier: one for the top tier, then one per pod of every spine tier above it.
+        offset = 1 + sum(layout.numGroups[upperTier] for upperTier in range(max(tier+1, layout.LOWEST_SPINE_TIER), layout.numTiers))
+
+        if(tier == layout.numTiers):
+            return 0
+        elif(tier > layout.LEAF_TIER):
+            return offset + group
+
+        # Leaves linked to the tier-2 spines are generated by them, the rest when the leaf tier is walked.
+        elif(slot < ports):
+            return offset + group*ports + slot
+        else:
+            extraLeaves = layout.groupSize[tier] - ports
+            return offset + layout.numGroups[tier]*ports + group*extraLeaves + (slot - ports)
+
+    def getLayoutASNCount(self, layout):
+        """
+        :param layout: A ClosLayout object.
+        :returns: The number of ASNs given out by position in the layout (see getLayoutASNIndex).
+        """
+
+        spineGroups = sum(layout.numGroups[tier] for tier in range(layout.LOWEST_SPINE_TIER, layout.numTiers))
+
+        return 1 + spineGroups + layout.tierCount(layout.LEAF_TIER)
+
+    def getLayoutASNLocation(self, layout, index):
+        """
+        Find the nodes of a layout given an ASN by position, the inverse of getLayoutASNIndex.
+
+        :param layout: A ClosLayout object.
+        :param index: The index of the ASN.
+        :returns: A tuple of (tier, group, slots), or None if no position of the layout is given the ASN.
+        """
+
+        t = layout.numTiers
+
+        if(index == 0):
+            return t, 0, range(layout.groupWidth[t])
+
+        offset = 1
+        for tier in reversed(range(layout.LOWEST_SPINE_TIER, t)):
+            if(index < offset + layout.numGroups[tier]):
+                return tier, index - offset, range(layout.groupWidth[tier])
+
+            offset += layout.numGroups[tier]
+
+        index -= offset
+        ports = layout.southboundPorts[layout.LOWEST_SPINE_TIER]
+        numGroups = layout.numGroups[layout.LEAF_TIER]
+        extraLeaves = layout.groupSize[layout.LEAF_TIER] - ports
+
+        if(index < numGroups*ports):
+            group, slot = divmod(index, ports)
+        elif(extraLeaves > 0 and index < numGroups*(ports + extraLeaves)):
+            group, slot = divmod(index - numGroups*ports, extraLeaves)
+            slot += ports
+        else:
+            return None
+
+        return layout.LEAF_TIER, group, range(slot, slot+1)
+
+    def getLayoutASN(self, layout, nodeId):
+        """
+        Compute the ASN generateNode gives a node of a layout from its position (see getLayoutASNIndex).
+
+        :param layout: A ClosLayout object.
+        :param nodeId: The integer ID of a spine or leaf node in the layout.
+        :returns: The ASN.
+        """
+
+        return self.asnPool.getASN(self.getLayoutASNIndex(layout, *layout.nodeLocation(nodeId)))
+
+    def getLayoutTierASNs(self, layout, tier):
+        """
+        Compute the ASN of every node of a tier of a layout at once (see getLayoutASNIndex).
+
+        :param layout: A ClosLayout object.
+        :param tier: The tier of the spines or leaves.
+        :returns: A NumPy array of the ASN of each slot of the tier, in node ID order.
+        """
+
+        groups, slots = np.divmod(np.arange(layout.tierCount(tier)), layout.groupWidth[tier])
+        ports = layout.southboundPorts[layout.LOWEST_SPINE_TIER]
+        offset = 1 + sum(layout.numGroups[upperTier] for upperTier in range(max(tier+1, layout.LOWEST_SPINE_TIER), layout.numTiers))
+
+        if(tier == layout.numTiers):
+            indexes = np.zeros(len(slots), dtype=np.int64)
+        elif(tier > layout.LEAF_TIER):
+            indexes = offset + groups
+        else:
+            extraLeaves = layout.groupSize[tier] - ports
+            indexes = np.where(slots < ports, offset + groups*ports + slots, offset + layout.numGroups[tier]*ports + groups*extraLeaves + (slots - ports))
+
+        return self.asnPool.getASNs(indexes)
+
+    def getNewASN(self, node):
+        """
+        :param node: The name of a spine or leaf that doesn't have an ASN yet.
+        :returns: The ASN of its position in the build layout, or the next unused one for nodes outside of it (ex: a pod added later).
+        """
+
+        if(self.buildLayout is not None):
+            try:
+                return self.getLayoutASN(self.buildLayout, self.buildLayout.parseName(node))
+            except ValueError:
+                pass
+
+        return self.asnPool.allocate()
+
+    def getASNNodes(self, ASN):
+        """
+        Reverse ASN lookup, ex: to tell which nodes the AS_PATH of a captured UPDATE went through.
+
+        :param ASN: An ASN of the topology.
+        :returns: The names of the nodes given the ASN (the spines of a pod, or a single leaf). Empty if no node has it.
+        """
+
+        layout = self.buildLayout
+
+        # ASNs given out by position are found by formula.
+        if(layout is not None and self.asnPool.contains(ASN) and self.asnPool.getIndex(ASN) < self.getLayoutASNCount(layout)):
+            location = self.getLayoutASNLocation(layout, self.asnPool.getIndex(ASN))
+
+            if(location is not None):
+                tier, group, slots = location
+                names = (layout.nodeName(layout.nodeId(tier, group, slot)) for slot in slots)
+                return [name for name in names if name in self.clos and self.clos.nodes[name]["ASN"] == ASN]
+
+        # The rest (ex: a pod added after the build, or a topology read from a file) are looked up in the graph.
+        return [node for node, nodeASN in self.clos.nodes(data="ASN") if nodeASN == ASN]
+
+    def getASPathNodes(self, ASPath):
+        """
+        Translate an AS_PATH into the nodes it went through.
+
+        :param ASPath: The ASNs of the path, as a list or as a space-separated string (ex: "64513 64512 64514").
+        :returns: A list holding the names of the nodes given each ASN of the path (see getASNNodes).
+        """
+
+        if(isinstance(ASPath, str)):
+            ASPath = ASPath.split()
+
+        return [self.getASNNodes(int(ASN)) for ASN in ASPath]
+
+    def prepareShard(self, layout, tierLinks):
+        # ASNs are computed from the position of each node (see getNewASN), so only the security node needs to be placed.
+        # Only the shard with the first link of T-1 connects it.
+        self.addSecNode = self.addSecNode and any(layout.tierEdgeOffset[tier] == 0 and 0 in linkIndexes for tier, linkIndexes in tierLinks)
+
+        return
+
+    def getAllocations(self):
+        return {"ASNAssignment": self.ASNAssignment, "leafComputeSubnets": self.leafComputeSubnets}
+
+    def mergeAllocations(self, allocations):
+        self.ASNAssignment.update(allocations["ASNAssignment"])
+        self.leafComputeSubnets.update(allocations["leafComputeSubnets"])
+
+        # The security node is in whichever shard has the first link of T-1, along with the subnet kept for it.
+        self.addSecNode = False
+        self.securitySubnetFree = False
+
+        return
+
+    def setBuildLayout(self, layout):
+        super().setBuildLayout(layout)
+
+        # Layout compute subnets start after the first one when the build adds a security node (see getLayoutComputeSubnet).
+        self.securitySubnetFree = self.addSecNode
+
+        # Links of the layout are given subnets by their position, so links added later get subnets after all of them. Same for ASNs.
+        self.corePool.reserve(layout.tierEdgeOffset[self.LEAF_TIER])
+        self.edgePool.reserve(self.getLayoutComputeSubnet(layout.numEdges())[0])
+        self.asnPool.reserve(self.getLayoutASNCount(layout))
+
+        return
+
+    def getLayoutComputeSubnet(self, linkIndex):
+        """
+        Compute the subnet and compute node host offset of a leaf-compute link from its position in the build layout. The security link 
+        takes the first compute subnet, then every link (or every leaf, if a single compute subnet is used) gets the next one in layout order.
+
+        :param linkIndex: The index of the link in the build layout (see getLayoutLinkIndex), or a NumPy array of them.
+        :returns: A tuple of (subnet index, host offset). The subnet index is a NumPy array if linkIndex is one, and so is the host offset if a single compute subnet is used.
+        """
+
+        layout = self.buildLayout
+        computeIndex = linkIndex - layout.tierEdgeOffset[self.LEAF_TIER]
+        firstSubnet = self.FIRST_COMPUTE_SUBNET + (1 if self.hasSecurityNode else 0)
+
+        if(self.singleComputeSubnet):
+            leafIndex, port = divmod(computeIndex, max(layout.southboundPorts[self.LEAF_TIER], 1))
+            return firstSubnet + leafIndex, self.FIRST_EDGE_SOUTH_HOST + port
+
+        return firstSubnet + computeIndex, self.FIRST_EDGE_SOUTH_HOST
+
+    def getLayoutLinks(self, layout):
+        names, tiers, north, south, linkIndexes = super().getLayoutLinks(layout)
+
+        # The security node hangs off of T-1, and is connected right after T-1's first link (see connectNodes).
+        if(self.addSecNode and len(north) > 0 and names[north[0]] == self.FIRST_TOF_NODE_NAME):
+            securityNode = len(names)
+            names = names + [f"{self.SEC_NAME}-1"]
+            tiers = np.append(tiers, self.SEC_TIER)
+            north = np.insert(north, 1, north[0])
+            south = np.insert(south, 1, securityNode)
+            linkIndexes = np.insert(linkIndexes, 1, -1)
+
+        return names, tiers, north, south, linkIndexes
+
+    def getLayoutAttributes(self, layout, names, tiers, north, south, linkIndexes, nodeOrder):
+        # Spines and leaves get the ASN of their position, compute and security nodes don't get one.
+        ASNs = [None] * len(names)
+        for tier in range(self.LEAF_TIER, layout.numTiers+1):
+            start = layout.tierOffset[tier]
+            ASNs[start:start + layout.tierCount(tier)] = self.getLayoutTierASNs(layout, tier).tolist()
+
+        nodeAttributes = [None] * len(names)
+        for node in nodeOrder:
+            if(ASNs[node] is not None):
+                self.ASNAssignment.setdefault(self.getASNKey(names[node]), ASNs[node])
+
+            nodeAttributes[node] = {"ASN": ASNs[node], "ipv4": {}, "advertise": []}
+
+        isComputeNetwork = tiers[south] <= self.COMPUTE_TIER
+        linkAttributes = [{"computeNetwork": computeNetwork} for computeNetwork in isComputeNetwork.tolist()]
+
+        # The address (and key) of the north and south interface of every link, and the subnet the north node advertises, if any.
+        numLinks = len(north)
+        northKeys = np.full(numLinks, None, dtype=object)
+        northAddresses = np.full(numLinks, None, dtype=object)
+        southAddresses = np.full(numLinks, None, dtype=object)
+        prefixes = np.full(numLinks, None, dtype=object)
+
+        # Core links get the subnet of their position in the layout (see addressCoreNodes).
+        core = np.flatnonzero(~isComputeNetwork)
+        if(len(core) and not self.unnumbered):
+            pool = self.corePool
+            pool.checkSubnet(int(linkIndexes[core].max()))
+
+            networks = pool.base + linkIndexes[core]*pool.subnetSize
+            northHost, southHost = self.coreHosts
+
+            northKeys[core] = names[south[core]]
+            northAddresses[core] = [formatIPv4(address) for address in (networks + northHost).tolist()]
+            southAddresses[core] = [formatIPv4(address) for address in (networks + southHost).tolist()]
+
+        # The security link takes the first compute subnet, kept for it by the build (see addressEdgeNodes).
+        security = np.flatnonzero(isComputeNetwork & (linkIndexes < 0)).tolist()
+        for link in security:
+            subnet = self.FIRST_COMPUTE_SUBNET if self.securitySubnetFree else self.edgePool.allocate()
+            self.securitySubnetFree = self.addSecNode = False
+
+            northNode = names[north[link]]
+            if(self.singleComputeSubnet):
+                northKeys[link] = "compute"
+                self.leafComputeSubnets[northNode] = [subnet, self.FIRST_EDGE_SOUTH_HOST + 1]
+            else:
+                northKeys[link] = names[south[link]]
+
+            northAddresses[link] = self.edgePool.getAddress(subnet, self.EDGE_NORTH_HOST)
+            southAddresses[link] = self.edgePool.getAddress(subnet, self.FIRST_EDGE_SOUTH_HOST)
+            prefixes[link] = self.edgePool.getPrefix(subnet)
+
+        compute = np.flatnonzero(isComputeNetwork & (linkIndexes >= 0))
+        if(len(compute)):
+            northKeys[compute], northAddresses[compute], southAddresses[compute], prefixes[compute] = \
+                self.getLayoutComputeAddresses(names, north[compute], south[compute], linkIndexes[compute])
+
+        # Interfaces are stored in the order their links are connected.
+        for northNode, southNode, northKey, northAddress, southAddress, prefix in zip(north.tolist(), south.tolist(), northKeys.tolist(), northAddresses.tolist(), southAddresses.tolist(), prefixes.tolist()):
+            if(northKey is not None):
+                nodeAttributes[northNode]["ipv4"][northKey] = northAddress
+            if(southAddress is not None):
+                nodeAttributes[southNode]["ipv4"][names[northNode]] = southAddress
+            if(prefix is not None):
+                nodeAttributes[northNode]["advertise"].append(prefix)
+
+        return nodeAttributes, linkAttributes
+
     def generateNode(self, prefix, nodeNum, currentTier, topTier):
         """
         Determine what a given node should be named and create it. The format of a name is node_title-pod_prefix-num for all nodes minus the top tier, which do not use a pod_prefix.
@@ -451,26 +1930,21 @@ class BGPDCNConfig(ClosGenerator):
         # Add the unique number given to this node in the pod.
         name = partialName + nodeNum
 
-        ASNPrefix = None
+        # Nodes are visited once per link, but only given an ASN the first time.
+        if(name not in self.clos):
+            ASN = None
 
-        # Compute and security nodes don't get an ASN
-        if(title != self.COMPUTE_NAME and title != self.SEC_NAME):
-            # Every leaf gets its own ASN
-            if(title == self.LEAF_NAME):
-                ASNPrefix = name
+            # Compute and security nodes don't get an ASN
+            if(title in (self.TOF_NAME, self.SPINE_NAME, self.LEAF_NAME)):
+                # Every leaf gets its own ASN, spines in a pod get the same ASN
+                ASNKey = name if title == self.LEAF_NAME else partialName
+                ASN = self.ASNAssignment.get(ASNKey)
 
-            # Spines in a pod get the same ASN
-            elif(title == self.TOF_NAME or title == self.SPINE_NAME):
-                ASNPrefix = partialName
-            
-            # Only give the node a new ASN if its a new spine pod or a leaf.
-            if(ASNPrefix not in self.ASNAssignment):
-                self.ASNAssignment[ASNPrefix] = self.currentASN
-                self.currentASN += 1
+                # Only give the node a new ASN if its a new spine pod or a leaf.
+                if(ASN is None):
+                    ASN = self.ASNAssignment[ASNKey] = self.getNewASN(name)
 
-        # I'm not sure if the conditional is needed here in a new function, but it was used successfully in the base class
-        if(name not in self.clos):
-            self.clos.add_node(name, northbound=[], southbound=[], tier=None, ASN=self.ASNAssignment[ASNPrefix], ipv4={}, advertise=[])
+            self.clos.add_node(name, northbound=[], southbound=[], tier=None, ASN=ASN, ipv4={}, advertise=[])
 
         # Return just the name, not the node object iself
         return name
@@ -492,11 +1966,16 @@ class BGPDCNConfig(ClosGenerator):
             self.addressEdgeNodes(northNode, southNode)
             isComputeNetwork = True
 
-        # Otherwise, it is a core network (leaf-spine or spine-spine).
-        else:
+        # Otherwise, it is a core network (leaf-spine or spine-spine), which has no addresses if it is unnumbered.
+        elif(not self.unnumbered):
             self.addressCoreNodes(northNode, southNode)
         
-        # Log the new information given to each node.
+        # Log the new information given to each node, indexing each node the first time its tier is known.
+        if(self.clos.nodes[northNode]["tier"] is None):
+            self.indexNode(northNode, northTier)
+        if(self.clos.nodes[southNode]["tier"] is None):
+            self.indexNode(southNode, southTier)
+
         self.clos.nodes[northNode]["southbound"].append(southNode)
         self.clos.nodes[northNode]["tier"] = northTier
 
@@ -530,61 +2009,204 @@ class BGPDCNConfig(ClosGenerator):
 
     def addressEdgeNodes(self, northNode, southNode):
         """
-        Provide IPv4 addressing to nodes on edge networks (leaf-compute).
+        Provide IPv4 addressing to nodes on edge networks (leaf-compute). Links of the build layout get the subnet (and host) of their
+        position in it, other links get the next unused ones.
 
         :param northNode: The node in tier N.
         :param southNode: The node in tier N-1.
         """
-        
 
+        linkIndex = self.getLayoutLinkIndex(northNode, southNode)
+
+        # The security link built with the fabric takes the first compute subnet, kept for it by the build. Any later one gets the
+        # next unused subnet, like any link outside of the layout.
+        if(self.isSecurityNode(southNode) and self.securitySubnetFree):
+            subnet, southHost = self.FIRST_COMPUTE_SUBNET, self.FIRST_EDGE_SOUTH_HOST
+            self.securitySubnetFree = False
+        elif(self.isSecurityNode(southNode)):
+            subnet, southHost = None, self.FIRST_EDGE_SOUTH_HOST
+        elif(linkIndex is not None):
+            subnet, southHost = self.getLayoutComputeSubnet(linkIndex)
+        else:
+            subnet, southHost = None, self.FIRST_EDGE_SOUTH_HOST
 
         # If a single compute subnet is already defined for the leaf, reuse it and don't generate a new edge subnet. 
         if(northNode in self.leafComputeSubnets):
-            subnet = self.leafComputeSubnets[northNode]
-            #self.clos.nodes[northNode]["ipv4"][southNode] = self.clos.nodes[northNode]["ipv4"]["compute"]
+            leafSubnet = self.leafComputeSubnets[northNode]
+
+            if(subnet != leafSubnet[0]):
+                subnet, southHost = leafSubnet[0], leafSubnet[1]
+                leafSubnet[1] += 1
 
         else:
-            # Get next available edge subnet.
-            subnet = list(self.edgeNetworks.pop(self.NEXT_SUBNET))[:-1] # Remove broadcast address.
+            # Get next available edge subnet, if the link doesn't have one from the layout.
+            if(subnet is None):
+                subnet = self.edgePool.allocate()
 
-            networkAddress = subnet.pop(0) # Grab the network address to be advertised by BGP.
-            northAddress = subnet.pop() # Grab the last host address for the leaf node on the network.
+            northAddress = self.edgePool.getAddress(subnet, self.EDGE_NORTH_HOST) # The last host address is for the leaf node on the network.
 
             # Add subnet advertisement information to leaf node.
-            self.clos.nodes[northNode]["advertise"].append(f"{networkAddress}/24")
+            self.clos.nodes[northNode]["advertise"].append(self.edgePool.getPrefix(subnet))
 
             # Determine if an edge subnet needs to be reused and add addressing information to leaf node.
             if(self.singleComputeSubnet):
-                self.leafComputeSubnets[northNode] = subnet
-                self.clos.nodes[northNode]["ipv4"]["compute"] = str(northAddress)
+                # Hosts past the ones used by the layout are handed out to compute nodes added later.
+                nextHost = self.FIRST_EDGE_SOUTH_HOST + (self.buildLayout.southboundPorts[self.LEAF_TIER] if linkIndex is not None else 1)
+                self.leafComputeSubnets[northNode] = [subnet, nextHost]
+                self.clos.nodes[northNode]["ipv4"]["compute"] = northAddress
             else:
-                self.clos.nodes[northNode]["ipv4"][southNode] = str(northAddress)
-
+                self.clos.nodes[northNode]["ipv4"][southNode] = northAddress
 
-        southAddress = subnet.pop(0) # Grab the next available low host address for the compute node on the network.
+        # Compute nodes take the low host addresses, and can't use the leaf's address.
+        if(southHost >= self.edgePool.subnetSize + self.EDGE_NORTH_HOST):
+            raise IndexError(f"No host addresses left for {southNode} in {self.edgePool.getPrefix(subnet)}")
 
         # Add addressing information to compute node.
-        self.clos.nodes[southNode]["ipv4"][northNode] = str(southAddress)
+        self.clos.nodes[southNode]["ipv4"][northNode] = self.edgePool.getAddress(subnet, southHost)
 
         return
 
     def addressCoreNodes(self, northNode, southNode):
         """
-        Provide IPv4 addressing to nodes on core networks (leaf-spine or spine-spine).
+        Provide IPv4 addressing to nodes on core networks (leaf-spine or spine-spine). Links of the build layout get the subnet of their 
+        position in it (core links come first in the layout), other links get the next unused one.
 
         :param northNode: The node in tier N.
         :param southNode: The node in tier N-1.
         """
  
-        # Get next available core subnet.
-        subnet = list(self.coreNetworks.pop(self.NEXT_SUBNET))[1:-1] # Remove network and broadcast address.
+        subnet = self.getLayoutLinkIndex(northNode, southNode)
 
-        northAddress = subnet.pop(0) # Grab the next available low host address.
-        southAddress = subnet.pop(0)
+        if(subnet is None):
+            subnet = self.corePool.allocate()
+
+        northHost, southHost = self.coreHosts
 
         # Add addressing information to core nodes.
-        self.clos.nodes[northNode]["ipv4"][southNode] = str(northAddress)
-        self.clos.nodes[southNode]["ipv4"][northNode] = str(southAddress)
+        self.clos.nodes[northNode]["ipv4"][southNode] = self.corePool.getAddress(subnet, northHost)
+        self.clos.nodes[southNode]["ipv4"][northNode] = self.corePool.getAddress(subnet, southHost)
+
+        return
+
+    def parseNodeName(self, node):
+        # The security node is generated with its title passed as the prefix (see connectSecurityNode).
+        if(node == f"{self.SEC_NAME}-1"):
+            return self.SEC_NAME, "1", self.SEC_TIER
+
+        return super().parseNodeName(node)
+
+    def getComputeNetwork(self, address):
+        """
+        Get the edge network an address on a leaf-compute link belongs to.
+
+        :param address: An IPv4 address given out by addressEdgeNodes.
+        :returns: The edge network in CIDR notation.
+        """
+
+        return self.edgePool.getPrefix(self.edgePool.locate(address)[0])
+
+    def getInterfaceSubnet(self, node, neighbor):
+        """
+        Get the subnet of a node's interface, to configure the interface with its address.
+
+        :param node: The name of the node.
+        :param neighbor: The neighbor the interface faces, as keyed in the node's ipv4 attribute (ex: "compute").
+        :returns: The subnet in CIDR notation (ex: "172.16.0.0/31").
+        """
+
+        address = self.clos.nodes[node]["ipv4"][neighbor]
+        pool = self.corePool if self.corePool.contains(address) else self.edgePool
+
+        return pool.getPrefix(pool.locate(address)[0])
+
+    def getInterfaceAddress(self, node, neighbor):
+        """
+        :param node: The name of the node.
+        :param neighbor: The neighbor the interface faces, as keyed in the node's ipv4 attribute (ex: "compute").
+        :returns: The IPv4 address of the interface, or UNNUMBERED_ADDRESS for an unnumbered core interface.
+        """
+
+        return self.clos.nodes[node]["ipv4"].get(neighbor, self.UNNUMBERED_ADDRESS)
+
+    def getBGPNeighbors(self, node):
+        """
+        :param node: The name of the node.
+        :returns: The BGP-speaking neighbors of the node, northbound neighbors first.
+        """
+
+        return [neighbor for neighbor in self.clos.nodes[node]["northbound"] + self.clos.nodes[node]["southbound"] if self.isNetworkNode(neighbor)]
+
+    def disconnectNodes(self, northNode, southNode):
+        """
+        Remove the edge between two connected nodes, along with the addressing (and advertised edge network) given to it.
+        Released subnets are not handed out again, so other nodes' addresses never change.
+
+        :param northNode: The node in tier N.
+        :param southNode: The node in tier N-1.
+        """
+
+        northIPv4 = self.clos.nodes[northNode]["ipv4"]
+        southIPv4 = self.clos.nodes[southNode]["ipv4"]
+        southIPv4.pop(northNode, None)
+
+        if(self.clos.edges[northNode, southNode]["computeNetwork"]):
+            if(self.singleComputeSubnet):
+                otherComputeNodes = [node for node in self.clos.nodes[northNode]["southbound"] if node != southNode and self.clos.edges[northNode, node]["computeNetwork"]]
+
+                # The leaf keeps its compute subnet until its last compute node is gone.
+                northAddress = None if otherComputeNodes else northIPv4.pop("compute", None)
+                if(northAddress):
+                    self.leafComputeSubnets.pop(northNode, None)
+            else:
+                northAddress = northIPv4.pop(southNode, None)
+
+            if(northAddress):
+                self.clos.nodes[northNode]["advertise"].remove(self.getComputeNetwork(northAddress))
+        else:
+            northIPv4.pop(southNode, None)
+
+        super().disconnectNodes(northNode, southNode)
+
+        return
+
+    def restoreNode(self, node, attributes):
+        # Compute and security nodes don't get an ASN (see generateNode).
+        attributes.setdefault("ASN", None)
+
+        super().restoreNode(node, attributes)
+
+        return
+
+    def restoreAllocations(self):
+        """
+        Catch up the ASN and subnet pools with a topology read back from a file. The addresses in use can't be tied back to
+        a build layout, so every later link gets a subnet after the last one in use.
+        """
+
+        self.buildLayout = None
+
+        for node, ASN in self.clos.nodes(data="ASN"):
+            if(ASN is not None):
+                self.ASNAssignment[self.getASNKey(node)] = ASN
+
+                # ASNs outside of the pool (ex: set by hand) can never be handed out anyway.
+                if(self.asnPool.contains(ASN)):
+                    self.asnPool.reserve(self.asnPool.getIndex(ASN) + 1)
+
+        for node, ipv4 in self.clos.nodes(data="ipv4"):
+            for address in ipv4.values():
+                pool = self.corePool if self.corePool.contains(address) else self.edgePool
+                pool.reserve(pool.locate(address)[0] + 1)
+
+        # A node using a single compute subnet keeps handing out the host addresses after its last compute node.
+        for node, ipv4 in self.clos.nodes(data="ipv4"):
+            if("compute" in ipv4):
+                computeNodes = [southNode for southNode in self.clos.nodes[node]["southbound"] if self.clos.edges[node, southNode]["computeNetwork"]]
+                lastHost = max(self.edgePool.locate(self.clos.nodes[southNode]["ipv4"][node])[1] for southNode in computeNodes)
+                self.leafComputeSubnets[node] = [self.edgePool.locate(ipv4["compute"])[0], lastHost+1]
+
+        # The security node is already in the topology if it was asked for.
+        self.addSecNode = False
 
         return
 
@@ -601,11 +2223,12 @@ class BGPDCNConfig(ClosGenerator):
         t = self.numTiers
         topTier = t
 
-        numTofNodes = (k//2)**(t-1)
-        numServers = 2*((k//2)**t)
-        numSwitches = ((2*t)-1)*((k//2)**(t-1))
-        numLeaves = 2*((k//2)**(t-1))
-        numPods = 2*((k//2)**(t-2))
+        stats = self.getStats()
+        numTofNodes = stats.numTofNodes()
+        numServers = stats.numServers()
+        numSwitches = stats.numSwitches()
+        numLeaves = stats.numLeaves()
+        numPods = stats.numPods
         
         with open(f'clos_k{self.sharedDegree}_t{self.numTiers}_BGP.log', 'w') as logFile:
             logFile.write("=============\nFOLDED CLOS\nk = {k}, t = {t}\n{k}-port devices with {t} tiers.\n=============\n".format(k=k, t=t))
@@ -617,17 +2240,16 @@ class BGPDCNConfig(ClosGenerator):
             logFile.write("Number of Pods: {}\n".format(numPods))
 
             for tier in reversed(range(self.SEC_TIER, topTier+1)):
-                nodes = [v for v in self.clos if self.clos.nodes[v]["tier"] == tier]
                 logFile.write("\n== TIER {} ==\n".format(tier))
 
-                for node in sorted(nodes):
+                for node in self.getTierNodes(tier):
                     logFile.write(node)
                     logFile.write(f'\n\tASN = {self.clos.nodes[node]["ASN"]}') # BGP ASN printout
                     logFile.write(f'\n\tAdvertised routes: {self.clos.nodes[node]["advertise"]}')
                     logFile.write("\n\tnorthbound:\n")
                     
                     for n in self.clos.nodes[node]["northbound"]:
-                        addr = self.clos.nodes[node]["ipv4"][n]
+                        addr = self.getInterfaceAddress(node, n)
                         logFile.write(f"\t\t{n} - {addr}\n")
                         
                     logFile.write("\n\tsouthbound:\n")
@@ -637,53 +2259,45 @@ class BGPDCNConfig(ClosGenerator):
                         logFile.write(f"\t\tcompute - {addr}\n")
                     else:
                         for s in self.clos.nodes[node]["southbound"]:                        
-                            addr = self.clos.nodes[node]["ipv4"][s]
+                            addr = self.getInterfaceAddress(node, s)
                             logFile.write(f"\t\t{s} - {addr}\n")
                         
         return
 
-    def jsonGraphInfo(self):
-        '''
-        Get a JSON-formatted output of the graph information
-        
-        :returns: JSON object containing the folded-Clos configuration.
-        '''
+    def graphInfoTiers(self):
+        """
+        :returns: The tiers included in the graph information, top tier first and down to the security node tier.
+        """
 
-        jsonData = {"sharedDegree": self.sharedDegree, 
-                    "numTiers": self.numTiers,
-                    "numTofNodes": (self.sharedDegree//2)**(self.numTiers-1),
-                    "numServers": 2*((self.sharedDegree//2)**self.numTiers),
-                    "numSwitches": ((2*self.numTiers)-1)*((self.sharedDegree//2)**(self.numTiers-1)),
-                    "numLeaves": 2*((self.sharedDegree//2)**(self.numTiers-1)),
-                    "numPods": 2*((self.sharedDegree//2)**(self.numTiers-2))}
-
-        for tier in reversed(range(self.SEC_TIER, self.numTiers+1)):
-            nodes = [v for v in self.clos if self.clos.nodes[v]["tier"] == tier]
-            jsonData[f"tier_{tier}"] = {}
-
-            for node in sorted(nodes):
-                asn = self.clos.nodes[node]["ASN"]
-                jsonData[f"tier_{tier}"][node] = {f"ASN": asn,
-                                                  "advertisedRoutes": [],
-                                                  "northbound": [], 
-                                                  "southbound": []}
-                
-                for route in self.clos.nodes[node]["advertise"]:
-                    jsonData[f"tier_{tier}"][node]["advertisedRoutes"].append(route)
+        return reversed(range(self.SEC_TIER, self.numTiers+1))
 
-                for northNode in self.clos.nodes[node]["northbound"]:
-                    addr = self.clos.nodes[node]["ipv4"][northNode]
-                    jsonData[f"tier_{tier}"][node]["northbound"].append(f"{northNode} - {addr}")
+    def nodeGraphInfo(self, node, tier):
+        """
+        Get the graph information record of a single node, including its BGP and IPv4 configuration.
+
+        :param node: The name of the node.
+        :param tier: The tier of the node.
+        :returns: A dictionary containing the node's configuration.
+        """
 
-                if(tier == self.LEAF_TIER and self.singleComputeSubnet):
-                    addr = self.clos.nodes[node]["ipv4"]["compute"]
-                    jsonData[f"tier_{tier}"][node]["southbound"].append(f"compute - {addr}")
-                else:
-                    for southNode in self.clos.nodes[node]["southbound"]:
-                        addr = self.clos.nodes[node]["ipv4"][southNode]
-                        jsonData[f"tier_{tier}"][node]["southbound"].append(f"{southNode} - {addr}")
+        nodeInfo = {"ASN": self.clos.nodes[node]["ASN"],
+                    "advertisedRoutes": list(self.clos.nodes[node]["advertise"]),
+                    "northbound": [], 
+                    "southbound": []}
 
-        return jsonData
+        for northNode in self.clos.nodes[node]["northbound"]:
+            addr = self.getInterfaceAddress(node, northNode)
+            nodeInfo["northbound"].append(f"{northNode} - {addr}")
+
+        if(tier == self.LEAF_TIER and self.singleComputeSubnet):
+            addr = self.clos.nodes[node]["ipv4"]["compute"]
+            nodeInfo["southbound"].append(f"compute - {addr}")
+        else:
+            for southNode in self.clos.nodes[node]["southbound"]:
+                addr = self.getInterfaceAddress(node, southNode)
+                nodeInfo["southbound"].append(f"{southNode} - {addr}")
+
+        return nodeInfo
     
     def isNetworkNode(self, node):
         return False if node == "compute" else self.clos.nodes[node]["tier"] > self.COMPUTE_TIER
@@ -751,7 +2365,24 @@ class MTPConfig(ClosGenerator):
 
     COMPUTE_SUPERNET = '192.168.0.0/16'
     COMPUTE_SUBNET_BITS = 8
-    NEXT_SUBNET = 0 # For popping the network list
+    FIRST_COMPUTE_SUBNET = 1 # Subnet 0 is not used for experiment purposes.
+
+    # Host offsets within a subnet. Negative offsets count back from the broadcast address.
+    EDGE_NORTH_HOST = -2
+    FIRST_EDGE_SOUTH_HOST = 1
+
+    # Shown in place of the address of an interface that runs MTP instead of IPv4.
+    MTP_ADDRESS = "MTP"
+
+    @staticmethod
+    def getDefaultAddress():
+        # Default of the ipv4 attributes. Unlike a lambda, it can be pickled along with the graph (ex: by ClosFailureSweep).
+        return MTPConfig.MTP_ADDRESS
+
+    @classmethod
+    def isAddress(cls, address):
+        # Placeholders of interfaces running MTP (ex: stored by reading a missing key of the ipv4 defaultdict) aren't addresses.
+        return address != cls.MTP_ADDRESS and "." in address
 
     def __init__(self, k, t, singleComputeSubnet=False, **kwargs):
         """
@@ -766,14 +2397,74 @@ class MTPConfig(ClosGenerator):
         # Call superclass constructor to get graph setup
         super().__init__(k, t, **kwargs)
 
-        # Define the address space for the core and edge networks
-        self.edgeNetworks = list(IPv4Network(self.COMPUTE_SUPERNET).subnets(prefixlen_diff=self.COMPUTE_SUBNET_BITS))
-        self.edgeNetworks.pop(self.NEXT_SUBNET) # remove subnet 0 for experiment purposes
+        # Define the address space for the edge networks. Subnets are only ever computed from their index.
+        self.edgePool = SubnetPool(self.COMPUTE_SUPERNET, self.COMPUTE_SUBNET_BITS, firstSubnet=self.FIRST_COMPUTE_SUBNET)
         
-        # If only one compute subnet should be hanging off a leaf, then each leaf needs to be given a specific subnet
+        # If only one compute subnet should be hanging off a leaf, then each leaf needs to be given a specific subnet.
+        # Leaves are mapped to [subnet index, next host offset to hand out].
         self.singleComputeSubnet = singleComputeSubnet
         self.leafComputeSubnets = {}    
         
+    def getBuildArguments(self):
+        arguments = super().getBuildArguments()
+        arguments["singleComputeSubnet"] = self.singleComputeSubnet
+
+        return arguments
+
+    def getAllocations(self):
+        return {"leafComputeSubnets": self.leafComputeSubnets}
+
+    def mergeAllocations(self, allocations):
+        self.leafComputeSubnets.update(allocations["leafComputeSubnets"])
+
+        return
+
+    def setBuildLayout(self, layout):
+        super().setBuildLayout(layout)
+
+        # Links of the layout are given subnets by their position, so links added later get subnets after all of them.
+        self.edgePool.reserve(self.getLayoutComputeSubnet(layout.numEdges())[0])
+
+        return
+
+    def getLayoutComputeSubnet(self, linkIndex):
+        """
+        Compute the subnet and compute node host offset of a leaf-compute link from its position in the build layout. Every link 
+        (or every leaf, if a single compute subnet is used) gets the next compute subnet in layout order.
+
+        :param linkIndex: The index of the link in the build layout (see getLayoutLinkIndex), or a NumPy array of them.
+        :returns: A tuple of (subnet index, host offset). The subnet index is a NumPy array if linkIndex is one, and so is the host offset if a single compute subnet is used.
+        """
+
+        layout = self.buildLayout
+        computeIndex = linkIndex - layout.tierEdgeOffset[self.LEAF_TIER]
+
+        if(self.singleComputeSubnet):
+            leafIndex, port = divmod(computeIndex, max(layout.southboundPorts[self.LEAF_TIER], 1))
+            return self.FIRST_COMPUTE_SUBNET + leafIndex, self.FIRST_EDGE_SOUTH_HOST + port
+
+        return self.FIRST_COMPUTE_SUBNET + computeIndex, self.FIRST_EDGE_SOUTH_HOST
+
+    def getLayoutAttributes(self, layout, names, tiers, north, south, linkIndexes, nodeOrder):
+        nodeAttributes = [None] * len(names)
+        for node in nodeOrder:
+            nodeAttributes[node] = {"ipv4": defaultdict(self.getDefaultAddress), "isTopTier": True if self.numTiers == tiers[node] else False}
+
+        isComputeNetwork = tiers[south] <= self.COMPUTE_TIER
+        linkAttributes = [{"computeNetwork": computeNetwork} for computeNetwork in isComputeNetwork.tolist()]
+
+        # Only leaf-compute links are addressed, core links run MTP.
+        compute = np.flatnonzero(isComputeNetwork)
+        northKeys, northAddresses, southAddresses, _ = self.getLayoutComputeAddresses(names, north[compute], south[compute], linkIndexes[compute])
+
+        for northNode, southNode, northKey, northAddress, southAddress in zip(north[compute].tolist(), south[compute].tolist(), northKeys, northAddresses, southAddresses):
+            if(northKey is not None):
+                nodeAttributes[northNode]["ipv4"][northKey] = northAddress
+
+            nodeAttributes[southNode]["ipv4"][names[northNode]] = southAddress
+
+        return nodeAttributes, linkAttributes
+
     def connectNodes(self, northNode, southNode, northTier, southTier):
         """
         Connect two nodes together via an edge. The nodes must be in adjacent tiers (ex: tier 2 and tier 3). 
@@ -791,15 +2482,17 @@ class MTPConfig(ClosGenerator):
                                northbound=[], 
                                southbound=[], 
                                tier=northTier, 
-                               ipv4=defaultdict(lambda: "MTP"), 
+                               ipv4=defaultdict(self.getDefaultAddress), 
                                isTopTier=True if self.numTiers == northTier else False)
+            self.indexNode(northNode, northTier)
         if(southNode not in self.clos):
             self.clos.add_node(southNode, 
                                northbound=[], 
                                southbound=[], 
                                tier=southTier, 
-                               ipv4=defaultdict(lambda: "MTP"), 
+                               ipv4=defaultdict(self.getDefaultAddress), 
                                isTopTier=False)
+            self.indexNode(southNode, southTier)
         
         # Mark each other as neighbors in their appropriate direction.
         self.clos.nodes[northNode]["southbound"].append(southNode)
@@ -818,35 +2511,121 @@ class MTPConfig(ClosGenerator):
     
     def addressEdgeNodes(self, northNode, southNode):
         """
-        Provide IPv4 addressing to nodes on edge networks (leaf-compute).
+        Provide IPv4 addressing to nodes on edge networks (leaf-compute). Links of the build layout get the subnet (and host) of their
+        position in it, other links get the next unused ones.
 
         :param northNode: The node in tier N.
         :param southNode: The node in tier N-1.
         """
 
+        linkIndex = self.getLayoutLinkIndex(northNode, southNode)
+
+        if(linkIndex is not None):
+            subnet, southHost = self.getLayoutComputeSubnet(linkIndex)
+        else:
+            subnet, southHost = None, self.FIRST_EDGE_SOUTH_HOST
+
         # If a single compute subnet is already defined for the leaf, reuse it and don't generate a new edge subnet. 
         if(northNode in self.leafComputeSubnets):
-            subnet = self.leafComputeSubnets[northNode]
+            leafSubnet = self.leafComputeSubnets[northNode]
+
+            if(subnet != leafSubnet[0]):
+                subnet, southHost = leafSubnet[0], leafSubnet[1]
+                leafSubnet[1] += 1
+
         else:
-            # Get next available edge subnet.
-            subnet = list(self.edgeNetworks.pop(self.NEXT_SUBNET))[1:-1] # Remove network and broadcast address.
+            # Get next available edge subnet, if the link doesn't have one from the layout.
+            if(subnet is None):
+                subnet = self.edgePool.allocate()
 
-            northAddress = subnet.pop() # Grab the last host address for the leaf node on the network.
+            northAddress = self.edgePool.getAddress(subnet, self.EDGE_NORTH_HOST) # The last host address is for the leaf node on the network.
 
             # Determine if an edge subnet needs to be reused and add addressing information to leaf node.
             if(self.singleComputeSubnet):
-                self.leafComputeSubnets[northNode] = subnet
-                self.clos.nodes[northNode]["ipv4"]["compute"] = str(northAddress)
+                # Hosts past the ones used by the layout are handed out to compute nodes added later.
+                nextHost = self.FIRST_EDGE_SOUTH_HOST + (self.buildLayout.southboundPorts[self.LEAF_TIER] if linkIndex is not None else 1)
+                self.leafComputeSubnets[northNode] = [subnet, nextHost]
+                self.clos.nodes[northNode]["ipv4"]["compute"] = northAddress
             else:
-                self.clos.nodes[northNode]["ipv4"][southNode] = str(northAddress)
+                self.clos.nodes[northNode]["ipv4"][southNode] = northAddress
 
-        southAddress = subnet.pop(0) # Grab the next available low host address for the compute node on the network.
+        # Compute nodes take the low host addresses, and can't use the leaf's address.
+        if(southHost >= self.edgePool.subnetSize + self.EDGE_NORTH_HOST):
+            raise IndexError(f"No host addresses left for {southNode} in {self.edgePool.getPrefix(subnet)}")
 
         # Add addressing information to compute node.
-        self.clos.nodes[southNode]["ipv4"][northNode] = str(southAddress)
+        self.clos.nodes[southNode]["ipv4"][northNode] = self.edgePool.getAddress(subnet, southHost)
 
         return
     
+    def getInterfaceSubnet(self, node, neighbor):
+        """
+        Get the subnet of a node's interface, to configure the interface with its address.
+
+        :param node: The name of the node.
+        :param neighbor: The neighbor the interface faces, as keyed in the node's ipv4 attribute (ex: "compute").
+        :returns: The subnet in CIDR notation (ex: "192.168.1.0/24").
+        """
+
+        return self.edgePool.getPrefix(self.edgePool.locate(self.clos.nodes[node]["ipv4"][neighbor])[0])
+
+    def disconnectNodes(self, northNode, southNode):
+        """
+        Remove the edge between two connected nodes, along with the addressing given to it if it is an edge network.
+        Released subnets are not handed out again, so other nodes' addresses never change.
+
+        :param northNode: The node in tier N.
+        :param southNode: The node in tier N-1.
+        """
+
+        if(self.clos.edges[northNode, southNode]["computeNetwork"]):
+            self.clos.nodes[southNode]["ipv4"].pop(northNode, None)
+
+            if(self.singleComputeSubnet):
+                otherComputeNodes = [node for node in self.clos.nodes[northNode]["southbound"] if node != southNode and self.clos.edges[northNode, node]["computeNetwork"]]
+
+                # The leaf keeps its compute subnet until its last compute node is gone.
+                if(not otherComputeNodes):
+                    self.clos.nodes[northNode]["ipv4"].pop("compute", None)
+                    self.leafComputeSubnets.pop(northNode, None)
+            else:
+                self.clos.nodes[northNode]["ipv4"].pop(southNode, None)
+
+        super().disconnectNodes(northNode, southNode)
+
+        return
+
+    def restoreNode(self, node, attributes):
+        # Interfaces without an address use MTP, as set up by connectNodes.
+        attributes["ipv4"] = defaultdict(self.getDefaultAddress, attributes.get("ipv4", {}))
+        attributes.setdefault("isTopTier", attributes["tier"] == self.numTiers)
+
+        super().restoreNode(node, attributes)
+
+        return
+
+    def restoreAllocations(self):
+        """
+        Catch up the compute subnet pool with a topology read back from a file. The addresses in use can't be tied back to
+        a build layout, so every later link gets a subnet after the last one in use.
+        """
+
+        self.buildLayout = None
+
+        for node, ipv4 in self.clos.nodes(data="ipv4"):
+            for address in ipv4.values():
+                if(self.isAddress(address)):
+                    self.edgePool.reserve(self.edgePool.locate(address)[0] + 1)
+
+        # A leaf using a single compute subnet keeps handing out the host addresses after its last compute node.
+        for node, ipv4 in self.clos.nodes(data="ipv4"):
+            if(self.isAddress(ipv4.get("compute", self.MTP_ADDRESS))):
+                computeNodes = [southNode for southNode in self.clos.nodes[node]["southbound"] if self.clos.edges[node, southNode]["computeNetwork"]]
+                lastHost = max(self.edgePool.locate(self.clos.nodes[southNode]["ipv4"][node])[1] for southNode in computeNodes)
+                self.leafComputeSubnets[node] = [self.edgePool.locate(ipv4["compute"])[0], lastHost+1]
+
+        return
+
     def isNetworkNode(self, node):
         return False if node == "compute" else self.clos.nodes[node]["tier"] > self.COMPUTE_TIER
 
@@ -916,11 +2695,12 @@ class MTPConfig(ClosGenerator):
         t = self.numTiers
         topTier = t
 
-        numTofNodes = (k//2)**(t-1)
-        numServers = 2*((k//2)**t)
-        numSwitches = ((2*t)-1)*((k//2)**(t-1))
-        numLeaves = 2*((k//2)**(t-1))
-        numPods = 2*((k//2)**(t-2))
+        stats = self.getStats()
+        numTofNodes = stats.numTofNodes()
+        numServers = stats.numServers()
+        numSwitches = stats.numSwitches()
+        numLeaves = stats.numLeaves()
+        numPods = stats.numPods
         
         with open(f'clos_k{self.sharedDegree}_t{self.numTiers}_MTP.log', 'w') as logFile:
             logFile.write("=============\nMTP FOLDED CLOS\nk = {k}, t = {t}\n{k}-port devices with {t} tiers.\n=============\n".format(k=k, t=t))
@@ -932,25 +2712,37 @@ class MTPConfig(ClosGenerator):
             logFile.write("Number of Pods: {}\n".format(numPods))
 
             for tier in reversed(range(topTier+1)):
-                nodes = [v for v in self.clos if self.clos.nodes[v]["tier"] == tier]
                 logFile.write(f"\n== TIER {tier} ==\n")
 
-                for node in sorted(nodes):
+                for node in self.getTierNodes(tier):
                     logFile.write(node)
                     logFile.write(f'\n\tisTopTier = {self.clos.nodes[node]["isTopTier"]}')
                     
                     logFile.write("\n\tnorthbound:\n")
+                    # Read with get, as reading a missing key of the ipv4 defaultdict would store the placeholder in the graph.
                     for n in self.clos.nodes[node]["northbound"]:
-                        addr = self.clos.nodes[node]["ipv4"][n]
+                        addr = self.clos.nodes[node]["ipv4"].get(n, self.MTP_ADDRESS)
                         logFile.write(f"\t\t{n} - {addr}\n")
                         
                     logFile.write("\n\tsouthbound:\n")
                     if(tier == self.LEAF_TIER and self.singleComputeSubnet):
-                        addr = self.clos.nodes[node]["ipv4"]["compute"]
+                        addr = self.clos.nodes[node]["ipv4"].get("compute", self.MTP_ADDRESS)
                         logFile.write(f"\t\tcompute - {addr}\n")
                     else:
                         for s in self.clos.nodes[node]["southbound"]:                        
-                            addr = self.clos.nodes[node]["ipv4"][s]
+                            addr = self.clos.nodes[node]["ipv4"].get(s, self.MTP_ADDRESS)
                             logFile.write(f"\t\t{s} - {addr}\n")
 
-        return
\ No newline at end of file
+        return
+
+def buildShard(arguments):
+    """
+    Build one shard of a topology in a worker process of ClosGenerator.buildGraphSharded.
+
+    :param arguments: A tuple of (generator class, k, t, generator keyword arguments, pod).
+    :returns: See ClosGenerator.buildShard.
+    """
+
+    generatorClass, k, t, kwargs, pod = arguments
+
+    return generatorClass(k, t, **kwargs).buildShard(pod)
@@ -0,0 +1,255 @@
+"""
+Author: Peter Willis
+Desc: Streaming GraphML export and import of folded-Clos topologies. The writer includes the protocol attributes (tier, ASN, per-interface IPv4,
+      advertised routes, and the type of each edge) and the reader walks the file with iterparse, so neither holds the XML document in memory.
+"""
+
+import json
+import networkx as nx
+from xml.sax.saxutils import escape
+from xml.etree.ElementTree import iterparse
+
+GRAPHML_HEADER = ("<?xml version='1.0' encoding='utf-8'?>\n"
+                  '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                  'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+
+SMALL_PADDING = " " * 2
+LARGE_PADDING = " " * 4
+
+# Attributes that can be written, per GraphML domain: name -> GraphML type. Values with a "json" type are lists or dictionaries,
+# stored as JSON strings since GraphML only has scalar attributes.
+GRAPH_KEYS = {"protocol": "string", "sharedDegree": "int", "numTiers": "int", "southboundPorts": "json",
+              "singleComputeSubnet": "boolean", "hasSecurityNode": "boolean", "corePrefixLength": "int",
+              "unnumbered": "boolean"}
+NODE_KEYS = {"tier": "int", "ASN": "long", "ipv4": "json", "advertise": "json", "isTopTier": "boolean",
+             "northbound": "json", "southbound": "json"}
+EDGE_KEYS = {"computeNetwork": "boolean"}
+
+def xmlAttribute(value):
+    return escape(str(value), {'"': "&quot;"})
+
+def formatValue(value, valueType):
+    if(valueType == "json"):
+        return escape(json.dumps(value))
+    elif(valueType == "boolean"):
+        return "true" if value else "false"
+    else:
+        return escape(str(value))
+
+def parseValue(text, valueType):
+    """
+    Convert the text of a GraphML data element to a Python value.
+
+    :param text: The text of the data element.
+    :param valueType: The attr.type of its key ("json" for the JSON-encoded attributes written by writeGraphml).
+    :returns: The value.
+    """
+
+    text = text or ""
+
+    if(valueType == "json"):
+        return json.loads(text)
+    elif(valueType in ("int", "long")):
+        return int(text)
+    elif(valueType in ("float", "double")):
+        return float(text)
+    elif(valueType == "boolean"):
+        return text.strip().lower() in ("true", "1")
+    else:
+        return text
+
+def getGraphAttributes(topology):
+    """
+    :param topology: A ClosGenerator (or protocol subclass) object.
+    :returns: A dictionary of the parameters needed to rebuild the generator of the topology.
+    """
+
+    attributes = {"sharedDegree": topology.sharedDegree,
+                  "numTiers": topology.numTiers,
+                  "southboundPorts": {str(tier): topology.southboundPorts[tier] for tier in range(topology.LEAF_TIER, topology.numTiers+1)}}
+
+    if(topology.PROTOCOL):
+        attributes["protocol"] = topology.PROTOCOL
+        attributes["singleComputeSubnet"] = topology.singleComputeSubnet
+
+    if(getattr(topology, "hasSecurityNode", False)):
+        attributes["hasSecurityNode"] = True
+
+    if(hasattr(topology, "corePrefixLength")):
+        attributes["corePrefixLength"] = topology.corePrefixLength
+
+    if(getattr(topology, "unnumbered", False)):
+        attributes["unnumbered"] = True
+
+    return attributes
+
+def writeKeys(fileHandle, domain, keys, keyIds):
+    for name, valueType in keys.items():
+        keyIds[name] = f"{domain[0]}_{name}"
+        graphmlType = "string" if valueType == "json" else valueType
+        fileHandle.write(f'{SMALL_PADDING}<key id="{keyIds[name]}" for="{domain}" attr.name="{name}" attr.type="{graphmlType}" />\n')
+
+    return
+
+def writeData(fileHandle, padding, attributes, keys, keyIds):
+    for name, valueType in keys.items():
+        if(attributes.get(name) is not None):
+            fileHandle.write(f'{padding}<data key="{keyIds[name]}">{formatValue(attributes[name], valueType)}</data>\n')
+
+    return
+
+def writeGraphml(topology, fileHandle):
+    """
+    Stream a built topology to GraphML, one node or edge at a time. Only the attributes the topology's nodes and edges have are declared,
+    so a plain ClosGenerator topology is written with its tiers and neighbor lists only.
+
+    :param topology: A built ClosGenerator (or protocol subclass) object.
+    :param fileHandle: A file opened in text mode.
+    """
+
+    graph = topology.getNodes()
+    edges = topology.getNetworks()
+
+    # Every node (and edge) of a topology is given the same attributes, so the first one shows which keys are needed.
+    firstNode = next(iter(graph.values()), {})
+    firstEdge = next(iter(edges(data=True)), (None, None, {}))[2]
+
+    graphKeys = GRAPH_KEYS
+    nodeKeys = {name: valueType for name, valueType in NODE_KEYS.items() if name in firstNode}
+    edgeKeys = {name: valueType for name, valueType in EDGE_KEYS.items() if name in firstEdge}
+    keyIds = {"graph": {}, "node": {}, "edge": {}}
+
+    fileHandle.write(GRAPHML_HEADER)
+    writeKeys(fileHandle, "graph", graphKeys, keyIds["graph"])
+    writeKeys(fileHandle, "node", nodeKeys, keyIds["node"])
+    writeKeys(fileHandle, "edge", edgeKeys, keyIds["edge"])
+
+    fileHandle.write(f'{SMALL_PADDING}<graph edgedefault="undirected">\n')
+    writeData(fileHandle, LARGE_PADDING, getGraphAttributes(topology), graphKeys, keyIds["graph"])
+
+    # Fill in the nodes first
+    for node, attributes in graph.items():
+        if(nodeKeys):
+            fileHandle.write(f'{LARGE_PADDING}<node id="{xmlAttribute(node)}">\n')
+            writeData(fileHandle, LARGE_PADDING + SMALL_PADDING, attributes, nodeKeys, keyIds["node"])
+            fileHandle.write(f'{LARGE_PADDING}</node>\n')
+        else:
+            fileHandle.write(f'{LARGE_PADDING}<node id="{xmlAttribute(node)}" />\n')
+
+    # Then the edges
+    for source, target, attributes in edges(data=True):
+        if(edgeKeys):
+            fileHandle.write(f'{LARGE_PADDING}<edge source="{xmlAttribute(source)}" target="{xmlAttribute(target)}">\n')
+            writeData(fileHandle, LARGE_PADDING + SMALL_PADDING, attributes, edgeKeys, keyIds["edge"])
+            fileHandle.write(f'{LARGE_PADDING}</edge>\n')
+        else:
+            fileHandle.write(f'{LARGE_PADDING}<edge source="{xmlAttribute(source)}" target="{xmlAttribute(target)}" />\n')
+
+    fileHandle.write(f"{SMALL_PADDING}</graph>\n</graphml>")
+
+    return
+
+def getTag(element):
+    # Drop the GraphML namespace ({http://graphml.graphdrawing.org/xmlns}node -> node).
+    return element.tag.rpartition("}")[2]
+
+def iterGraphml(path):
+    """
+    Stream the contents of a GraphML file. Elements are cleared once they are read, so memory use doesn't grow with the size of the file.
+    Attributes are converted to Python values using their key's type, with the key's default filled in where a node or edge has no value.
+    The JSON-encoded attributes written by writeGraphml are decoded.
+
+    :param path: The GraphML file (or an open binary file).
+    :returns: Yields ("graph", attributes) once before the first node, then ("node", name, attributes) and ("edge", source, target, attributes)
+              in file order.
+    """
+
+    # Key id -> (domain, attribute name, type), and the defaults of each domain.
+    keys = {}
+    defaults = {"graph": {}, "node": {}, "edge": {}, "all": {}}
+    graphAttributes = {}
+    graphElement = None
+    graphDone = False
+    depth = 0
+
+    for event, element in iterparse(path, events=("start", "end")):
+        tag = getTag(element)
+
+        if(event == "start"):
+            depth += 1
+
+            if(tag == "graph" and graphElement is None):
+                graphElement = element
+            elif(tag in ("node", "edge") and not graphDone and depth == 3):
+                graphDone = True
+                yield "graph", {**defaults["all"], **defaults["graph"], **graphAttributes}
+
+            continue
+
+        depth -= 1
+
+        if(tag == "key"):
+            name = element.get("attr.name", element.get("id"))
+            valueType = element.get("attr.type", "string")
+
+            # Attributes written by writeGraphml as JSON are decoded, other tools' string attributes are left alone.
+            if(valueType == "string" and GRAPH_KEYS.get(name, NODE_KEYS.get(name)) == "json"):
+                valueType = "json"
+
+            domain = element.get("for", "all")
+            keys[element.get("id")] = (domain, name, valueType)
+
+            for child in element:
+                if(getTag(child) == "default"):
+                    defaults.setdefault(domain, {})[name] = parseValue(child.text, valueType)
+
+        elif(tag in ("node", "edge") and depth == 2):
+            attributes = dict(defaults["all"])
+            attributes.update(defaults[tag])
+
+            for child in element:
+                if(getTag(child) == "data" and child.get("key") in keys):
+                    _, name, valueType = keys[child.get("key")]
+                    attributes[name] = parseValue(child.text, valueType)
+
+            if(tag == "node"):
+                yield "node", element.get("id"), attributes
+            else:
+                yield "edge", element.get("source"), element.get("target"), attributes
+
+            # Drop the element, and the parent's reference to it, now that it has been read.
+            element.clear()
+            graphElement.remove(element)
+
+        elif(tag == "data" and depth == 2 and element.get("key") in keys):
+            _, name, valueType = keys[element.get("key")]
+            graphAttributes[name] = parseValue(element.text, valueType)
+
+        elif(tag == "graph" and not graphDone):
+            graphDone = True
+            yield "graph", {**defaults["all"], **defaults["graph"], **graphAttributes}
+
+    return
+
+def readGraph(path):
+    """
+    Read any GraphML file (ex: the hand-made topologies in graphs/) into a networkx graph, streaming it with iterGraphml.
+
+    :param path: The GraphML file.
+    :returns: A networkx Graph with the file's graph, node, and edge attributes.
+    """
+
+    graph = nx.Graph()
+
+    for item in iterGraphml(path):
+        if(item[0] == "graph"):
+            graph.graph.update(item[1])
+        elif(item[0] == "node"):
+            graph.add_node(item[1], **item[2])
+        else:
+            graph.add_edge(item[1], item[2], **item[3])
+
+    return graph
+
+def isClosGraphml(graphAttributes):
+    return "sharedDegree" in graphAttributes and "numTiers" in graphAttributes
@@ -0,0 +1,331 @@
+"""
+Author: Peter Willis
+Desc: Implicit (non-materialized) folded-Clos topology. Every query is answered with arithmetic on the node name, so fabrics far
+      larger than buildGraph can handle can be inspected in constant memory.
+"""
+
+from collections import defaultdict
+from ipaddress import IPv4Address
+from ClosGenerator import ClosGenerator, BGPDCNConfig, MTPConfig
+from ClosCompact import ClosTopologyBackend
+
+class ImplicitClosTopology(ClosTopologyBackend):
+    # Security node naming, matching BGPDCNConfig.
+    SEC_NODE_NAME = f"{BGPDCNConfig.SEC_NAME}-1"
+
+    def __init__(self, generator):
+        """
+        Describe the topology of a ClosGenerator (or a protocol subclass) without building it. Neighbors, tier, pod, ASN, and
+        addresses are computed for a node when asked for, and nodes and edges are iterated lazily. Answers match the graph the
+        generator's buildGraph would build.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        """
+
+        self.generator = generator
+        self.layout = generator.getLayout()
+        self.sharedDegree = generator.sharedDegree
+        self.numTiers = generator.numTiers
+        self.protocol = generator.PROTOCOL
+        self.singleComputeSubnet = getattr(generator, "singleComputeSubnet", False)
+        self.hasSecNode = self.protocol == BGPDCNConfig.PROTOCOL and generator.hasSecurityNode and self.layout.numEdges() > 0
+
+    def nodeId(self, node):
+        nodeId = self.layout.parseName(node)
+
+        if(not self.layout.nodeExists(nodeId)):
+            raise KeyError(node)
+
+        return nodeId
+
+    def hasNode(self, node):
+        if(node == self.SEC_NODE_NAME):
+            return self.hasSecNode
+
+        try:
+            self.nodeId(node)
+        except (ValueError, KeyError):
+            return False
+
+        return True
+
+    def numNodes(self):
+        layout = self.layout
+        numNodes = sum(layout.tierCount(tier) for tier in range(layout.numTiers+1))
+
+        # Leaf slots can only be empty if they neither connect north nor have compute nodes.
+        if(layout.southboundPorts[layout.LEAF_TIER] == 0):
+            numNodes -= layout.numGroups[layout.LEAF_TIER] * (layout.groupWidth[layout.LEAF_TIER] - layout.southboundPorts[layout.LOWEST_SPINE_TIER])
+
+        return numNodes + (1 if self.hasSecNode else 0)
+
+    def numEdges(self):
+        return self.layout.numEdges() + (1 if self.hasSecNode else 0)
+
+    def iterNodeNames(self):
+        for nodeId in self.layout.iterNodeIds():
+            yield self.layout.nodeName(nodeId)
+
+            if(nodeId == 0 and self.hasSecNode):
+                yield self.SEC_NODE_NAME
+
+    def iterEdges(self):
+        for northId, southId in self.layout.iterEdgeIds():
+            yield (self.layout.nodeName(northId), self.layout.nodeName(southId), southId >= self.layout.tierOffset[ClosGenerator.COMPUTE_TIER])
+
+            # The security node is connected right after T-1's first southbound link.
+            if(self.hasSecNode and northId == 0 and southId == self.layout.southNeighbors(0)[0]):
+                yield (self.layout.nodeName(0), self.SEC_NODE_NAME, True)
+
+    def nodeTier(self, node):
+        if(node == self.SEC_NODE_NAME and self.hasSecNode):
+            return BGPDCNConfig.SEC_TIER
+
+        return self.layout.nodeTier(self.nodeId(node))
+
+    def getNeighbors(self, node, direction="both"):
+        """
+        Compute the neighbors of a node.
+
+        :param node: The name of the node.
+        :param direction: "north", "south", or "both".
+        :returns: A list of neighbor names, in the order they were connected.
+        """
+
+        neighbors = []
+
+        if(direction in ("north", "both")):
+            neighbors += self.northNeighbors(node)
+        if(direction in ("south", "both")):
+            neighbors += self.southNeighbors(node)
+
+        return neighbors
+
+    def northNeighbors(self, node):
+        if(node == self.SEC_NODE_NAME and self.hasSecNode):
+            return [self.layout.nodeName(0)]
+
+        return [self.layout.nodeName(neighborId) for neighborId in self.layout.northNeighbors(self.nodeId(node))]
+
+    def southNeighbors(self, node):
+        if(node == self.SEC_NODE_NAME and self.hasSecNode):
+            return []
+
+        nodeId = self.nodeId(node)
+        neighbors = [self.layout.nodeName(neighborId) for neighborId in self.layout.southNeighbors(nodeId)]
+
+        if(self.hasSecNode and nodeId == 0):
+            neighbors.insert(1, self.SEC_NODE_NAME)
+
+        return neighbors
+
+    def computeNodes(self, leaf):
+        return [node for node in self.southNeighbors(leaf) if self.nodeTier(node) <= ClosGenerator.COMPUTE_TIER]
+
+    def isTopTier(self, node):
+        return self.nodeTier(node) == self.numTiers
+
+    def getPod(self, node):
+        """
+        Determine the pod prefix of a node (ex: S-1-2-1 and L-1-2-3 are in pod 1-2).
+
+        :param node: The name of the node.
+        :returns: The pod prefix, or None for top-tier and security nodes.
+        """
+
+        if(self.nodeTier(node) in (self.numTiers, BGPDCNConfig.SEC_TIER)):
+            return None
+
+        tier, group, _ = self.layout.nodeLocation(self.nodeId(node))
+
+        if(tier == ClosGenerator.COMPUTE_TIER):
+            tier, group = ClosGenerator.LEAF_TIER, group // self.layout.groupSize[ClosGenerator.LEAF_TIER]
+
+        return "-".join(str(digit) for digit in self.layout.groupDigits(tier, group))
+
+    def getASN(self, node):
+        """
+        Compute the ASN BGPDCNConfig gives a node. Spines sharing a pod prefix share an ASN and every leaf gets its own.
+
+        :param node: The name of the node.
+        :returns: The ASN, or None for compute and security nodes.
+        """
+
+        if(self.protocol != BGPDCNConfig.PROTOCOL or not self.isNetworkNode(node)):
+            return None
+
+        return self.generator.getLayoutASN(self.layout, self.nodeId(node))
+
+    def getLinkAddresses(self, northNode, southNode):
+        """
+        Compute the IPv4 addresses given to both ends of a link.
+
+        :param northNode: The node in tier N.
+        :param southNode: The node in tier N-1.
+        :returns: A tuple of (north address, south address, network address), or None if the link is not addressed.
+        """
+
+        layout = self.layout
+        isSecLink = self.hasSecNode and southNode == self.SEC_NODE_NAME
+
+        if(isSecLink):
+            if(northNode != layout.nodeName(0)):
+                raise KeyError((northNode, southNode))
+
+            isComputeNetwork = True
+        else:
+            northId, southId = self.nodeId(northNode), self.nodeId(southNode)
+            edgeIndex = layout.edgeIndex(northId, southId)
+            isComputeNetwork = southId >= layout.tierOffset[ClosGenerator.COMPUTE_TIER]
+
+        if(not isComputeNetwork):
+            if(self.protocol != BGPDCNConfig.PROTOCOL or self.generator.unnumbered):
+                return None
+
+            # Core links are addressed in BGP order, and every one of them comes before the compute links.
+            pool = self.generator.corePool
+            northHost, southHost = self.generator.coreHosts
+
+            if(edgeIndex >= pool.numSubnets):
+                raise ValueError(f"Core link {northNode} - {southNode} does not fit in the {pool.numSubnets} subnets of {pool.supernet}")
+
+            network = pool.base + edgeIndex*pool.subnetSize
+            return IPv4Address(network + northHost), IPv4Address(network + southHost), IPv4Address(network)
+
+        if(self.protocol is None):
+            return None
+
+        # Compute subnets and hosts are handed out the way the generator's getLayoutComputeSubnet does, from its edge pool. The
+        # security link takes the first compute subnet.
+        generator = self.generator
+        pool = generator.edgePool
+        firstSubnet = generator.FIRST_COMPUTE_SUBNET + (1 if self.hasSecNode else 0)
+
+        if(isSecLink):
+            subnetIndex, host = generator.FIRST_COMPUTE_SUBNET, generator.FIRST_EDGE_SOUTH_HOST
+        else:
+            computeIndex = edgeIndex - layout.tierEdgeOffset[ClosGenerator.LEAF_TIER]
+
+            if(self.singleComputeSubnet):
+                leafIndex, port = divmod(computeIndex, max(layout.southboundPorts[ClosGenerator.LEAF_TIER], 1))
+                subnetIndex, host = firstSubnet + leafIndex, generator.FIRST_EDGE_SOUTH_HOST + port
+            else:
+                subnetIndex, host = firstSubnet + computeIndex, generator.FIRST_EDGE_SOUTH_HOST
+
+        if(subnetIndex >= pool.numSubnets):
+            raise ValueError(f"Compute link {northNode} - {southNode} does not fit in the {pool.numSubnets} subnets of {pool.supernet}")
+        if(host >= pool.subnetSize + generator.EDGE_NORTH_HOST):
+            raise ValueError(f"Compute link {northNode} - {southNode} does not fit in a /{pool.prefixLength} compute subnet")
+
+        network = pool.getNetwork(subnetIndex)
+        northHost = generator.EDGE_NORTH_HOST % pool.subnetSize # Counted back from the broadcast address.
+
+        return IPv4Address(network + northHost), IPv4Address(network + host), IPv4Address(network)
+
+    def getAttributeGetters(self):
+        """
+        :returns: A dictionary of the name of each attribute the networkx graph would hold for a node to the method computing it, in
+                  the order the generator sets them.
+        """
+
+        getters = {"northbound": self.northNeighbors, "southbound": self.southNeighbors, "tier": self.nodeTier}
+
+        if(self.protocol == MTPConfig.PROTOCOL):
+            getters.update({"ipv4": self.getIPv4, "isTopTier": self.isTopTier})
+        elif(self.protocol is not None):
+            getters.update({"ASN": self.getASN, "advertise": self.getAdvertised, "ipv4": self.getIPv4})
+
+        return getters
+
+    def getNodeAttribute(self, node, attribute, subattribute=None):
+        """
+        Compute a single attribute of a node, without the others. A node's tier or ASN can be asked for even when its addresses
+        don't fit the address pools (ex: the leaves of BGPDCNConfig(128, 4)).
+
+        :param node: The name of the node.
+        :param attribute: The name of the attribute (see getAttributeGetters).
+        :param subattribute: A key of the attribute (ex: a neighbor of the node for ipv4).
+        :returns: The value of the attribute.
+        """
+
+        getters = self.getAttributeGetters()
+
+        if(attribute not in getters):
+            raise KeyError(attribute)
+
+        value = getters[attribute](node)
+
+        return value if subattribute is None else value[subattribute]
+
+    def iterComputeAddresses(self, node):
+        # Yields the (compute node, addresses) of each addressed compute link of a node (see getLinkAddresses).
+        for southNode in self.southNeighbors(node):
+            if(self.nodeTier(southNode) <= ClosGenerator.COMPUTE_TIER):
+                addresses = self.getLinkAddresses(node, southNode)
+
+                if(addresses):
+                    yield southNode, addresses
+
+    def getIPv4(self, node):
+        """
+        :param node: The name of the node.
+        :returns: A dictionary of neighbor (or "compute" for a leaf's single compute subnet) to the address of the interface facing it.
+        """
+
+        ipv4 = defaultdict(MTPConfig.getDefaultAddress) if self.protocol == MTPConfig.PROTOCOL else {}
+
+        for northNode in self.northNeighbors(node):
+            addresses = self.getLinkAddresses(northNode, node)
+
+            if(addresses):
+                ipv4[northNode] = str(addresses[1])
+
+        for southNode in self.southNeighbors(node):
+            isComputeNetwork = self.nodeTier(southNode) <= ClosGenerator.COMPUTE_TIER
+
+            # Only the first compute link of a leaf using a single compute subnet is needed for its address.
+            if(isComputeNetwork and self.singleComputeSubnet and "compute" in ipv4):
+                continue
+
+            addresses = self.getLinkAddresses(node, southNode)
+
+            if(addresses):
+                ipv4["compute" if isComputeNetwork and self.singleComputeSubnet else southNode] = str(addresses[0])
+
+        return ipv4
+
+    def getAdvertised(self, node):
+        """
+        :param node: The name of the node.
+        :returns: A list of the compute networks the node advertises, in CIDR notation.
+        """
+
+        prefixLength = self.generator.edgePool.prefixLength
+        advertised = []
+
+        for _, addresses in self.iterComputeAddresses(node):
+            advertised.append(f"{addresses[2]}/{prefixLength}")
+
+            # Every compute node of a leaf using a single compute subnet is on the same network.
+            if(self.singleComputeSubnet):
+                break
+
+        return advertised
+
+    def nodeAttributes(self, node):
+        """
+        Build the attribute dictionary the networkx graph would hold for a node.
+
+        :param node: The name of the node.
+        :returns: A dictionary of node attributes.
+        """
+
+        return {name: getter(node) for name, getter in self.getAttributeGetters().items()}
+
+    def edgeAttributes(self, nodeA, nodeB):
+        north, south = (nodeA, nodeB) if self.nodeTier(nodeA) > self.nodeTier(nodeB) else (nodeB, nodeA)
+
+        if(south not in self.southNeighbors(north)):
+            raise KeyError((nodeA, nodeB))
+
+        return {"computeNetwork": self.nodeTier(south) <= ClosGenerator.COMPUTE_TIER}
@@ -0,0 +1,515 @@
+"""
+Author: Peter Willis
+Desc: Closed-form description of a folded-Clos topology. Every node ID, node name and north/south edge is computed directly
+      from (k, t, southboundPorts) with index arithmetic instead of walking the topology.
+"""
+
+import numpy as np
+
+class ClosLayout:
+    # Vertex prefixes to denote position in topology (TOF = Top of Fabric), matching ClosGenerator.
+    TOF_NAME = "T"
+    SPINE_NAME = "S"
+    LEAF_NAME = "L"
+    COMPUTE_NAME = "C"
+
+    # Specific tier values.
+    LOWEST_SPINE_TIER = 2
+    LEAF_TIER = 1
+    COMPUTE_TIER = 0
+
+    # Integer type used for node IDs in edge arrays.
+    ID_TYPE = np.int64
+
+    def __init__(self, k, t, southboundPorts=None):
+        """
+        Lay out the tiers of a folded-Clos. Nodes are described by (tier, group, slot), where a group is the set of nodes
+        sharing a naming prefix (a pod at that tier) and the slot is the node number within that group minus one.
+
+        Node IDs are dense integers ordered top tier first, then by group, then by slot. The edge order produced by this
+        class is the same order the BFS in ClosGenerator.buildGraph connects nodes in.
+
+        :param k: Degree shared by each node.
+        :param t: Number of tiers in the graph.
+        :param southboundPorts: Mapping of tier to the number of southbound ports (ex: ClosGenerator.southboundPorts).
+        """
+
+        self.sharedDegree = k
+        self.numTiers = t
+        self.halfDegree = k//2
+
+        # Southbound ports per tier, with the same defaults used by ClosGenerator.
+        self.southboundPorts = [k//2] * (t+1)
+        self.southboundPorts[t] = k
+
+        if(southboundPorts):
+            for tier in range(t+1):
+                if(tier in southboundPorts):
+                    self.southboundPorts[tier] = southboundPorts[tier]
+
+        sb = self.southboundPorts
+        h = self.halfDegree
+
+        # Number of nodes per group that the BFS iterates over (and connects southbound) at each tier.
+        self.groupSize = [0] * (t+1)
+        for tier in range(self.LOWEST_SPINE_TIER, t+1):
+            self.groupSize[tier] = h**(tier-1)
+        self.groupSize[self.LEAF_TIER] = k if t == self.LOWEST_SPINE_TIER else h
+        self.groupSize[self.COMPUTE_TIER] = sb[self.LEAF_TIER]
+
+        # Number of groups at each tier. The leaf tier shares the prefix of the tier-2 spines (the pod).
+        self.numGroups = [0] * (t+1)
+        self.numGroups[t] = 1
+        for tier in reversed(range(self.LOWEST_SPINE_TIER, t)):
+            self.numGroups[tier] = self.numGroups[tier+1] * sb[tier+1]
+        self.numGroups[self.LEAF_TIER] = self.numGroups[self.LOWEST_SPINE_TIER]
+        self.numGroups[self.COMPUTE_TIER] = self.numGroups[self.LEAF_TIER] * self.groupSize[self.LEAF_TIER]
+
+        # Number of node slots per group. Leaves can be reached from above beyond the number iterated (or vice versa).
+        self.groupWidth = list(self.groupSize)
+        self.groupWidth[self.LEAF_TIER] = max(self.groupSize[self.LEAF_TIER], sb[self.LOWEST_SPINE_TIER])
+
+        # Global ID offset of each tier, top tier first.
+        self.tierOffset = [0] * (t+1)
+        offset = 0
+        for tier in reversed(range(t+1)):
+            self.tierOffset[tier] = offset
+            offset += self.numGroups[tier] * self.groupWidth[tier]
+        self.numSlots = offset
+
+        # Index of the first link of each tier (by north tier) in BFS order, top tier first.
+        self.tierEdgeOffset = [0] * (t+1)
+        offset = 0
+        for tier in reversed(range(self.LEAF_TIER, t+1)):
+            self.tierEdgeOffset[tier] = offset
+            offset += self.tierEdgeCount(tier)
+        self.tierEdgeOffset[self.COMPUTE_TIER] = offset
+
+        self._groupPrefixes = {}
+
+    def tierCount(self, tier):
+        """
+        :param tier: The folded-Clos tier.
+        :returns: The number of node slots in the tier.
+        """
+
+        return self.numGroups[tier] * self.groupWidth[tier]
+
+    def tierEdgeCount(self, tier):
+        """
+        :param tier: The northern tier of the links.
+        :returns: The number of links between the given tier and the tier directly south of it.
+        """
+
+        return self.numGroups[tier] * self.groupSize[tier] * self.southboundPorts[tier]
+
+    def numEdges(self):
+        return self.tierEdgeOffset[self.COMPUTE_TIER]
+
+    def nodeId(self, tier, group, slot):
+        return self.tierOffset[tier] + group*self.groupWidth[tier] + slot
+
+    def nodeTier(self, nodeId):
+        for tier in reversed(range(self.numTiers+1)):
+            if(nodeId < self.tierOffset[tier] + self.tierCount(tier)):
+                return tier
+
+        raise ValueError(f"Node ID {nodeId} is outside of the topology")
+
+    def nodeLocation(self, nodeId):
+        """
+        Convert a node ID into its position in the topology.
+
+        :param nodeId: The integer ID of the node.
+        :returns: A tuple of (tier, group, slot).
+        """
+
+        tier = self.nodeTier(nodeId)
+        group, slot = divmod(nodeId - self.tierOffset[tier], self.groupWidth[tier])
+
+        return tier, group, slot
+
+    def groupDigits(self, tier, group):
+        """
+        Convert a group number into the digits used in its naming prefix (ex: pod 1-2 is digits (1, 2)).
+
+        :param tier: The folded-Clos tier of the group.
+        :param group: The group number within that tier.
+        :returns: A tuple of one-based digits, most significant (closest to the top tier) first.
+        """
+
+        if(tier == self.COMPUTE_TIER):
+            leafGroup, leafSlot = divmod(group, self.groupSize[self.LEAF_TIER])
+            return self.groupDigits(self.LEAF_TIER, leafGroup) + (leafSlot+1,)
+
+        # Leaves share the prefix of the tier-2 spines.
+        prefixTier = max(tier, self.LOWEST_SPINE_TIER)
+
+        digits = []
+        for radixTier in range(prefixTier+1, self.numTiers+1):
+            group, digit = divmod(group, self.southboundPorts[radixTier])
+            digits.append(digit+1)
+
+        return tuple(reversed(digits))
+
+    def groupPrefix(self, tier, group):
+        """
+        :param tier: The folded-Clos tier of the group.
+        :param group: The group number within that tier.
+        :returns: The naming prefix shared by every node in the group (ex: "-1-2").
+        """
+
+        return "".join(f"-{digit}" for digit in self.groupDigits(tier, group))
+
+    def groupPrefixes(self, tier):
+        """
+        Build the naming prefix of every group in a tier at once. Cached, as there are far fewer groups than nodes.
+
+        :param tier: The folded-Clos tier.
+        :returns: A list of prefixes indexed by group number.
+        """
+
+        if(tier in self._groupPrefixes):
+            return self._groupPrefixes[tier]
+
+        # Leaves share the prefix of the tier-2 spines, and the top tier has no prefix.
+        prefixTier = max(tier, self.LOWEST_SPINE_TIER)
+
+        if(tier == self.COMPUTE_TIER):
+            prefixes = [f"{prefix}-{slot}" for prefix in self.groupPrefixes(self.LEAF_TIER) for slot in range(1, self.groupSize[self.LEAF_TIER]+1)]
+        elif(prefixTier >= self.numTiers):
+            prefixes = [""]
+        else:
+            prefixes = [f"{prefix}-{digit}" for prefix in self.groupPrefixes(prefixTier+1) for digit in range(1, self.southboundPorts[prefixTier+1]+1)]
+
+        self._groupPrefixes[tier] = prefixes
+
+        return prefixes
+
+    def getNodeTitle(self, tier):
+        if(tier == self.numTiers):
+            title = self.TOF_NAME
+        elif(tier > self.LEAF_TIER):
+            title = self.SPINE_NAME
+        elif(tier == self.LEAF_TIER):
+            title = self.LEAF_NAME
+        else:
+            title = self.COMPUTE_NAME
+
+        return title
+
+    def nodeName(self, nodeId):
+        """
+        :param nodeId: The integer ID of the node.
+        :returns: The name of the node, formatted as node_title-pod_prefix-num (top tier nodes have no pod_prefix).
+        """
+
+        tier, group, slot = self.nodeLocation(nodeId)
+        prefix = "" if tier == self.numTiers else self.groupPrefix(tier, group)
+
+        return f"{self.getNodeTitle(tier)}{prefix}-{slot+1}"
+
+    def nodeNames(self):
+        """
+        Build the name of every node slot in the topology.
+
+        :returns: A list of names indexed by node ID.
+        """
+
+        names = []
+
+        for tier in reversed(range(self.numTiers+1)):
+            title = self.getNodeTitle(tier)
+            slots = range(1, self.groupWidth[tier]+1)
+            prefixes = [""] if tier == self.numTiers else self.groupPrefixes(tier)
+
+            names.extend(f"{title}{prefix}-{slot}" for prefix in prefixes for slot in slots)
+
+        return names
+
+    def parseName(self, name):
+        """
+        Convert a node name back into its integer ID.
+
+        :param name: The name of the node (ex: S-1-2).
+        :returns: The integer ID of the node.
+        """
+
+        title, *digits = name.split("-")
+
+        try:
+            digits = [int(digit)-1 for digit in digits]
+        except ValueError:
+            raise ValueError(f"{name} is not a valid folded-Clos node name")
+
+        t = self.numTiers
+
+        if(title == self.TOF_NAME and len(digits) == 1):
+            tier = t
+        elif(title == self.SPINE_NAME and 1 < len(digits) < t):
+            tier = t - len(digits) + 1
+        elif(title == self.LEAF_NAME and len(digits) == t-1):
+            tier = self.LEAF_TIER
+        elif(title == self.COMPUTE_NAME and len(digits) == t):
+            tier = self.COMPUTE_TIER
+        else:
+            raise ValueError(f"{name} is not a valid node name for a {t}-tier folded-Clos")
+
+        *prefixDigits, slot = digits
+
+        if(tier == self.COMPUTE_TIER):
+            radixTiers = list(range(t, self.LOWEST_SPINE_TIER, -1)) + [None]
+        else:
+            radixTiers = list(range(t, max(tier, self.LOWEST_SPINE_TIER), -1))
+
+        group = 0
+        for radixTier, digit in zip(radixTiers, prefixDigits):
+            radix = self.groupSize[self.LEAF_TIER] if radixTier is None else self.southboundPorts[radixTier]
+
+            if(not 0 <= digit < radix):
+                raise ValueError(f"{name} is not in this folded-Clos topology")
+
+            group = group*radix + digit
+
+        if(not 0 <= slot < self.groupWidth[tier]):
+            raise ValueError(f"{name} is not in this folded-Clos topology")
+
+        return self.nodeId(tier, group, slot)
+
+    def southNeighbors(self, nodeId):
+        """
+        Compute the southbound neighbors of a node, in the order they are connected.
+
+        :param nodeId: The integer ID of the node.
+        :returns: A list of node IDs.
+        """
+
+        tier, group, slot = self.nodeLocation(nodeId)
+
+        if(tier == self.COMPUTE_TIER or slot >= self.groupSize[tier]):
+            return []
+
+        ports = range(self.southboundPorts[tier])
+
+        if(tier > self.LOWEST_SPINE_TIER):
+            southSlot = slot % self.groupSize[tier-1]
+            return [self.nodeId(tier-1, group*self.southboundPorts[tier] + port, southSlot) for port in ports]
+
+        elif(tier == self.LOWEST_SPINE_TIER):
+            return [self.nodeId(tier-1, group, port) for port in ports]
+
+        else:
+            computeGroup = group*self.groupSize[tier] + slot
+            return [self.nodeId(tier-1, computeGroup, port) for port in ports]
+
+    def northNeighbors(self, nodeId):
+        """
+        Compute the northbound neighbors of a node, in the order they are connected.
+
+        :param nodeId: The integer ID of the node.
+        :returns: A list of node IDs.
+        """
+
+        tier, group, slot = self.nodeLocation(nodeId)
+
+        if(tier == self.numTiers):
+            return []
+
+        northTier = tier+1
+
+        if(tier == self.COMPUTE_TIER):
+            if(slot >= self.southboundPorts[northTier]):
+                return []
+
+            leafGroup, leafSlot = divmod(group, self.groupSize[northTier])
+            return [self.nodeId(northTier, leafGroup, leafSlot)]
+
+        elif(tier == self.LEAF_TIER):
+            if(slot >= self.southboundPorts[northTier]):
+                return []
+
+            return [self.nodeId(northTier, group, northSlot) for northSlot in range(self.groupSize[northTier])]
+
+        else:
+            northGroup = group // self.southboundPorts[northTier]
+
+            return [self.nodeId(northTier, northGroup, northSlot) for northSlot in range(slot, self.groupSize[northTier], self.groupSize[tier])]
+
+    def nodeExists(self, nodeId):
+        """
+        :param nodeId: The integer ID of the node slot.
+        :returns: True if the slot holds a node, which is any slot with at least one link.
+        """
+
+        return bool(self.southNeighbors(nodeId) or self.northNeighbors(nodeId))
+
+    def iterNodeIds(self):
+        """
+        Lazily iterate over the ID of every node in the topology, top tier first.
+        """
+
+        for nodeId in range(self.numSlots):
+            if(self.nodeExists(nodeId)):
+                yield nodeId
+
+    def edgeIndex(self, northId, southId):
+        """
+        Compute the position of a link in BFS order.
+
+        :param northId: The integer ID of the node in tier N.
+        :param southId: The integer ID of the node in tier N-1.
+        :returns: The index of the link.
+        """
+
+        tier, group, slot = self.nodeLocation(northId)
+        southTier, southGroup, southSlot = self.nodeLocation(southId)
+        ports = self.southboundPorts[tier]
+
+        if(southTier != tier-1 or slot >= self.groupSize[tier]):
+            raise KeyError((northId, southId))
+
+        if(tier > self.LOWEST_SPINE_TIER):
+            port = southGroup - group*ports
+            isLink = southSlot == slot % self.groupSize[tier-1]
+        elif(tier == self.LOWEST_SPINE_TIER):
+            port = southSlot
+            isLink = southGroup == group
+        else:
+            port = southSlot
+            isLink = southGroup == group*self.groupSize[tier] + slot
+
+        if(not isLink or not 0 <= port < ports):
+            raise KeyError((northId, southId))
+
+        return self.tierEdgeOffset[tier] + (group*self.groupSize[tier] + slot)*ports + port
+
+    def iterEdgeIds(self):
+        """
+        Lazily iterate over every link in the topology in BFS order, without building any arrays.
+
+        :returns: Yields (north ID, south ID) tuples.
+        """
+
+        for tier in reversed(range(self.LEAF_TIER, self.numTiers+1)):
+            for group in range(self.numGroups[tier]):
+                for slot in range(self.groupSize[tier]):
+                    northId = self.nodeId(tier, group, slot)
+
+                    for southId in self.southNeighbors(northId):
+                        yield northId, southId
+
+    def tierEdges(self, tier, linkIndexes=None):
+        """
+        Compute every link between a tier and the tier directly south of it with array arithmetic.
+
+        :param tier: The northern tier of the links.
+        :param linkIndexes: Indexes of the links to compute, counted from the tier's first link in BFS order. Defaults to every link of the tier.
+        :returns: A tuple of (north IDs, south IDs) NumPy arrays, in the order the BFS connects them.
+        """
+
+        numGroups = self.numGroups[tier]
+        groupSize = self.groupSize[tier]
+        ports = self.southboundPorts[tier]
+
+        if(linkIndexes is None):
+            # Index grids shaped (group, slot, port) so that flattening keeps the BFS order.
+            group = np.arange(numGroups, dtype=self.ID_TYPE).reshape(-1, 1, 1)
+            slot = np.arange(groupSize, dtype=self.ID_TYPE).reshape(1, -1, 1)
+            port = np.arange(ports, dtype=self.ID_TYPE).reshape(1, 1, -1)
+            shape = (numGroups, groupSize, ports)
+        else:
+            northIndex, port = np.divmod(np.asarray(linkIndexes, dtype=self.ID_TYPE), ports)
+            group, slot = np.divmod(northIndex, groupSize)
+            shape = port.shape
+
+        north = self.tierOffset[tier] + group*self.groupWidth[tier] + slot
+
+        if(tier > self.LOWEST_SPINE_TIER):
+            southGroup = group*ports + port
+            southSlot = slot % self.groupSize[tier-1]
+        elif(tier == self.LOWEST_SPINE_TIER):
+            southGroup = group
+            southSlot = port
+        else:
+            southGroup = group*groupSize + slot
+            southSlot = port
+
+        south = self.tierOffset[tier-1] + southGroup*self.groupWidth[tier-1] + southSlot
+
+        return np.broadcast_to(north, shape).ravel(), np.broadcast_to(south, shape).ravel()
+
+    def numPods(self):
+        return self.numGroups[self.LOWEST_SPINE_TIER]
+
+    def podEdges(self, pod):
+        """
+        Find the links of a pod: the links into its tier-2 spines from the tier above, and every link below them. Every link south 
+        of tier 3 belongs to exactly one pod (see upperEdges for the rest).
+
+        :param pod: The group number of the pod's tier-2 spines.
+        :returns: A list of (tier, link indexes) tuples, top tier first, with link indexes counted from the tier's first link in BFS order.
+        """
+
+        spineTier = self.LOWEST_SPINE_TIER
+        tierLinks = []
+
+        # A tier-3 node links to one tier-2 spine of each pod below its group, from the same port.
+        if(self.numTiers > spineTier):
+            ports = self.southboundPorts[spineTier+1]
+            group, port = divmod(pod, ports)
+            slots = np.arange(self.groupSize[spineTier+1], dtype=self.ID_TYPE)
+            tierLinks.append((spineTier+1, (group*self.groupSize[spineTier+1] + slots)*ports + port))
+
+        # The tier-2 spines and the leaves of a pod are a single group at their tier, so their links are contiguous.
+        for tier in (spineTier, self.LEAF_TIER):
+            count = self.groupSize[tier] * self.southboundPorts[tier]
+            tierLinks.append((tier, pod*count + np.arange(count, dtype=self.ID_TYPE)))
+
+        return tierLinks
+
+    def upperEdges(self):
+        """
+        :returns: The links north of the tier-3 spines (which are not in any pod), as a list of (tier, link indexes) tuples like podEdges.
+        """
+
+        return [(tier, np.arange(self.tierEdgeCount(tier), dtype=self.ID_TYPE)) for tier in reversed(range(self.LOWEST_SPINE_TIER+2, self.numTiers+1))]
+
+    def edgeArrays(self):
+        """
+        Compute every link in the topology.
+
+        :returns: A tuple of (north IDs, south IDs) NumPy arrays, top tier links first, in BFS order.
+        """
+
+        tierEdges = [self.tierEdges(tier) for tier in reversed(range(self.LEAF_TIER, self.numTiers+1))]
+
+        north = np.concatenate([edges[0] for edges in tierEdges])
+        south = np.concatenate([edges[1] for edges in tierEdges])
+
+        return north, south
+
+    def tierArray(self):
+        """
+        :returns: A NumPy array holding the tier of every node ID.
+        """
+
+        tiers = np.empty(self.numSlots, dtype=np.int8)
+
+        for tier in range(self.numTiers+1):
+            tiers[self.tierOffset[tier]:self.tierOffset[tier] + self.tierCount(tier)] = tier
+
+        return tiers
+
+    def appearanceOrder(self, north, south):
+        """
+        Order node IDs by the first link they appear in, which is the order the BFS adds nodes to the graph.
+
+        :param north: North node IDs of the links, in BFS order.
+        :param south: South node IDs of the links, in BFS order.
+        :returns: A NumPy array of node IDs.
+        """
+
+        sequence = np.column_stack((north, south)).ravel()
+        nodes, firstSeen = np.unique(sequence, return_index=True)
+
+        return nodes[np.argsort(firstSeen, kind="stable")]
@@ -0,0 +1,353 @@
+"""
+Author: Peter Willis
+Desc: Discrete-event simulation of MTP reconvergence after a link failure in a folded-Clos fabric built by MTPConfig. VID failure
+      updates are propagated hop by hop through the meshed trees rooted at the leaves, and results are reported in the units
+      MTP_Analysis uses, so MTP can be compared with BGP (see ClosBGPSimulator) at sizes FABRIC can't host.
+"""
+
+import heapq
+import random
+from collections import defaultdict
+from ClosGenerator import MTPConfig
+from ClosBGPSimulator import FAILURE_MODES, HARD_FAILURE, HYBRID_FAILURE, PROCESS_EVENT, SESSION_DOWN_EVENT, RECEIVE_EVENT
+
+class MTPConvergenceResult:
+    def __init__(self, link, failureMode, networkNodes):
+        """
+        Metrics of a simulated reconvergence, named and measured like MTP_Analysis: times in milliseconds from the failure and
+        overhead in bytes of received FAILURE UPDATE messages.
+
+        :param link: The (NODE_TO_FAIL, NEIGHBOR_TO_FAIL) tuple of the failed link.
+        :param failureMode: "soft", "hard", or "hybrid".
+        :param networkNodes: The names of the nodes whose logs MTP_Analysis reads.
+        """
+
+        self.link = link
+        self.failureMode = failureMode
+        self.totalNodeCount = len(networkNodes)
+        self.failedNodes = list(link)
+
+        # Per node, like the mtp.log of each node.
+        self.nodeOverhead = defaultdict(int) # Bytes of FAILURE UPDATE messages received.
+        self.nodeConvergenceTimes = {} # Time the last FAILURE UPDATE was logged.
+        self.detectionTimes = {} # Time each end of the link noticed the failure.
+
+        self.messagesSent = 0
+        self.messagesLost = 0 # Sent into the failed link before the sender noticed.
+        self.numEvents = 0
+
+    @property
+    def reconvergenceTime(self):
+        return max(self.nodeConvergenceTimes.values(), default=0)
+
+    @property
+    def totalOverhead(self):
+        return sum(self.nodeOverhead.values())
+
+    @property
+    def effectedNodeCount(self):
+        return len({node for node, overhead in self.nodeOverhead.items() if overhead > 0} | set(self.failedNodes))
+
+    @property
+    def blastRadius(self):
+        return (self.effectedNodeCount/self.totalNodeCount) * 100 if self.totalNodeCount else 0.0
+
+    def report(self):
+        """
+        :returns: The metrics as MTP_Analysis prints them.
+        """
+
+        return (f"Reconvergence time: {self.reconvergenceTime} milliseconds\n"
+                f"Overhead: {self.totalOverhead} bytes\n"
+                f"\nBlast radius: {self.blastRadius:.2f}% of nodes received VID failure information.\n"
+                f"\tNodes receiving updated information: {self.effectedNodeCount}\n\tTotal nodes: {self.totalNodeCount}")
+
+    def toDict(self):
+        """
+        :returns: The result as a JSON-serializable dictionary.
+        """
+
+        return {"link": list(self.link), "failureMode": self.failureMode,
+                "reconvergenceTime": self.reconvergenceTime, "overhead": self.totalOverhead,
+                "effectedNodeCount": self.effectedNodeCount, "totalNodeCount": self.totalNodeCount, "blastRadius": self.blastRadius,
+                "messagesSent": self.messagesSent, "messagesLost": self.messagesLost, "numEvents": self.numEvents,
+                "detectionTimes": dict(self.detectionTimes), "nodeConvergenceTimes": dict(self.nodeConvergenceTimes),
+                "nodeOverhead": dict(self.nodeOverhead)}
+
+    def __repr__(self):
+        return (f"MTPConvergenceResult({self.failureMode} {self.link[0]} <--> {self.link[1]}: {self.reconvergenceTime} ms, "
+                f"{self.totalOverhead} bytes, blast radius {self.blastRadius:.2f}%)")
+
+class MTPSimulator:
+    # MTP's keep-alive timer, and the number of keep-alives a node can miss before it takes the port down.
+    HELLO_INTERVAL = 0.1
+    DEAD_MULTIPLIER = 3
+
+    # A FAILURE UPDATE is an Ethernet frame with a message type and a VID count, followed by each VID as a length byte and
+    # its dotted string (ex: "12.1.3").
+    ETHERNET_HEADER_BYTES = 14
+    FAILURE_UPDATE_HEADER_BYTES = 2
+
+    def __init__(self, topology, processingDelay=0.0005, linkDelay=0.0001, seed=0):
+        """
+        Simulate the fabric's MTP nodes reacting to a link failure. Every leaf roots a tree with a VID per compute subnet (the
+        subnet's third octet), and spines acquire a VID for each path up from a leaf by adding the port it came in on.
+
+        When a node loses VIDs, because the port they came in on went down or a southbound neighbor lost the VIDs they were
+        built from, it sends the lost VIDs north in a FAILURE UPDATE. When a node can no longer reach a root, neither down its
+        own VIDs nor up through a northbound neighbor, it tells its southbound neighbors to stop sending it traffic for that
+        root. Each node handles one message at a time, like the BGP simulation.
+
+        :param topology: An MTPConfig object that has been built.
+        :param processingDelay: Seconds a node takes to handle a message or a port going down and send the messages it causes.
+        :param linkDelay: Seconds a message takes to get to a neighbor.
+        :param seed: Seed for the phase of the keep-alive timer when the failure happens.
+        """
+
+        if(topology.PROTOCOL != MTPConfig.PROTOCOL):
+            raise ValueError(f"MTP can only be simulated on an {MTPConfig.PROTOCOL} topology, not {topology.PROTOCOL}")
+
+        self.topology = topology
+        self.processingDelay = processingDelay
+        self.linkDelay = linkDelay
+        self.random = random.Random(seed)
+
+        graph = topology.clos
+        self.networkNodes = [node for node in topology.iterNodes(noComputeNodes=True) if topology.isNetworkNode(node)]
+        self.northPeers = {node: [peer for peer in graph.nodes[node]["northbound"] if topology.isNetworkNode(peer)] for node in self.networkNodes}
+        self.southPeers = {node: [peer for peer in graph.nodes[node]["southbound"] if topology.isNetworkNode(peer)] for node in self.networkNodes}
+        self.isTopTier = {node: graph.nodes[node]["isTopTier"] for node in self.networkNodes}
+
+        # Ports are numbered in the order the node's southbound neighbors were connected.
+        self.ports = {(node, south): port for node in self.networkNodes for port, south in enumerate(graph.nodes[node]["southbound"], start=1)}
+
+        # VIDs each node acquired through each southbound port, built from the leaves up.
+        self.downVIDs = {}
+        for node in reversed(self.networkNodes):
+            if(not self.southPeers[node]):
+                roots = sorted({int(address.split(".")[2]) for address in graph.nodes[node]["ipv4"].values() if address.count(".") == 3})
+                self.downVIDs[node] = {None: frozenset((root,) for root in roots)}
+                continue
+
+            self.downVIDs[node] = {south: frozenset(VID + (self.ports[node, south],) for VID in self.getVIDs(self.downVIDs[south]))
+                                   for south in self.southPeers[node]}
+
+        # Roots each node can reach, and the roots each northbound neighbor told it it can reach, built from the top down.
+        self.reach = {}
+        self.northReach = {}
+        for node in self.networkNodes:
+            self.northReach[node] = {north: self.reach[north] for north in self.northPeers[node]}
+            self.reach[node] = self.getReach(self.downVIDs[node], self.northReach[node])
+
+    @staticmethod
+    def getVIDs(ports):
+        """
+        :param ports: A dictionary of port to the VIDs acquired through it.
+        :returns: A set of every VID.
+        """
+
+        return set().union(*ports.values())
+
+    @staticmethod
+    def getReach(ports, northReach):
+        """
+        :param ports: A dictionary of port to the VIDs acquired through it.
+        :param northReach: A dictionary of northbound neighbor to the roots it can reach.
+        :returns: A frozenset of the roots a node can reach.
+        """
+
+        return frozenset(VID[0] for VIDs in ports.values() for VID in VIDs).union(*northReach.values())
+
+    def getMessageSize(self, VIDs):
+        """
+        :param VIDs: The VIDs a FAILURE UPDATE carries.
+        :returns: The size of the message in bytes.
+        """
+
+        return self.ETHERNET_HEADER_BYTES + self.FAILURE_UPDATE_HEADER_BYTES + sum(1 + len(".".join(map(str, VID))) for VID in VIDs)
+
+    def getDetectionTime(self):
+        """
+        :returns: Seconds until a node takes down a port it stopped getting keep-alives on, minus how long ago the last one came in.
+        """
+
+        return self.HELLO_INTERVAL*self.DEAD_MULTIPLIER - self.random.uniform(0, self.HELLO_INTERVAL)
+
+    def getDetectionTimes(self, node, neighbor, failureMode):
+        """
+        :param node: NODE_TO_FAIL.
+        :param neighbor: NEIGHBOR_TO_FAIL.
+        :param failureMode: "soft", "hard", or "hybrid".
+        :returns: A dictionary of each end of the link to the second it takes its port down.
+        """
+
+        if(failureMode not in FAILURE_MODES):
+            raise ValueError(f"The failure mode must be one of {FAILURE_MODES}, not {failureMode}")
+
+        if(failureMode == HARD_FAILURE):
+            return {node: 0.0, neighbor: 0.0}
+        elif(failureMode == HYBRID_FAILURE):
+            return {node: 0.0, neighbor: self.getDetectionTime()}
+
+        # A soft failure only drops what NODE_TO_FAIL receives. Its neighbor keeps getting keep-alives until the port is taken down.
+        nodeDetectionTime = self.getDetectionTime()
+
+        return {node: nodeDetectionTime, neighbor: nodeDetectionTime + self.getDetectionTime()}
+
+    def schedule(self, time, eventType, node, data):
+        heapq.heappush(self.events, (time, eventType, self.sequence, node, data))
+        self.sequence += 1
+
+        return
+
+    def queue(self, time, node, data):
+        """
+        Queue an event at a node, which handles its events one at a time.
+
+        :param time: Second the event happens.
+        :param node: The name of the node.
+        :param data: The event, passed on to handleEvent.
+        """
+
+        doneTime = max(time, self.busyUntil[node]) + self.processingDelay
+        self.busyUntil[node] = doneTime
+        self.schedule(doneTime, PROCESS_EVENT, node, data)
+
+        return
+
+    def send(self, time, node, peers, VIDs):
+        """
+        Send a FAILURE UPDATE to a set of neighbors.
+
+        :param time: Second the message is sent.
+        :param node: The name of the sending node.
+        :param peers: The names of the neighbors.
+        :param VIDs: The VIDs the message carries.
+        """
+
+        for peer in peers:
+            if((node, peer) in self.portsDown):
+                continue
+
+            self.result.messagesSent += 1
+
+            # The failed link carries nothing, the sender just hasn't noticed yet.
+            if(frozenset((node, peer)) == self.failedLink):
+                self.result.messagesLost += 1
+            else:
+                self.schedule(time + self.linkDelay, RECEIVE_EVENT, peer, (node, VIDs))
+
+        return
+
+    def handleEvent(self, time, node, data):
+        """
+        Apply a port going down or a FAILURE UPDATE to a node's VIDs and reachable roots, once the node gets to it, and tell
+        its neighbors what it lost.
+
+        :param time: Second the node is done handling the event.
+        :param node: The name of the node.
+        :param data: (neighbor, None) for the port to neighbor going down, or (neighbor, VIDs) for a FAILURE UPDATE from neighbor.
+        """
+
+        peer, VIDs = data
+        ports = self.downVIDs[node]
+        lostVIDs = frozenset()
+
+        if(VIDs is None):
+            self.portsDown.add((node, peer))
+
+            if(peer in ports):
+                lostVIDs = ports[peer]
+                ports[peer] = frozenset()
+            else:
+                self.northReach[node][peer] = frozenset()
+        else:
+            # Messages still queued from a neighbor whose port went down are thrown out with it.
+            if((node, peer) in self.portsDown):
+                return
+
+            self.result.nodeConvergenceTimes[node] = round(time * 1000)
+
+            if(peer in ports):
+                # The neighbor's VIDs were extended with the port they came in on.
+                port = self.ports[node, peer]
+                lostVIDs = ports[peer] & {VID + (port,) for VID in VIDs}
+                ports[peer] = ports[peer] - lostVIDs
+            else:
+                self.northReach[node][peer] = self.northReach[node][peer] - {VID[0] for VID in VIDs}
+
+        if(lostVIDs and not self.isTopTier[node]):
+            self.send(time, node, self.northPeers[node], lostVIDs)
+
+        reach = self.getReach(ports, self.northReach[node])
+        lostRoots = self.reach[node] - reach
+        self.reach[node] = reach
+
+        if(lostRoots):
+            self.send(time, node, self.southPeers[node], frozenset((root,) for root in lostRoots))
+
+        return
+
+    def simulateLinkFailure(self, node, neighbor, failureMode=HYBRID_FAILURE):
+        """
+        Fail a link between two MTP nodes at time 0 and run the fabric until no message is left in flight.
+
+        :param node: NODE_TO_FAIL.
+        :param neighbor: NEIGHBOR_TO_FAIL.
+        :param failureMode: "soft", "hard", or "hybrid", as in MTP_Test.
+        :returns: An MTPConvergenceResult object.
+        """
+
+        if(node not in self.reach or neighbor not in self.northPeers[node] + self.southPeers[node]):
+            raise ValueError(f"{node} and {neighbor} are not connected MTP nodes")
+
+        detectionTimes = self.getDetectionTimes(node, neighbor, failureMode)
+
+        # Keep the converged state, the simulation works on copies of it.
+        initialState = (self.downVIDs, self.northReach, self.reach)
+        self.downVIDs = {speaker: dict(ports) for speaker, ports in self.downVIDs.items()}
+        self.northReach = {speaker: dict(reach) for speaker, reach in self.northReach.items()}
+        self.reach = dict(self.reach)
+
+        self.result = MTPConvergenceResult((node, neighbor), failureMode, self.networkNodes)
+        self.failedLink = frozenset((node, neighbor))
+        self.portsDown = set()
+        self.busyUntil = defaultdict(float)
+        self.events = []
+        self.sequence = 0
+
+        for end, detectionTime in detectionTimes.items():
+            self.result.detectionTimes[end] = round(detectionTime * 1000)
+            self.schedule(detectionTime, SESSION_DOWN_EVENT, end, (neighbor if end == node else node, None))
+
+        try:
+            while(self.events):
+                time, eventType, _, speaker, data = heapq.heappop(self.events)
+                self.result.numEvents += 1
+
+                if(eventType == PROCESS_EVENT):
+                    self.handleEvent(time, speaker, data)
+                    continue
+
+                if(eventType == RECEIVE_EVENT):
+                    # The node logs the size of every FAILURE UPDATE it receives.
+                    self.result.nodeOverhead[speaker] += self.getMessageSize(data[1])
+
+                self.queue(time, speaker, data)
+
+            # Leave the end state where it can be inspected, next to the converged one.
+            self.finalState = (self.downVIDs, self.northReach, self.reach)
+        finally:
+            self.downVIDs, self.northReach, self.reach = initialState
+
+        return self.result
+
+if __name__ == "__main__":
+    # The default link and failure mode of MTP_Test, on a 3-tier fabric.
+    topology = MTPConfig(4, 3)
+    topology.buildGraph()
+    simulator = MTPSimulator(topology)
+
+    for failureMode in FAILURE_MODES:
+        result = simulator.simulateLinkFailure("L-1-1", "S-1-1", failureMode)
+        print(f"{failureMode.capitalize()} link failure of L-1-1 <--> S-1-1\n{result.report()}\n")
@@ -0,0 +1,399 @@
+"""
+Author: Peter Willis
+Desc: Batch rendering of the per-node configuration files (FRR for BGP, mtp.conf for MTP) of a folded-Clos topology. Templates are compiled
+      once into Mako's on-disk module cache, nodes are rendered in a process pool, and every node's file is written to its own directory
+      of a config bundle (optionally packed into a tarball). A manifest of content hashes lets later renders skip unchanged nodes.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from mako.template import Template
+from ClosGenerator import BGPDCNConfig, MTPConfig
+
+TEMPLATE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "remote_scripts")
+
+# Template and name of the rendered file, per protocol.
+TEMPLATES = {BGPDCNConfig.PROTOCOL: os.path.join(TEMPLATE_ROOT, "frr_templates", "frr_conf_bgp.mako"),
+             MTPConfig.PROTOCOL: os.path.join(TEMPLATE_ROOT, "mtp_templates", "mtp_conf.mako")}
+CONFIG_FILES = {BGPDCNConfig.PROTOCOL: "frr.conf", MTPConfig.PROTOCOL: "mtp.conf"}
+
+DEFAULT_MODULE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "clos_templates")
+
+# Number of chunks handed to each worker, so workers that finish early pick up more nodes.
+CHUNKS_PER_WORKER = 4
+
+# Template loaded by each worker process (see loadTemplate).
+workerTemplate = None
+
+def getBGPContext(topology, node, interfaceNames=None):
+    """
+    Collect what the FRR template needs to configure a BGP-speaking node.
+
+    :param topology: A built BGPDCNConfig object.
+    :param node: The name of a leaf or spine.
+    :param interfaceNames: A dictionary of (node, neighbor) to the name of the node's interface facing the neighbor (ex: eth1). Only needed
+                           for unnumbered topologies, which peer over interfaces instead of addresses, and required for them.
+    :returns: The template's keyword arguments.
+    """
+
+    # FRR peers over the interface's OS name (ex: eth1), which only the slice knows, not the FABRIC name of getFabricInterfaceName.
+    if(topology.unnumbered and interfaceNames is None):
+        raise ValueError("Unnumbered topologies peer over interfaces, so rendering them needs interfaceNames")
+
+    # Store information about BGP-speaking neighbors to configure neighborship.
+    neighboringNodes = []
+
+    for neighbor in topology.getBGPNeighbors(node):
+        if(topology.unnumbered):
+            if((node, neighbor) not in interfaceNames):
+                raise ValueError(f"interfaceNames has no interface of {node} facing {neighbor}")
+
+            neighboringNodes.append({'asn': topology.getNodeAttribute(neighbor, 'ASN'), 'interface': interfaceNames[node, neighbor]})
+        else:
+            neighboringNodes.append({'asn': topology.getNodeAttribute(neighbor, 'ASN'), 'ip': topology.getNodeAttribute(neighbor, 'ipv4', node)})
+
+    # Compute subnets the node must advertise to neighbors (leaf's only).
+    return {'neighbors': neighboringNodes, 'bgp_asn': topology.getNodeAttribute(node, 'ASN'), 'networks': list(topology.getNodeAttribute(node, 'advertise'))}
+
+def getMTPContext(topology, node, interfaceNames=None):
+    """
+    Collect what the MTP template needs to configure an MTP-speaking node.
+
+    :param topology: A built MTPConfig object.
+    :param node: The name of a leaf or spine.
+    :param interfaceNames: Not used, MTP configurations don't name interfaces.
+    :returns: The template's keyword arguments.
+    """
+
+    return {'tier': topology.getNodeAttribute(node, 'tier'), 'isTopSpine': topology.getNodeAttribute(node, 'isTopTier')}
+
+CONTEXTS = {BGPDCNConfig.PROTOCOL: getBGPContext, MTPConfig.PROTOCOL: getMTPContext}
+
+def loadTemplate(templatePath, moduleDirectory):
+    """
+    Load a template, compiling it into the module directory the first time. Later loads (in this or any other process) import the
+    compiled module instead of parsing the template again.
+
+    :param templatePath: The Mako template.
+    :param moduleDirectory: Where Mako keeps compiled templates.
+    :returns: A mako Template object.
+    """
+
+    global workerTemplate
+
+    workerTemplate = Template(filename=os.path.abspath(templatePath), module_directory=moduleDirectory)
+
+    return workerTemplate
+
+def getHash(data):
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def renderChunk(chunk):
+    """
+    Render a chunk of nodes with the template loaded by loadTemplate and write each node's file.
+
+    :param chunk: A list of (path, template keyword arguments) tuples.
+    :returns: The content hash of each file written, in chunk order.
+    """
+
+    configHashes = []
+
+    for path, context in chunk:
+        config = workerTemplate.render(**context)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "w") as configFile:
+            configFile.write(config)
+
+        configHashes.append(getHash(config))
+
+    return configHashes
+
+class ConfigRenderer:
+    # Content hashes of the last render, kept at the top of the bundle directory.
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, protocol, templatePath=None, moduleDirectory=None):
+        """
+        Prepare to render the configuration files of a protocol.
+
+        :param protocol: "BGP" or "MTP".
+        :param templatePath: The Mako template. Defaults to the protocol's template in remote_scripts.
+        :param moduleDirectory: Where compiled templates are cached. Defaults to ~/.cache/clos_templates.
+        """
+
+        if(protocol not in TEMPLATES):
+            raise ValueError(f"No configuration template for protocol {protocol}")
+
+        self.protocol = protocol
+        self.templatePath = templatePath or TEMPLATES[protocol]
+        self.moduleDirectory = moduleDirectory or DEFAULT_MODULE_DIR
+        self.configFile = CONFIG_FILES[protocol]
+        self.getContext = CONTEXTS[protocol]
+
+        # Manifests of renders that aren't committed yet, keyed by bundle directory (see render and commitManifest).
+        self.pendingManifests = {}
+
+    @classmethod
+    def forTopology(cls, topology, templatePath=None, moduleDirectory=None):
+        """
+        :param topology: A BGPDCNConfig or MTPConfig object.
+        :returns: A ConfigRenderer for the topology's protocol (see __init__ for the other parameters).
+        """
+
+        return cls(topology.PROTOCOL, templatePath, moduleDirectory)
+
+    def getConfigPath(self, outputDir, node):
+        return os.path.join(outputDir, node, self.configFile)
+
+    def renderNode(self, topology, node, interfaceNames=None):
+        """
+        :param topology: A built BGPDCNConfig or MTPConfig object.
+        :param node: The name of a leaf or spine.
+        :param interfaceNames: See getBGPContext.
+        :returns: The configuration file of the node as a string.
+        """
+
+        return loadTemplate(self.templatePath, self.getModuleDirectory()).render(**self.getContext(topology, node, interfaceNames))
+
+    def getTemplateHash(self):
+        with open(self.templatePath) as templateFile:
+            return getHash(templateFile.read())
+
+    def getModuleDirectory(self, templateHash=None):
+        """
+        Mako only recompiles a template whose file is newer than its compiled module, which misses edits made within a second of the
+        last compile. Each version of the template is compiled into its own directory instead.
+
+        :param templateHash: The content hash of the template, computed if not given.
+        :returns: The module directory of the current version of the template.
+        """
+
+        return os.path.join(self.moduleDirectory, templateHash or self.getTemplateHash())
+
+    def getInputHash(self, templateHash, context):
+        """
+        :param templateHash: The content hash of the template (see getTemplateHash).
+        :param context: The template arguments of a node.
+        :returns: A hash of everything the node's configuration is rendered from.
+        """
+
+        return getHash(json.dumps({"template": templateHash, "context": context}, sort_keys=True))
+
+    def loadManifest(self, outputDir):
+        """
+        :param outputDir: The bundle directory.
+        :returns: A dictionary of node name to the "input" and "config" hashes of its last render, empty if the bundle has no manifest.
+        """
+
+        try:
+            with open(os.path.join(outputDir, self.MANIFEST_FILE)) as manifestFile:
+                manifest = json.load(manifestFile)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        # A manifest of another protocol's bundle doesn't describe these files.
+        return manifest["nodes"] if manifest.get("configFile") == self.configFile else {}
+
+    def getFileHash(self, path):
+        """
+        :param path: A rendered configuration file.
+        :returns: The content hash of the file, None if it isn't there.
+        """
+
+        try:
+            with open(path) as configFile:
+                return getHash(configFile.read())
+        except FileNotFoundError:
+            return None
+
+    def saveManifest(self, outputDir, nodes):
+        path = os.path.join(outputDir, self.MANIFEST_FILE)
+
+        # Written to a temporary file first, so an interrupted render never leaves a manifest that doesn't match the files.
+        with open(path + ".tmp", "w") as manifestFile:
+            json.dump({"configFile": self.configFile, "nodes": nodes}, manifestFile, sort_keys=True)
+
+        os.replace(path + ".tmp", path)
+
+        return
+
+    def renderTasks(self, tasks, workers, moduleDirectory):
+        """
+        Render nodes, in a process pool unless a single worker is asked for.
+
+        :param tasks: A list of (path, template keyword arguments) tuples.
+        :param workers: Number of worker processes, defaults to the number of CPUs.
+        :param moduleDirectory: Where the template is compiled (see getModuleDirectory).
+        :returns: The content hash of each file written, in task order.
+        """
+
+        # Compile the template before starting any worker, so they all import the cached module instead of racing to write it.
+        loadTemplate(self.templatePath, moduleDirectory)
+
+        workers = workers or os.cpu_count()
+
+        if(workers == 1 or len(tasks) <= 1):
+            return renderChunk(tasks)
+
+        chunkSize = max(1, -(-len(tasks) // (workers*CHUNKS_PER_WORKER)))
+        chunks = [tasks[start:start+chunkSize] for start in range(0, len(tasks), chunkSize)]
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=loadTemplate, initargs=(self.templatePath, moduleDirectory)) as executor:
+            return [configHash for configHashes in executor.map(renderChunk, chunks) for configHash in configHashes]
+
+    def render(self, topology, outputDir, interfaceNames=None, workers=None, tarballPath=None, changedOnly=False, commit=True):
+        """
+        Render the configuration file of every leaf and spine into a bundle with one directory per node (outputDir/<node>/frr.conf).
+        Template arguments are collected from the topology here, and only they are sent to the worker processes.
+
+        The bundle's manifest records a hash of each node's inputs (template and template arguments) and of its rendered file. With
+        changedOnly, nodes whose inputs are unchanged since the last render are skipped, and only nodes whose file is new or different
+        are returned, which are the nodes that need a push and reload. Nodes no longer in the topology are removed from the bundle.
+
+        The manifest describes what the nodes are running, so when the files are pushed after the render, render without commit and
+        call commitManifest once the push went through. A push that failed is then found again by the next changedOnly render.
+
+        :param topology: A built BGPDCNConfig or MTPConfig object.
+        :param outputDir: The bundle directory.
+        :param interfaceNames: See getBGPContext.
+        :param workers: Number of worker processes, defaults to the number of CPUs. 1 renders every node in this process.
+        :param tarballPath: If given, the bundle is also packed into this tarball (compressed if it ends in .gz).
+        :param changedOnly: If only nodes whose file changed since the last render should be rendered and returned.
+        :param commit: If the manifest should be saved now, instead of by commitManifest.
+        :returns: A dictionary of node name to the path of its configuration file.
+        """
+
+        manifest = self.loadManifest(outputDir) if changedOnly else {}
+        templateHash = self.getTemplateHash()
+
+        configPaths = {}
+        newManifest = {}
+        tasks = []
+
+        for node in topology.iterNodes(noComputeNodes=True):
+            path = self.getConfigPath(outputDir, node)
+            context = self.getContext(topology, node, interfaceNames)
+            inputHash = self.getInputHash(templateHash, context)
+
+            # The file is kept if it was rendered from the same inputs and is still the file of that render (an uncommitted render
+            # may have replaced it since).
+            entry = manifest.get(node, {})
+            if(entry.get("input") == inputHash and self.getFileHash(path) == entry.get("config")):
+                newManifest[node] = manifest[node]
+            else:
+                configPaths[node] = path
+                newManifest[node] = {"input": inputHash}
+                tasks.append((path, context))
+
+        for (path, _), configHash in zip(tasks, self.renderTasks(tasks, workers, self.getModuleDirectory(templateHash))):
+            newManifest[os.path.basename(os.path.dirname(path))]["config"] = configHash
+
+        # Nodes removed from the topology don't need a config anymore.
+        for node in manifest.keys() - newManifest.keys():
+            shutil.rmtree(os.path.join(outputDir, node), ignore_errors=True)
+
+        os.makedirs(outputDir, exist_ok=True)
+
+        # A re-rendered file that came out the same (ex: the template only changed for other tiers) doesn't need a push either.
+        if(changedOnly):
+            configPaths = {node: path for node, path in configPaths.items() if manifest.get(node, {}).get("config") != newManifest[node]["config"]}
+
+        self.pendingManifests[outputDir] = (manifest, newManifest, set(configPaths))
+
+        if(commit):
+            self.commitManifest(outputDir)
+
+        if(tarballPath):
+            self.packBundle(outputDir, tarballPath)
+
+        return configPaths
+
+    def commitManifest(self, outputDir, pushedNodes=None):
+        """
+        Save the manifest of the last render of a bundle, once its files have been pushed to the nodes.
+
+        :param outputDir: The bundle directory.
+        :param pushedNodes: The nodes whose file was pushed, defaults to every node render returned. The others keep the entry of their
+                            last committed render, so the next changedOnly render returns them again.
+        """
+
+        if(outputDir not in self.pendingManifests):
+            raise ValueError(f"No render of {outputDir} is waiting to be committed")
+
+        manifest, newManifest, renderedNodes = self.pendingManifests.pop(outputDir)
+        unpushedNodes = renderedNodes - set(renderedNodes if pushedNodes is None else pushedNodes)
+
+        nodes = {node: entry for node, entry in newManifest.items() if node not in unpushedNodes}
+        nodes.update({node: manifest[node] for node in unpushedNodes if node in manifest})
+
+        self.saveManifest(outputDir, nodes)
+
+        return
+
+    def packBundle(self, outputDir, tarballPath):
+        """
+        Pack a bundle written by render into a tarball, with each node's directory (and the manifest) at the top level.
+
+        :param outputDir: The bundle directory.
+        :param tarballPath: The tarball to write (compressed if it ends in .gz).
+        """
+
+        with tarfile.open(tarballPath, "w:gz" if tarballPath.endswith(".gz") else "w") as tarball:
+            for node in sorted(os.listdir(outputDir)):
+                tarball.add(os.path.join(outputDir, node), arcname=node)
+
+        return
+
+def benchmark(k=16, t=3, protocol=BGPDCNConfig.PROTOCOL, workerCounts=(1, None), outputDir="clos_configs"):
+    """
+    Time the serial per-node rendering the ClosBuilder books used to do (a Template parsed in this process, then a loop over the nodes)
+    against render with each number of workers.
+
+    :param k: Degree shared by each node.
+    :param t: Number of tiers in the topology.
+    :param protocol: "BGP" or "MTP".
+    :param workerCounts: Numbers of worker processes to time render with. None is the number of CPUs.
+    :param outputDir: Where the bundles are written, one subdirectory per run.
+    :returns: A dictionary of run name to seconds.
+    """
+
+    # A single compute subnet per leaf keeps k=16 within the compute supernet.
+    generatorClass = BGPDCNConfig if protocol == BGPDCNConfig.PROTOCOL else MTPConfig
+    topology = generatorClass(k, t, singleComputeSubnet=True)
+    topology.buildGraph()
+
+    renderer = ConfigRenderer.forTopology(topology)
+    nodes = list(topology.iterNodes(noComputeNodes=True))
+    times = {}
+
+    start = time.perf_counter()
+    template = Template(filename=renderer.templatePath)
+    serialOutput = {node: template.render(**renderer.getContext(topology, node)) for node in nodes}
+    times["serial"] = time.perf_counter() - start
+
+    for workers in workerCounts:
+        runDir = os.path.join(outputDir, f"workers{workers or os.cpu_count()}")
+
+        start = time.perf_counter()
+        configPaths = renderer.render(topology, runDir, workers=workers)
+        times[f"workers={workers or os.cpu_count()}"] = time.perf_counter() - start
+
+        for node, path in configPaths.items():
+            with open(path) as configFile:
+                if(configFile.read() != serialOutput[node]):
+                    raise RuntimeError(f"Batch rendering of {node} doesn't match the serial rendering")
+
+    print(f"Rendered {len(nodes)} {protocol} configurations at k={k}, t={t}:")
+    for run, seconds in times.items():
+        print(f"\t{run}: {seconds:.3f}s")
+
+    return times
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,422 @@
+"""
+Author: Peter Willis
+Desc: Analytical BGP route prediction for folded-Clos fabrics built by BGPDCNConfig. Routes are derived from the valley-free structure
+      of the fabric and its ASN layout instead of running FRR, giving the RIB and FIB size of every node and the UPDATE/withdraw
+      messages a single link failure will cause before a testbed slice is spent on it.
+"""
+
+import math
+from collections import defaultdict
+from ClosGenerator import BGPDCNConfig
+
+# Largest BGP message, minus the 19 byte header and the 4 bytes of length fields an UPDATE always carries.
+UPDATE_PAYLOAD_BYTES = 4096 - 23
+# A /24 takes 4 bytes as withdrawn route or NLRI (length byte and 3 address bytes).
+PREFIX_BYTES = 4
+# Bytes taken by the ORIGIN, NEXT_HOP, and AS_PATH attribute headers of an announcement, before the 4 byte ASNs of the path.
+ANNOUNCEMENT_ATTRIBUTE_BYTES = 3+1 + 3+4 + 3+2
+
+class LinkFailureImpact:
+    def __init__(self, link, numNetworkNodes):
+        """
+        Expected control plane impact of a link failure, once the fabric has reconverged. Per-node counts are keyed by the name of
+        the node, and only hold nodes where the count isn't 0.
+
+        :param link: The (node, neighbor) tuple of the failed link.
+        :param numNetworkNodes: The number of BGP speakers in the fabric, to express the blast radius as a share of.
+        """
+
+        self.link = link
+        self.numNetworkNodes = numNetworkNodes
+        self.messagesSent = defaultdict(int) # UPDATE messages.
+        self.messagesReceived = defaultdict(int)
+        self.withdrawnPrefixes = defaultdict(int) # Prefixes withdrawn, summed over the peers they were sent to.
+        self.announcedPrefixes = defaultdict(int) # Prefixes announced with a new AS_PATH, summed over the peers they were sent to.
+        self.ribChanges = defaultdict(int) # Prefixes whose best path changed, appeared, or disappeared.
+        self.fibChanges = defaultdict(int) # Prefixes whose next hops changed, appeared, or disappeared.
+        self.failedNodes = []
+        self.affectedOrigins = []
+
+    def affectedNodes(self):
+        """
+        Get the nodes BGP_Analysis counts towards the blast radius: the failed nodes, and every node that sent or received an UPDATE.
+
+        :returns: A sorted list of node names.
+        """
+
+        return sorted(set(self.failedNodes) | set(self.messagesSent) | set(self.messagesReceived))
+
+    def blastRadius(self):
+        """
+        :returns: The percentage of network nodes affected by the failure, comparable to BGP_Analysis' blast radius.
+        """
+
+        return len(self.affectedNodes()) / self.numNetworkNodes * 100 if self.numNetworkNodes else 0.0
+
+    def totalMessages(self):
+        return sum(self.messagesSent.values())
+
+    def totalWithdrawnPrefixes(self):
+        return sum(self.withdrawnPrefixes.values())
+
+    def totalAnnouncedPrefixes(self):
+        return sum(self.announcedPrefixes.values())
+
+    def toDict(self):
+        """
+        :returns: The impact as a JSON-serializable dictionary.
+        """
+
+        impact = {name: dict(value) if isinstance(value, defaultdict) else value for name, value in vars(self).items()}
+        impact["link"] = list(self.link)
+        impact["affectedNodes"] = self.affectedNodes()
+        impact["blastRadius"] = self.blastRadius()
+        impact["totalMessages"] = self.totalMessages()
+        impact["totalWithdrawnPrefixes"] = self.totalWithdrawnPrefixes()
+        impact["totalAnnouncedPrefixes"] = self.totalAnnouncedPrefixes()
+
+        return impact
+
+    def __repr__(self):
+        return (f"LinkFailureImpact({self.link[0]} <--> {self.link[1]}: {self.totalMessages()} UPDATEs, "
+                f"{self.totalWithdrawnPrefixes()} withdrawn, {self.totalAnnouncedPrefixes()} announced, "
+                f"blast radius {self.blastRadius():.2f}%)")
+
+class RoutePredictor:
+    def __init__(self, topology):
+        """
+        Predict the routes of a built BGP folded-Clos fabric. Every node advertising prefixes is an origin, and its routes are
+        propagated up towards the top tier and then down, which is the only way they can go: nodes sharing an ASN (a pod's spines,
+        the top tier) drop any path that already passed through one of them, so valleys are never accepted.
+
+        A node's best path is the shortest AS_PATH it accepted, the lowest one when several are as short. The template doesn't
+        relax eBGP multipath, so the next hops of a route are the peers that sent exactly the best AS_PATH.
+
+        :param topology: A BGPDCNConfig object that has been built.
+        """
+
+        if(topology.PROTOCOL != BGPDCNConfig.PROTOCOL):
+            raise ValueError(f"Routes can only be predicted for a {BGPDCNConfig.PROTOCOL} topology, not {topology.PROTOCOL}")
+
+        self.topology = topology
+        graph = topology.clos
+
+        self.networkNodes = [node for node in topology.iterNodes(noComputeNodes=True) if topology.isNetworkNode(node)]
+        self.ASNs = {node: graph.nodes[node]["ASN"] for node in self.networkNodes}
+        self.northPeers = {node: [peer for peer in graph.nodes[node]["northbound"] if topology.isNetworkNode(peer)] for node in self.networkNodes}
+        self.southPeers = {node: [peer for peer in graph.nodes[node]["southbound"] if topology.isNetworkNode(peer)] for node in self.networkNodes}
+        self.peers = {node: self.northPeers[node] + self.southPeers[node] for node in self.networkNodes}
+
+        # Nodes are given routes from the top tier down once the origin's ancestors have them.
+        self.downOrder = sorted(self.networkNodes, key=lambda node: -graph.nodes[node]["tier"])
+
+        self.origins = {node: len(graph.nodes[node]["advertise"]) for node in self.networkNodes if graph.nodes[node].get("advertise")}
+        self.routes = {}
+
+    def getPeers(self, node, failedLinks=frozenset()):
+        """
+        :param node: The name of the node.
+        :param failedLinks: A set of frozensets of the two ends of each failed link.
+        :returns: The BGP peers of the node whose session is up, northbound peers first.
+        """
+
+        if(not failedLinks):
+            return self.peers[node]
+
+        return [peer for peer in self.peers[node] if frozenset((node, peer)) not in failedLinks]
+
+    def selectRoute(self, node, peers, routes):
+        """
+        Run best path selection over the routes a node's peers sent it.
+
+        :param node: The name of the node.
+        :param peers: The peers that have a route and advertise it to the node.
+        :param routes: A dictionary of node name to its (AS_PATH, next hops) route.
+        :returns: The node's (AS_PATH, next hops) route, or None if it accepted no path.
+        """
+
+        ASN = self.ASNs[node]
+        paths = {}
+
+        for peer in peers:
+            path = (self.ASNs[peer],) + routes[peer][0]
+
+            # Loop prevention drops any path carrying the node's own ASN.
+            if(ASN not in path):
+                paths.setdefault(path, []).append(peer)
+
+        if(not paths):
+            return None
+
+        bestPath = min(paths, key=lambda path: (len(path), path))
+
+        return bestPath, tuple(paths[bestPath])
+
+    def computeRoutes(self, origin, failedLinks=frozenset()):
+        """
+        Compute the route every node holds to an origin's prefixes.
+
+        :param origin: The name of the node advertising the prefixes.
+        :param failedLinks: A set of frozensets of the two ends of each failed link.
+        :returns: A dictionary of node name to its (AS_PATH, next hops) route, for the nodes that have one. The origin's route
+                  has an empty AS_PATH and no next hops.
+        """
+
+        routes = {origin: ((), ())}
+
+        # Up: every hop goes one tier north, so each tier of ancestors only learns from the tier below it.
+        frontier = [origin]
+        while(frontier):
+            candidates = {}
+            for south in frontier:
+                for north in self.northPeers[south]:
+                    if(not failedLinks or frozenset((north, south)) not in failedLinks):
+                        candidates.setdefault(north, []).append(south)
+
+            frontier = []
+            for node, peers in candidates.items():
+                route = self.selectRoute(node, peers, routes)
+
+                if(route):
+                    routes[node] = route
+                    frontier.append(node)
+
+        # Down: everyone else learns from the north, whose routes are all final by the time a tier is reached.
+        for node in self.downOrder:
+            if(node in routes):
+                continue
+
+            peers = [north for north in self.northPeers[node] if north in routes and (not failedLinks or frozenset((node, north)) not in failedLinks)]
+            route = self.selectRoute(node, peers, routes)
+
+            if(route):
+                routes[node] = route
+
+        return routes
+
+    def getRoutes(self, origin):
+        """
+        :param origin: The name of a node advertising prefixes.
+        :returns: The routes to the origin with every link up (see computeRoutes). Computed once per origin.
+        """
+
+        if(origin not in self.routes):
+            self.routes[origin] = self.computeRoutes(origin)
+
+        return self.routes[origin]
+
+    def getECMPFanout(self, node):
+        """
+        :param node: The name of the node.
+        :returns: A dictionary of origin to the number of next hops the node installs for its prefixes, for every remote origin it can reach.
+        """
+
+        fanout = {}
+
+        for origin in self.origins:
+            route = self.getRoutes(origin).get(node)
+
+            if(route and origin != node):
+                fanout[origin] = len(route[1])
+
+        return fanout
+
+    def getRouteTable(self):
+        """
+        Compute the routing state every node holds once the fabric has converged.
+
+        :returns: A dictionary of node name to a dictionary of its tier, ASN, RIB routes (prefixes with a best path, its own included),
+                  RIB paths (prefix paths accepted from peers, the Adj-RIB-In), FIB routes (remote prefixes installed), FIB next hops
+                  (prefix and next hop pairs installed), and the smallest and largest ECMP fan-out of its FIB routes.
+        """
+
+        graph = self.topology.clos
+        table = {node: {"tier": graph.nodes[node]["tier"], "ASN": self.ASNs[node], "ribRoutes": 0, "ribPaths": 0,
+                        "fibRoutes": 0, "fibNexthops": 0, "minFanout": None, "maxFanout": None} for node in self.networkNodes}
+
+        for origin, numPrefixes in self.origins.items():
+            routes = self.getRoutes(origin)
+
+            for node, (path, nextHops) in routes.items():
+                state = table[node]
+                state["ribRoutes"] += numPrefixes
+
+                # Each peer with a route sends it to the node, which keeps it unless its own ASN is on the path.
+                for peer in self.getPeers(node):
+                    if(peer in routes and self.ASNs[node] not in (self.ASNs[peer],) + routes[peer][0]):
+                        state["ribPaths"] += numPrefixes
+
+                if(node == origin):
+                    continue
+
+                state["fibRoutes"] += numPrefixes
+                state["fibNexthops"] += numPrefixes * len(nextHops)
+                state["minFanout"] = len(nextHops) if state["minFanout"] is None else min(state["minFanout"], len(nextHops))
+                state["maxFanout"] = len(nextHops) if state["maxFanout"] is None else max(state["maxFanout"], len(nextHops))
+
+        return table
+
+    def getAffectedOrigins(self, node, neighbor, pathChangesOnly=False):
+        """
+        Find the origins whose routes can change when a link between two BGP speakers fails. Only origins routed over the link
+        can, as nothing else had it as a next hop.
+
+        :param node: The name of one end of the link.
+        :param neighbor: The name of the other end of the link.
+        :param pathChangesOnly: Leave out origins that keep their best path at both ends, as the link wasn't their only next hop.
+                                They only change the FIB of the ends, and no UPDATE is sent for them.
+        :returns: A list of origin names.
+        """
+
+        affectedOrigins = []
+
+        for origin in self.origins:
+            routes = self.getRoutes(origin)
+            routeA, routeB = routes.get(node), routes.get(neighbor)
+
+            if(pathChangesOnly):
+                isAffected = (routeA and routeA[1] == (neighbor,)) or (routeB and routeB[1] == (node,))
+            else:
+                isAffected = (routeA and neighbor in routeA[1]) or (routeB and node in routeB[1])
+
+            if(isAffected):
+                affectedOrigins.append(origin)
+
+        return affectedOrigins
+
+    def getLostPrefixes(self, node, neighbor):
+        """
+        Find the prefixes that stop being advertised when a link to a compute or security node goes down.
+
+        :param node: The name of the network node.
+        :param neighbor: The name of the compute or security node.
+        :returns: The number of prefixes the network node withdraws.
+        """
+
+        graph = self.topology.clos
+        ipv4 = graph.nodes[node]["ipv4"]
+
+        if(neighbor in ipv4):
+            subnet = self.topology.getInterfaceSubnet(node, neighbor)
+        else:
+            # A single compute subnet stays up as long as one of its compute nodes does.
+            otherComputeNodes = [south for south in graph.nodes[node]["southbound"] if south != neighbor and graph.edges[node, south]["computeNetwork"]]
+
+            if(otherComputeNodes or "compute" not in ipv4):
+                return 0
+
+            subnet = self.topology.getInterfaceSubnet(node, "compute")
+
+        return 1 if subnet in graph.nodes[node]["advertise"] else 0
+
+    def addRouteChanges(self, impact, before, after, numPrefixes, changes):
+        """
+        Record the changes between the routes to an origin before and after a failure.
+
+        :param impact: The LinkFailureImpact to add RIB and FIB changes to.
+        :param before: The routes before the failure (see computeRoutes).
+        :param after: The routes after the failure.
+        :param numPrefixes: The number of prefixes the routes are for.
+        :param changes: A dictionary of node name to its (withdrawn prefixes, {advertised AS_PATH: announced prefixes}), to add the
+                        node's changed routes to.
+        """
+
+        for node in self.networkNodes:
+            routeBefore, routeAfter = before.get(node), after.get(node)
+
+            if(routeBefore == routeAfter):
+                continue
+
+            if((routeBefore and routeBefore[1]) or (routeAfter and routeAfter[1])):
+                impact.fibChanges[node] += numPrefixes
+
+            pathBefore = routeBefore[0] if routeBefore else None
+            pathAfter = routeAfter[0] if routeAfter else None
+
+            # Only a new best path is sent on, a node that just lost or gained next hops for the same path stays quiet.
+            if(pathBefore == pathAfter):
+                continue
+
+            impact.ribChanges[node] += numPrefixes
+            change = changes.setdefault(node, [0, defaultdict(int)])
+
+            if(pathAfter is None):
+                change[0] += numPrefixes
+            else:
+                change[1][(self.ASNs[node],) + pathAfter] += numPrefixes
+
+        return
+
+    def predictLinkFailure(self, node, neighbor):
+        """
+        Predict the reconvergence that follows a link failure, as done by BGP_Test with NODE_TO_FAIL and NEIGHBOR_TO_FAIL.
+        Counts are for the converged state: the transient paths explored while routes are withdrawn (path hunting) and MRAI
+        batching are not modelled, and every changed route is sent to every peer, which may then drop it by loop prevention.
+
+        :param node: The name of one end of the link.
+        :param neighbor: The name of the other end of the link.
+        :returns: A LinkFailureImpact object.
+        """
+
+        topology = self.topology
+        graph = topology.clos
+
+        if(not graph.has_edge(node, neighbor)):
+            raise ValueError(f"{node} and {neighbor} are not connected")
+
+        impact = LinkFailureImpact((node, neighbor), len(self.networkNodes))
+        impact.failedNodes = [end for end in (node, neighbor) if topology.isNetworkNode(end)]
+        failedLinks = frozenset((frozenset((node, neighbor)),))
+        changes = {}
+
+        if(len(impact.failedNodes) == 2):
+            impact.affectedOrigins = self.getAffectedOrigins(node, neighbor)
+
+            for origin in impact.affectedOrigins:
+                self.addRouteChanges(impact, self.getRoutes(origin), self.computeRoutes(origin, failedLinks), self.origins[origin], changes)
+        elif(impact.failedNodes):
+            # An edge link takes its compute (or security) subnet with it, which is withdrawn everywhere it was known.
+            origin = impact.failedNodes[0]
+            lostPrefixes = self.getLostPrefixes(origin, neighbor if origin == node else node)
+
+            if(lostPrefixes):
+                impact.affectedOrigins.append(origin)
+                self.addRouteChanges(impact, self.getRoutes(origin), {}, lostPrefixes, changes)
+
+        # Withdrawals to a peer are packed together, and announcements are packed by AS_PATH since they share attributes.
+        withdrawalsPerUpdate = UPDATE_PAYLOAD_BYTES // PREFIX_BYTES
+
+        for sender, (withdrawn, announced) in changes.items():
+            numMessages = math.ceil(withdrawn / withdrawalsPerUpdate)
+            numAnnounced = 0
+
+            for path, numPrefixes in announced.items():
+                prefixesPerUpdate = (UPDATE_PAYLOAD_BYTES - ANNOUNCEMENT_ATTRIBUTE_BYTES - 4*len(path)) // PREFIX_BYTES
+                numMessages += math.ceil(numPrefixes / prefixesPerUpdate)
+                numAnnounced += numPrefixes
+
+            for peer in self.getPeers(sender, failedLinks):
+                impact.messagesSent[sender] += numMessages
+                impact.messagesReceived[peer] += numMessages
+                impact.withdrawnPrefixes[sender] += withdrawn
+                impact.announcedPrefixes[sender] += numAnnounced
+
+        return impact
+
+    def predictAllLinkFailures(self):
+        """
+        Predict the impact of failing each link between two BGP speakers, one at a time.
+
+        :returns: A dictionary of (north node, south node) to its LinkFailureImpact.
+        """
+
+        return {(north, south): self.predictLinkFailure(north, south) for north in self.networkNodes for south in self.southPeers[north]}
+
+if __name__ == "__main__":
+    # Matches the default link failed by BGP_Test on a 3-tier fabric.
+    topology = BGPDCNConfig(4, 3)
+    topology.buildGraph()
+    impact = RoutePredictor(topology).predictLinkFailure("T-1", "S-1-1")
+
+    print(impact)
+    print(f"Nodes receiving updated information: {len(impact.affectedNodes())}\nTotal nodes: {impact.numNetworkNodes}")
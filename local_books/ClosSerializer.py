@@ -0,0 +1,368 @@
+"""
+Author: Peter Willis
+Desc: Streaming writers for folded-Clos graph information (the jsonGraphInfo schema) and a lazy reader for the binary format.
+      The binary format is MessagePack encoded with a small built-in encoder, as extra Python packages can't be relied on in the FABRIC JupyterHub.
+"""
+
+import json
+import struct
+
+# Binary graph information file layout:
+#   MAGIC | header record | node records... | index | index offset (uint64, little endian) | MAGIC
+# Every record and the index are MessagePack values. The index maps each node name to its tier and the offset/length of its record.
+MAGIC = b"CLOSGI1\n"
+FOOTER_FORMAT = "<Q"
+
+def packValue(value, out):
+    """
+    Append the MessagePack encoding of a value to a bytearray. Supports None, bool, int, float, str, bytes, list/tuple, and dict.
+
+    :param value: The value to encode.
+    :param out: The bytearray to append to.
+    """
+
+    if(value is None):
+        out.append(0xc0)
+    elif(value is True):
+        out.append(0xc3)
+    elif(value is False):
+        out.append(0xc2)
+    elif(isinstance(value, int)):
+        if(0 <= value < 0x80):
+            out.append(value)
+        elif(-0x20 <= value < 0):
+            out.append(value & 0xff)
+        elif(0 <= value <= 0xff):
+            out += struct.pack(">BB", 0xcc, value)
+        elif(0 <= value <= 0xffff):
+            out += struct.pack(">BH", 0xcd, value)
+        elif(0 <= value <= 0xffffffff):
+            out += struct.pack(">BI", 0xce, value)
+        elif(0 <= value):
+            out += struct.pack(">BQ", 0xcf, value)
+        elif(-0x80 <= value):
+            out += struct.pack(">Bb", 0xd0, value)
+        elif(-0x8000 <= value):
+            out += struct.pack(">Bh", 0xd1, value)
+        elif(-0x80000000 <= value):
+            out += struct.pack(">Bi", 0xd2, value)
+        else:
+            out += struct.pack(">Bq", 0xd3, value)
+    elif(isinstance(value, float)):
+        out += struct.pack(">Bd", 0xcb, value)
+    elif(isinstance(value, str)):
+        data = value.encode("utf-8")
+        size = len(data)
+
+        if(size < 0x20):
+            out.append(0xa0 | size)
+        elif(size <= 0xff):
+            out += struct.pack(">BB", 0xd9, size)
+        elif(size <= 0xffff):
+            out += struct.pack(">BH", 0xda, size)
+        else:
+            out += struct.pack(">BI", 0xdb, size)
+
+        out += data
+    elif(isinstance(value, (bytes, bytearray))):
+        size = len(value)
+
+        if(size <= 0xff):
+            out += struct.pack(">BB", 0xc4, size)
+        elif(size <= 0xffff):
+            out += struct.pack(">BH", 0xc5, size)
+        else:
+            out += struct.pack(">BI", 0xc6, size)
+
+        out += value
+    elif(isinstance(value, (list, tuple))):
+        size = len(value)
+
+        if(size < 0x10):
+            out.append(0x90 | size)
+        elif(size <= 0xffff):
+            out += struct.pack(">BH", 0xdc, size)
+        else:
+            out += struct.pack(">BI", 0xdd, size)
+
+        for item in value:
+            packValue(item, out)
+    elif(isinstance(value, dict)):
+        size = len(value)
+
+        if(size < 0x10):
+            out.append(0x80 | size)
+        elif(size <= 0xffff):
+            out += struct.pack(">BH", 0xde, size)
+        else:
+            out += struct.pack(">BI", 0xdf, size)
+
+        for key, item in value.items():
+            packValue(key, out)
+            packValue(item, out)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} as MessagePack")
+
+    return
+
+def packb(value):
+    """
+    :param value: The value to encode.
+    :returns: The MessagePack encoding of the value as bytes.
+    """
+
+    out = bytearray()
+    packValue(value, out)
+
+    return bytes(out)
+
+# Fixed-size MessagePack types: first byte -> (struct format, size).
+_FIXED_FORMATS = {0xcc: (">B", 1), 0xcd: (">H", 2), 0xce: (">I", 4), 0xcf: (">Q", 8),
+                  0xd0: (">b", 1), 0xd1: (">h", 2), 0xd2: (">i", 4), 0xd3: (">q", 8),
+                  0xca: (">f", 4), 0xcb: (">d", 8)}
+
+# Variable-size MessagePack types: first byte -> (kind, struct format of the length, size of the length).
+_SIZED_FORMATS = {0xd9: ("str", ">B", 1), 0xda: ("str", ">H", 2), 0xdb: ("str", ">I", 4),
+                  0xc4: ("bin", ">B", 1), 0xc5: ("bin", ">H", 2), 0xc6: ("bin", ">I", 4),
+                  0xdc: ("array", ">H", 2), 0xdd: ("array", ">I", 4),
+                  0xde: ("map", ">H", 2), 0xdf: ("map", ">I", 4)}
+
+def unpackValue(data, offset=0):
+    """
+    Decode one MessagePack value.
+
+    :param data: The bytes to decode from.
+    :param offset: Where the value starts.
+    :returns: A tuple of (value, offset just past the value).
+    """
+
+    code = data[offset]
+    offset += 1
+
+    if(code < 0x80):
+        return code, offset
+    elif(code >= 0xe0):
+        return code - 0x100, offset
+    elif(code == 0xc0):
+        return None, offset
+    elif(code == 0xc2):
+        return False, offset
+    elif(code == 0xc3):
+        return True, offset
+    elif(code in _FIXED_FORMATS):
+        fmt, size = _FIXED_FORMATS[code]
+        return struct.unpack_from(fmt, data, offset)[0], offset + size
+
+    if(0xa0 <= code <= 0xbf):
+        kind, size = "str", code & 0x1f
+    elif(0x90 <= code <= 0x9f):
+        kind, size = "array", code & 0x0f
+    elif(0x80 <= code <= 0x8f):
+        kind, size = "map", code & 0x0f
+    elif(code in _SIZED_FORMATS):
+        kind, fmt, lengthSize = _SIZED_FORMATS[code]
+        size = struct.unpack_from(fmt, data, offset)[0]
+        offset += lengthSize
+    else:
+        raise ValueError(f"Unsupported MessagePack type 0x{code:02x}")
+
+    if(kind == "str"):
+        return bytes(data[offset:offset+size]).decode("utf-8"), offset + size
+    elif(kind == "bin"):
+        return bytes(data[offset:offset+size]), offset + size
+    elif(kind == "array"):
+        items = []
+        for _ in range(size):
+            item, offset = unpackValue(data, offset)
+            items.append(item)
+        return items, offset
+    else:
+        items = {}
+        for _ in range(size):
+            key, offset = unpackValue(data, offset)
+            items[key], offset = unpackValue(data, offset)
+        return items, offset
+
+def unpackb(data):
+    """
+    :param data: The MessagePack-encoded bytes of a single value.
+    :returns: The decoded value.
+    """
+
+    return unpackValue(data)[0]
+
+def iterGraphInfoRecords(topology, nodeExtras=None):
+    """
+    Iterate over the per-node graph information records of a topology, tier by tier (top tier first) and in sorted node order.
+
+    :param topology: A built ClosGenerator (or protocol subclass) object.
+    :param nodeExtras: A function taking a node name and returning a dictionary of additional information for that node.
+    :returns: Yields (tier, node name, record) tuples.
+    """
+
+    for tier in topology.graphInfoTiers():
+        for node in topology.getTierNodes(tier):
+            record = topology.nodeGraphInfo(node, tier)
+
+            if(nodeExtras):
+                record.update(nodeExtras(node))
+
+            yield tier, node, record
+
+def writeJsonGraphInfo(topology, fileHandle, extraInfo=None, nodeExtras=None):
+    """
+    Stream the JSON graph information of a topology. Only one node's record is held in memory at a time, and the output is
+    byte-for-byte what json.dump would write for jsonGraphInfo() with the extra information added.
+
+    :param topology: A built ClosGenerator (or protocol subclass) object.
+    :param fileHandle: A file opened in text mode.
+    :param extraInfo: A dictionary of additional top-level information, written after the tiers.
+    :param nodeExtras: A function taking a node name and returning a dictionary of additional information for that node.
+    """
+
+    fileHandle.write("{")
+    isFirstItem = True
+
+    def writeKey(key):
+        nonlocal isFirstItem
+        fileHandle.write(("" if isFirstItem else ", ") + json.dumps(key) + ": ")
+        isFirstItem = False
+
+    for key, value in topology.graphInfoHeader().items():
+        writeKey(key)
+        fileHandle.write(json.dumps(value))
+
+    for tier in topology.graphInfoTiers():
+        writeKey(f"tier_{tier}")
+        fileHandle.write("{")
+        isFirstNode = True
+
+        for node in topology.getTierNodes(tier):
+            record = topology.nodeGraphInfo(node, tier)
+
+            if(nodeExtras):
+                record.update(nodeExtras(node))
+
+            fileHandle.write(("" if isFirstNode else ", ") + json.dumps(node) + ": " + json.dumps(record))
+            isFirstNode = False
+
+        fileHandle.write("}")
+
+    for key, value in (extraInfo or {}).items():
+        writeKey(key)
+        fileHandle.write(json.dumps(value))
+
+    fileHandle.write("}")
+
+    return
+
+def writeBinaryGraphInfo(topology, fileHandle, extraInfo=None, nodeExtras=None):
+    """
+    Stream the graph information of a topology in the binary format. Records are written one at a time, followed by an index
+    of where each node's record is so that GraphInfoReader can open a single node without reading the rest of the file.
+
+    :param topology: A built ClosGenerator (or protocol subclass) object.
+    :param fileHandle: A file opened in binary mode.
+    :param extraInfo: A dictionary of additional top-level information, stored with the header.
+    :param nodeExtras: A function taking a node name and returning a dictionary of additional information for that node.
+    """
+
+    header = topology.graphInfoHeader()
+    header["tiers"] = list(topology.graphInfoTiers())
+    header.update(extraInfo or {})
+
+    fileHandle.write(MAGIC)
+    offset = len(MAGIC)
+
+    data = packb(header)
+    fileHandle.write(data)
+    index = {"header": [offset, len(data)], "nodes": {}}
+    offset += len(data)
+
+    for tier, node, record in iterGraphInfoRecords(topology, nodeExtras):
+        data = packb(record)
+        fileHandle.write(data)
+        index["nodes"][node] = [tier, offset, len(data)]
+        offset += len(data)
+
+    fileHandle.write(packb(index))
+    fileHandle.write(struct.pack(FOOTER_FORMAT, offset) + MAGIC)
+
+    return
+
+class GraphInfoReader:
+    """
+    Lazy reader for binary graph information files. Only the header and the index are read when the file is opened;
+    a node's record is read and decoded when it is asked for.
+
+    Example:
+        with GraphInfoReader("clos_k4_t3_BGP.bin") as graphInfo:
+            print(graphInfo.header["numTiers"], graphInfo["L-1-1"]["ASN"])
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+
+        if(self.file.read(len(MAGIC)) != MAGIC):
+            self.file.close()
+            raise ValueError(f"{path} is not a binary graph information file")
+
+        # The footer holds the index offset, followed by the magic value again.
+        footerSize = struct.calcsize(FOOTER_FORMAT) + len(MAGIC)
+        footerOffset = self.file.seek(-footerSize, 2)
+        indexOffset = struct.unpack_from(FOOTER_FORMAT, self.file.read(footerSize))[0]
+
+        self.file.seek(indexOffset)
+        index = unpackb(self.file.read(footerOffset - indexOffset))
+
+        self.nodeIndex = index["nodes"]
+        self.header = self.readRecord(*index["header"])
+
+    def readRecord(self, offset, length):
+        self.file.seek(offset)
+        return unpackb(self.file.read(length))
+
+    def getNode(self, node):
+        """
+        :param node: The name of the node.
+        :returns: The node's graph information record.
+        """
+
+        _, offset, length = self.nodeIndex[node]
+        return self.readRecord(offset, length)
+
+    def getTier(self, node):
+        return self.nodeIndex[node][0]
+
+    def nodes(self, tier=None):
+        """
+        :param tier: Only list nodes in this tier, if given.
+        :returns: A list of node names, in the order they were written.
+        """
+
+        return [node for node, entry in self.nodeIndex.items() if tier is None or entry[0] == tier]
+
+    def iterRecords(self):
+        for node in self.nodeIndex:
+            yield node, self.getNode(node)
+
+    def __getitem__(self, node):
+        return self.getNode(node)
+
+    def __contains__(self, node):
+        return node in self.nodeIndex
+
+    def __iter__(self):
+        return iter(self.nodeIndex)
+
+    def __len__(self):
+        return len(self.nodeIndex)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,191 @@
+"""
+Author: Peter Willis
+Desc: Exact folded-Clos statistics computed from the port configuration alone. Counts honor southboundPortsConfig and the
+      BGP security node, and take a handful of integer operations for any k and t, so no graph has to be built.
+"""
+
+class ClosStats:
+    # Types of links in the topology.
+    CORE_LINK = "core" # Leaf-spine and spine-spine.
+    EDGE_LINK = "edge" # Leaf-compute.
+    SECURITY_LINK = "security" # Top tier-security node.
+
+    def __init__(self, generator):
+        """
+        Compute the exact node, link, and interface counts of the topology a generator builds.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object holding the folded-Clos parameters.
+        """
+
+        layout = generator.getLayout()
+        sb = layout.southboundPorts
+        t = layout.numTiers
+
+        self.sharedDegree = layout.sharedDegree
+        self.numTiers = t
+        self.singleComputeSubnet = getattr(generator, "singleComputeSubnet", False)
+        self.secTier = getattr(generator, "SEC_TIER", None)
+
+        # Links per tier, keyed by the tier of their northern end.
+        self.tierLinks = {tier: layout.tierEdgeCount(tier) for tier in range(layout.LEAF_TIER, t+1)}
+
+        # The build walks down from the ToF nodes, so a leaf is only reached through a tier-2 spine and nothing is built under a ToF without southbound ports.
+        leavesReached = sb[layout.LOWEST_SPINE_TIER] > 0 and self.tierLinks[t] > 0
+        if(self.tierLinks[t] == 0):
+            self.tierLinks = {tier: 0 for tier in self.tierLinks}
+        elif(not leavesReached):
+            self.tierLinks[layout.LEAF_TIER] = 0
+
+        self.hasSecNode = getattr(generator, "hasSecurityNode", False) and sum(self.tierLinks.values()) > 0
+
+        # Leaves are either reached by the tier-2 spines (the first sb[2] slots), or iterated to connect compute nodes (the first groupSize slots).
+        leavesWithSpines = min(sb[layout.LOWEST_SPINE_TIER], layout.groupWidth[layout.LEAF_TIER])
+        self.computeLeavesPerPod = layout.groupSize[layout.LEAF_TIER] if sb[layout.LEAF_TIER] > 0 and leavesReached else 0
+        leavesPerPod = max(leavesWithSpines, self.computeLeavesPerPod)
+
+        # A pod is a group of tier-2 nodes with the leaves and compute nodes below them. A 2-tier topology is a single pod.
+        self.numPods = layout.numGroups[layout.LOWEST_SPINE_TIER] if self.tierLinks[t] > 0 else 0
+        self.podNodes = {layout.LOWEST_SPINE_TIER: layout.groupSize[layout.LOWEST_SPINE_TIER],
+                         layout.LEAF_TIER: leavesPerPod,
+                         layout.COMPUTE_TIER: self.computeLeavesPerPod * sb[layout.LEAF_TIER]}
+
+        # Nodes only exist once they are part of a link.
+        self.tierNodes = {tier: layout.tierCount(tier) for tier in range(layout.LOWEST_SPINE_TIER, t+1)}
+        self.tierNodes[layout.LEAF_TIER] = self.numPods * leavesPerPod if leavesReached else 0
+        self.tierNodes[layout.COMPUTE_TIER] = self.numPods * self.podNodes[layout.COMPUTE_TIER]
+
+        if(self.tierLinks[t] == 0):
+            self.tierNodes = {tier: 0 for tier in self.tierNodes}
+
+        if(self.hasSecNode):
+            self.tierNodes[self.secTier] = 1
+
+        self.linkTypes = {self.CORE_LINK: sum(links for tier, links in self.tierLinks.items() if tier >= layout.LOWEST_SPINE_TIER),
+                          self.EDGE_LINK: self.tierLinks[layout.LEAF_TIER],
+                          self.SECURITY_LINK: 1 if self.hasSecNode else 0}
+
+        # Interfaces per tier: one per southbound link and one per northbound link.
+        self.tierInterfaces = {tier: self.tierLinks.get(tier, 0) + self.tierLinks.get(tier+1, 0) for tier in range(t+1)}
+        if(self.hasSecNode):
+            self.tierInterfaces[t] += 1
+            self.tierInterfaces[self.secTier] = 1
+
+    def numNodes(self):
+        return sum(self.tierNodes.values())
+
+    def numLinks(self):
+        return sum(self.linkTypes.values())
+
+    def numTofNodes(self):
+        return self.tierNodes[self.numTiers]
+
+    def numServers(self):
+        return self.tierNodes[0]
+
+    def numSwitches(self):
+        return sum(count for tier, count in self.tierNodes.items() if tier > 0)
+
+    def numLeaves(self):
+        return self.tierNodes[1]
+
+    def numInterfaces(self):
+        return 2*self.numLinks()
+
+    def numNetworks(self):
+        """
+        :returns: The number of L2 networks in the FABRIC slice (see iterNetwork). A leaf's compute links share one network if a single compute subnet is used.
+        """
+
+        edgeNetworks = self.numPods * self.computeLeavesPerPod if self.singleComputeSubnet else self.linkTypes[self.EDGE_LINK]
+
+        return self.linkTypes[self.CORE_LINK] + edgeNetworks + self.linkTypes[self.SECURITY_LINK]
+
+    def numNICs(self):
+        """
+        :returns: The number of NICs in the FABRIC slice, one per node per network it is on.
+        """
+
+        edgeNICs = self.linkTypes[self.EDGE_LINK] + (self.numPods * self.computeLeavesPerPod if self.singleComputeSubnet else self.linkTypes[self.EDGE_LINK])
+
+        # With a single compute subnet, the security link is grouped like a compute network under the security node, which has no southbound nodes, so only its own NIC is on it.
+        securityNICs = self.linkTypes[self.SECURITY_LINK] if self.singleComputeSubnet else 2*self.linkTypes[self.SECURITY_LINK]
+
+        return 2*self.linkTypes[self.CORE_LINK] + edgeNICs + securityNICs
+
+    def toDict(self):
+        """
+        :returns: Every statistic as a JSON-serializable dictionary.
+        """
+
+        return {"numTofNodes": self.numTofNodes(),
+                "numServers": self.numServers(),
+                "numSwitches": self.numSwitches(),
+                "numLeaves": self.numLeaves(),
+                "numPods": self.numPods,
+                "numNodes": self.numNodes(),
+                "numLinks": self.numLinks(),
+                "numInterfaces": self.numInterfaces(),
+                "numNetworks": self.numNetworks(),
+                "numNICs": self.numNICs(),
+                "tierNodes": {str(tier): count for tier, count in sorted(self.tierNodes.items(), reverse=True)},
+                "tierLinks": {str(tier): count for tier, count in sorted(self.tierLinks.items(), reverse=True)},
+                "tierInterfaces": {str(tier): count for tier, count in sorted(self.tierInterfaces.items(), reverse=True)},
+                "podNodes": {str(tier): count for tier, count in self.podNodes.items()},
+                "linkTypes": dict(self.linkTypes)}
+
+    def compareWithGraph(self, generator):
+        """
+        Count the same statistics from a built graph and report any that differ.
+
+        :param generator: The ClosGenerator, BGPDCNConfig, or MTPConfig object after buildGraph.
+        :returns: A dictionary of statistic name to (computed, counted) for every mismatch. Empty if the stats are exact.
+        """
+
+        graph = generator.clos
+        tiers = dict(graph.nodes(data="tier"))
+        mismatches = {}
+
+        def compare(name, computed, counted):
+            if(computed != counted):
+                mismatches[name] = (computed, counted)
+
+        for tier, count in self.tierNodes.items():
+            compare(f"tierNodes[{tier}]", count, sum(1 for nodeTier in tiers.values() if nodeTier == tier))
+
+        for tier, count in self.tierLinks.items():
+            compare(f"tierLinks[{tier}]", count, sum(1 for a, b in graph.edges if max(tiers[a], tiers[b]) == tier and min(tiers[a], tiers[b]) == tier-1))
+
+        for tier, count in self.tierInterfaces.items():
+            compare(f"tierInterfaces[{tier}]", count, sum(graph.degree(node) for node, nodeTier in tiers.items() if nodeTier == tier))
+
+        pods = {}
+        for tier in self.podNodes:
+            for node in generator.getTierNodes(tier):
+                pods.setdefault(tier, {}).setdefault(generator.getPodName(node, tier), 0)
+                pods[tier][generator.getPodName(node, tier)] += 1
+
+        compare("numPods", self.numPods, len(pods.get(generator.LOWEST_SPINE_TIER, {})))
+
+        for tier, count in self.podNodes.items():
+            podCounts = set(pods.get(tier, {}).values())
+            compare(f"podNodes[{tier}]", {count} if count and self.numPods else set(), podCounts)
+
+        compare("numLinks", self.numLinks(), graph.number_of_edges())
+        compare("numInterfaces", self.numInterfaces(), sum(degree for _, degree in graph.degree))
+
+        if(hasattr(generator, "iterNetwork")):
+            networks = list(generator.iterNetwork())
+            compare("numNetworks", self.numNetworks(), len(networks))
+            compare("numNICs", self.numNICs(), sum(len(network) for network in networks))
+
+        return mismatches
+
+    def __str__(self):
+        stats = (f"Number of ToF Nodes: {self.numTofNodes()}\nNumber of physical servers: {self.numServers()}\n"
+                 f"Number of networking nodes: {self.numSwitches()}\nNumber of leaves: {self.numLeaves()}\nNumber of Pods: {self.numPods}\n")
+
+        stats += f"Number of links: {self.numLinks()} ({self.linkTypes[self.CORE_LINK]} core, {self.linkTypes[self.EDGE_LINK]} edge"
+        stats += f", {self.linkTypes[self.SECURITY_LINK]} security)\n" if self.hasSecNode else ")\n"
+        stats += f"Number of interfaces: {self.numInterfaces()}\n"
+
+        return stats
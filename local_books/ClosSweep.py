@@ -0,0 +1,300 @@
+"""
+Author: Peter Willis
+Desc: Parameter sweeps over folded-Clos variants. Each variant is built (or evaluated from its compact arrays) in a process pool and
+      its results are streamed to a CSV or Parquet table as they come in.
+"""
+
+import os
+import csv
+import time
+import tracemalloc
+import numpy as np
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+from ClosGenerator import ClosGenerator, BGPDCNConfig, MTPConfig
+from ClosCompact import CompactClosTopology
+
+# Generator class used for each protocol. None builds the plain topology without protocol attributes.
+GENERATORS = {None: ClosGenerator, BGPDCNConfig.PROTOCOL: BGPDCNConfig, MTPConfig.PROTOCOL: MTPConfig}
+
+# Ways a variant can be evaluated.
+ANALYTICAL_MODE = "analytical" # Compute the CompactClosTopology arrays only.
+BUILD_MODE = "build" # Build the networkx graph with buildGraph.
+
+# Columns of the results table, before the per-tier node counts.
+COLUMNS = ["variant", "protocol", "k", "t", "southboundPorts", "singleComputeSubnet", "corePrefixLength", "mode",
+           "nodes", "networkNodes", "computeNodes", "links", "coreLinks", "computeLinks", "NICs",
+           "coreSubnets", "computeSubnets", "addresses", "ASNs", "seconds", "memoryBytes", "error"]
+
+def iterVariants(protocols=(BGPDCNConfig.PROTOCOL,), kValues=(4,), tValues=(3,), southboundPortsConfigs=(None,), singleComputeSubnet=(False,), corePrefixLengths=(None,)):
+    """
+    Iterate over every combination of the given folded-Clos parameters.
+
+    :param protocols: Protocols to sweep ("BGP", "MTP", or None for the plain topology).
+    :param kValues: Shared degrees to sweep.
+    :param tValues: Numbers of tiers to sweep.
+    :param southboundPortsConfigs: Southbound port overrides to sweep (see ClosGenerator), None being the default density.
+    :param singleComputeSubnet: singleComputeSubnet values to sweep. Ignored by the plain topology.
+    :param corePrefixLengths: Core subnet prefix lengths to sweep (see BGPDCNConfig), None being the default /24. Only used by BGP.
+    :returns: Yields variant dictionaries.
+    """
+
+    for protocol, k, t, ports, singleSubnet, corePrefixLength in product(protocols, kValues, tValues, southboundPortsConfigs, singleComputeSubnet, corePrefixLengths):
+        # The plain topology has no compute subnets, so only one of the singleComputeSubnet values is kept. Only BGP addresses core links.
+        if(protocol is None and singleSubnet != singleComputeSubnet[0]):
+            continue
+        if(protocol != BGPDCNConfig.PROTOCOL and corePrefixLength != corePrefixLengths[0]):
+            continue
+
+        yield {"protocol": protocol, "k": k, "t": t, "southboundPortsConfig": ports, "singleComputeSubnet": singleSubnet if protocol else False,
+               "corePrefixLength": corePrefixLength if protocol == BGPDCNConfig.PROTOCOL else None}
+
+def getGenerator(variant):
+    generatorClass = GENERATORS[variant["protocol"]]
+    kwargs = {"southboundPortsConfig": variant["southboundPortsConfig"]}
+
+    if(variant["protocol"]):
+        kwargs["singleComputeSubnet"] = variant["singleComputeSubnet"]
+    if(variant.get("corePrefixLength")):
+        kwargs["corePrefixLength"] = variant["corePrefixLength"]
+
+    return generatorClass(variant["k"], variant["t"], **kwargs)
+
+def getGraphCounts(generator):
+    """
+    Count the nodes, links, and resources used by a built networkx graph.
+
+    :param generator: A ClosGenerator (or protocol subclass) object after buildGraph.
+    :returns: A dictionary of counts, keyed like the results table.
+    """
+
+    graph = generator.clos
+    counts = {f"tier{tier}Nodes": len(generator.getTierNodes(tier)) for tier in range(generator.numTiers+1)}
+
+    computeLinks = sum(1 for a, b in graph.edges if min(graph.nodes[a]["tier"], graph.nodes[b]["tier"]) <= generator.COMPUTE_TIER)
+    ASNs = {asn for _, asn in graph.nodes(data="ASN") if asn is not None}
+    addresses = sum(1 for _, ipv4 in graph.nodes(data="ipv4") if ipv4 for address in ipv4.values() if address != "MTP")
+    routes = sum(len(advertise) for _, advertise in graph.nodes(data="advertise") if advertise)
+
+    counts.update({"nodes": graph.number_of_nodes(),
+                   "networkNodes": sum(1 for _, tier in graph.nodes(data="tier") if tier > generator.COMPUTE_TIER),
+                   "links": graph.number_of_edges(),
+                   "computeLinks": computeLinks,
+                   "coreLinks": graph.number_of_edges() - computeLinks,
+                   "NICs": 2*graph.number_of_edges(),
+                   "coreSubnets": graph.number_of_edges() - computeLinks if generator.PROTOCOL == BGPDCNConfig.PROTOCOL and not generator.unnumbered else 0,
+                   "computeSubnets": routes,
+                   "addresses": addresses,
+                   "ASNs": len(ASNs)})
+
+    # MTPConfig doesn't record advertised routes, so its compute subnets are counted from the leaf end of each one.
+    if(generator.PROTOCOL == MTPConfig.PROTOCOL):
+        counts["computeSubnets"] = sum(len(graph.nodes[leaf]["ipv4"]) for leaf in generator.getTierNodes(generator.LEAF_TIER))
+
+    counts["computeNodes"] = counts["nodes"] - counts["networkNodes"]
+
+    return counts
+
+def getCompactCounts(topology):
+    """
+    Count the nodes, links, and resources used by a compact topology.
+
+    :param topology: A CompactClosTopology object.
+    :returns: A dictionary of counts, keyed like the results table.
+    """
+
+    tiers = topology.tier[topology.exists]
+    counts = {f"tier{tier}Nodes": int(np.count_nonzero(tiers == tier)) for tier in range(topology.numTiers+1)}
+
+    links = topology.numEdges()
+    computeLinks = int(np.count_nonzero(topology.edgeCompute))
+    addressed = topology.edgeNorthAddress != CompactClosTopology.NO_VALUE
+
+    counts.update({"nodes": int(len(tiers)),
+                   "networkNodes": int(np.count_nonzero(tiers > ClosGenerator.COMPUTE_TIER)),
+                   "computeNodes": int(np.count_nonzero(tiers <= ClosGenerator.COMPUTE_TIER)),
+                   "links": links,
+                   "computeLinks": computeLinks,
+                   "coreLinks": links - computeLinks,
+                   "NICs": 2*links,
+                   "coreSubnets": int(np.count_nonzero(addressed & ~topology.edgeCompute)),
+                   "computeSubnets": int(np.count_nonzero(topology.edgeNewSubnet)),
+                   "addresses": int(np.count_nonzero(addressed & ~topology.edgeCompute)) + int(np.count_nonzero(topology.edgeNewSubnet))
+                                + int(np.count_nonzero(topology.edgeSouthAddress != CompactClosTopology.NO_VALUE)),
+                   "ASNs": int(len(np.unique(topology.ASN[topology.ASN != CompactClosTopology.NO_VALUE])))})
+
+    return counts
+
+def buildVariant(variant, mode):
+    """
+    Build one folded-Clos variant, without counting anything.
+
+    :param variant: A variant dictionary (see iterVariants).
+    :param mode: "analytical" to only compute the compact arrays, or "build" to build the networkx graph.
+    :returns: The generator after buildGraph in build mode, or the CompactClosTopology in analytical mode.
+    """
+
+    generator = getGenerator(variant)
+
+    if(mode == BUILD_MODE):
+        generator.buildGraph(engine=ClosGenerator.VECTORIZED_ENGINE)
+        return generator
+    elif(mode == ANALYTICAL_MODE):
+        return CompactClosTopology(generator)
+    else:
+        raise ValueError(f"Unknown sweep mode: {mode}")
+
+def evaluateVariant(variant, mode=ANALYTICAL_MODE):
+    """
+    Build or analytically evaluate one folded-Clos variant. Errors (ex: running out of address space) are reported in the row instead of raised.
+    The variant is built twice: once timed, and once with tracemalloc on to measure its peak memory, as tracing every allocation slows the build down.
+
+    :param variant: A variant dictionary (see iterVariants).
+    :param mode: "analytical" to only compute the compact arrays, or "build" to build the networkx graph.
+    :returns: A results table row.
+    """
+
+    ports = variant["southboundPortsConfig"]
+
+    row = {"protocol": variant["protocol"] or "",
+           "k": variant["k"],
+           "t": variant["t"],
+           "southboundPorts": ";".join(f"{tier}:{ports[tier]}" for tier in sorted(ports)) if ports else "",
+           "singleComputeSubnet": variant["singleComputeSubnet"],
+           "corePrefixLength": variant.get("corePrefixLength") or "",
+           "mode": mode,
+           "error": ""}
+
+    start = time.perf_counter()
+
+    # The protocol subclasses run out of addresses on large fabrics (IndexError when building, ValueError from the compact arrays).
+    try:
+        built = buildVariant(variant, mode)
+        row["seconds"] = time.perf_counter() - start
+        row.update(getGraphCounts(built) if mode == BUILD_MODE else getCompactCounts(built))
+    except (IndexError, ValueError) as error:
+        row["seconds"] = time.perf_counter() - start
+        row["error"] = f"{type(error).__name__}: {error}"
+
+    # Free the timed build before the traced one, so the two aren't in memory at once.
+    built = None
+
+    tracemalloc.start()
+
+    try:
+        buildVariant(variant, mode)
+    except (IndexError, ValueError):
+        pass # Already reported by the timed build.
+
+    row["memoryBytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return row
+
+def evaluateIndexedVariant(arguments):
+    index, variant, mode = arguments
+    row = evaluateVariant(variant, mode)
+    row["variant"] = index
+
+    return row
+
+class CSVTableWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns, restval="")
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ParquetTableWriter:
+    # Rows are buffered and written as a Parquet row group every ROW_GROUP_SIZE rows.
+    ROW_GROUP_SIZE = 256
+
+    def __init__(self, path, columns):
+        # pyarrow is only needed for Parquet output, so it isn't imported unless asked for.
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as error:
+            raise ImportError("Parquet output requires pyarrow, use a .csv path instead") from error
+
+        self.pyarrow = pyarrow
+        self.path = path
+        self.columns = columns
+        self.rows = []
+        self.writer = None
+
+    def write(self, row):
+        self.rows.append(row)
+
+        if(len(self.rows) >= self.ROW_GROUP_SIZE):
+            self.flush()
+
+    def flush(self):
+        if(not self.rows):
+            return
+
+        table = self.pyarrow.Table.from_pydict({column: [row.get(column) for row in self.rows] for column in self.columns})
+
+        if(self.writer is None):
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+
+        self.writer.write_table(table.cast(self.writer.schema))
+        self.rows.clear()
+
+    def close(self):
+        self.flush()
+
+        if(self.writer):
+            self.writer.close()
+
+def sweep(variants, outputPath="clos_sweep.csv", mode=ANALYTICAL_MODE, workers=None):
+    """
+    Evaluate many folded-Clos variants in a process pool, writing each result row as soon as it is ready (in variant order).
+
+    Example:
+        sweep(iterVariants(protocols=("BGP", "MTP"), kValues=(4, 6, 8), tValues=(2, 3), singleComputeSubnet=(False, True)))
+
+    :param variants: Variant dictionaries (see iterVariants).
+    :param outputPath: The results table. A path ending in .parquet is written as Parquet (requires pyarrow), anything else as CSV.
+    :param mode: "analytical" to only compute the compact arrays, or "build" to build the networkx graph of each variant.
+    :param workers: Number of worker processes, defaults to the number of CPUs. 1 evaluates every variant in this process.
+    :returns: The list of result rows.
+    """
+
+    variants = list(variants)
+    maxTiers = max((variant["t"] for variant in variants), default=0)
+    columns = COLUMNS + [f"tier{tier}Nodes" for tier in range(maxTiers+1)]
+
+    writerClass = ParquetTableWriter if outputPath.endswith(".parquet") else CSVTableWriter
+    writer = writerClass(outputPath, columns)
+
+    tasks = [(index, variant, mode) for index, variant in enumerate(variants)]
+    rows = []
+    executor = None
+
+    try:
+        if(workers == 1):
+            results = map(evaluateIndexedVariant, tasks)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+            results = executor.map(evaluateIndexedVariant, tasks)
+
+        for row in results:
+            writer.write(row)
+            rows.append(row)
+    finally:
+        writer.close()
+
+        if(executor):
+            executor.shutdown()
+
+    return rows
+
+if __name__ == "__main__":
+    sweep(iterVariants(protocols=(None, BGPDCNConfig.PROTOCOL, MTPConfig.PROTOCOL), kValues=(4, 8, 16, 32), tValues=(2, 3, 4), singleComputeSubnet=(False, True)))
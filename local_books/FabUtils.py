@@ -187,6 +187,44 @@ class FabOrchestrator:
         return
 
     
+    def uploadNodeFilesParallel(self, nodeFiles, remoteLocation):
+        '''
+        Upload a different file to each node (ex: a config bundle from ClosRender), in parallel using threads.
+
+        :param nodeFiles: A dictionary of node name to the path of the file to upload to that node.
+        :param remoteLocation: The full path the file is placed at on each node.
+        :returns: A list of the nodes the file was uploaded to. An upload that failed is printed and its node left out.
+        '''
+
+        print(f'Uploading {len(nodeFiles)} node files\nPlaced in: {remoteLocation}')
+
+        uploadedNodes = []
+
+        #Create execute threads
+        execute_threads = {}
+        for nodeName, file in nodeFiles.items():
+            try:
+                print(f"Starting upload of {file} on node {nodeName}")
+                execute_threads[nodeName] = self.nodeDict[nodeName].upload_file_thread(file, remoteLocation)
+            except Exception as e:
+                print(f"Exception on node {nodeName}: {e}")
+
+        #Wait for results from threads, a node that failed doesn't stop the others from being checked
+        for nodeName, thread in execute_threads.items():
+            try:
+                print(f"Waiting for result from node {nodeName}")
+                output = thread.result()
+                print(f"Output: {output}")
+                uploadedNodes.append(nodeName)
+            except Exception as e:
+                print(f"Exception on node {nodeName}: {e}")
+
+        if(len(uploadedNodes) < len(nodeFiles)):
+            print(f"Failed to upload to {len(nodeFiles) - len(uploadedNodes)} nodes: {sorted(nodeFiles.keys() - set(uploadedNodes))}")
+
+        return uploadedNodes
+
+    
     def downloadFilesParallel(
             self,
             localLocation,
@@ -45,8 +45,11 @@
 # | SINGLE_COMPUTE_SUBNET     | If you want a leaf to only have one compute subnet, then set this to true. Otherwise, all compute nodes off of a leaf will be contained in their own subnet. |
 # | SOUTHBOUND_PORT_DENSITY | If you want to change how many southbound ports are used for a device at a given tier, it needs to be placed in a dictonary with the key being the tier and the value being the updated southbound port density. For example, If I want tier 3 spines to only have 2 southbound ports, I would modify this variable to show {3:2}. |
 # | SEC_ADD | If you want to add a security node to perform experiments with a simulated hacker, set this to true.
+# | CORE_PREFIX_LENGTH | The prefix length of each core (leaf-spine and spine-spine) subnet. /24 by default, /30 or /31 fit more core links in the core supernet. |
+# | UNNUMBERED | If you want core links to have no IPv4 addresses, set this to true. BGP then peers over the IPv6 link-local address of each interface (BGP unnumbered), and only compute links are addressed. |
 # | BGP_SCRIPTS_LOCATION     | The full path to the bgp_scripts directory. Don't change the name of the files inside of the directory unless you change it in this book as well. |
 # | TEMPLATE_LOCATION     | The full path to the BGP Mako template. You don't need to understand how Mako works, the book takes care of it. Don't change the name of the files inside of the directory unless you change it in this book as well. |
+# | CONFIG_BUNDLE_LOCATION | The local directory the per-node configuration files are rendered into, one sub-directory per node. |
 
 # %%
 # FABRIC Configuration
@@ -61,8 +64,11 @@ COMPUTE_NODE_PREFIXES = "C"
 SEC_NODE_PREFIX = "H"
 SINGLE_COMPUTE_SUBNET = False
 SOUTHBOUND_PORT_DENSITY = {1:1}
+CORE_PREFIX_LENGTH = 24 # 30 or 31 (RFC 3021 point-to-point) to fit more core links in the core supernet
+UNNUMBERED = False
 BGP_SCRIPTS_LOCATION = "/home/pjw7904/fabric/FABRIC-Automation/remote_scripts/bgp_scripts"
 TEMPLATE_LOCATION = "/home/pjw7904/fabric/FABRIC-Automation/remote_scripts/frr_templates/frr_conf_bgp.mako"
+CONFIG_BUNDLE_LOCATION = "bgp_configs"
 
 # %% [markdown]
 # ## <span style="color: #de4815"><b>Access the Fablib Library and Confirm Configuration</b></span>
@@ -92,12 +98,13 @@ from ClosGenerator import *
 topology = BGPDCNConfig(PORTS_PER_DEVICE, 
                         NUMBER_OF_TIERS, 
                         southboundPortsConfig=SOUTHBOUND_PORT_DENSITY, 
-                        singleComputeSubnet=SINGLE_COMPUTE_SUBNET)
+                        singleComputeSubnet=SINGLE_COMPUTE_SUBNET,
+                        corePrefixLength=CORE_PREFIX_LENGTH,
+                        unnumbered=UNNUMBERED)
 topology.buildGraph()
-logFile = topology.jsonGraphInfo()
 
 print("BGP configuration complete\n")
-print(f"Folded-Clos topology details (Not considering port density changes and security node additions):\n{topology.getClosStats()}")
+print(f"Folded-Clos topology details:\n{topology.getClosStats()}")
 
 # %% [markdown]
 # ## <span style="color: #de4815"><b>Prepare the BGP Configuration Template</b></span> 
@@ -105,10 +112,11 @@ print(f"Folded-Clos topology details (Not considering port density changes and s
 # This book uses the Mako template engine to populate BGP-related information into the default FRR configuration file (frr.conf). The per-node BGP configuration is contained in the graph structure built in the prior section. 
 
 # %%
-from mako.template import Template
+from ClosRender import ConfigRenderer
 
 try: 
-    bgpTemplate = Template(filename=TEMPLATE_LOCATION)
+    # Templates are compiled once into Mako's module cache, and every node is rendered in a process pool.
+    renderer = ConfigRenderer(topology.PROTOCOL, templatePath=TEMPLATE_LOCATION)
     print("FRR-BGP configuration template loaded.")
     
 except Exception as e:
@@ -123,9 +131,6 @@ slice = fablib.new_slice(name=SLICE_NAME)
 
 addedNodes = {} # Visited nodes structure, format = name : nodeInfo
 
-# Add slice-specific information to the log file
-logFile.update({"name": SLICE_NAME, "site": SITE_NAME})
-
 # Iterate over each network in the topology and configure each interface connected to the network, and the network itself.
 for networkInfo in topology.iterNetwork(fabricFormating=True):
     networkIntfs = [] # Interfaces to be added to the network.
@@ -194,37 +199,23 @@ except Exception as e:
 
 # %%
 # CONFIGURATION FOR BGP-SPEAKING LEAF AND SPINE NODES
-def addBGPConfiguration(node, topology, bgpTemplate):
-    '''
-    Prepare a node for the FRR BGP-4 implementation to be installed.
-    '''
-
-    # Store information about BGP-speaking neighbors to configure neighborship
-    neighboringNodes = []
-    
-    # Find the node's BGP-speaking neighbors and determine their ASN as well as their IPv4 address used on the subnet shared by the nodes.
-    for neighbor, _ in topology.getNodeAttribute(node, 'ipv4').items():
-        if(topology.isNetworkNode(neighbor)):
-            neighboringNodes.append({'asn':topology.getNodeAttribute(neighbor, 'ASN'), 'ip':topology.getNodeAttribute(neighbor, 'ipv4', node)})
-
-    # In addition to storing neighbor information, store any compute subnets that the node must advertise to neighbors (leaf's only).
-    nodeTemplate = {'neighbors':neighboringNodes, 'bgp_asn': topology.getNodeAttribute(node, 'ASN'), 'networks': topology.getNodeAttribute(node, 'advertise')}
+# Unnumbered neighbors are peered with over the interface facing them, so look up the name of each of those interfaces first.
+interfaceNames = None
+if(topology.unnumbered):
+    interfaceNames = {(node, neighbor): manager.getInterfaceName(node, neighbor) 
+                      for node in topology.iterNodes(noComputeNodes=True) for neighbor in topology.getBGPNeighbors(node)}
 
-    # Process the stored information and render a custom frr.conf.
-    nodeBGPData = bgpTemplate.render(**nodeTemplate)
-
-    # Perform the transfer to the node-specific configuration file
-    manager.executeCommandsParallel(f'sudo echo -e "{nodeBGPData}" > bgp_scripts/frr.conf', prefixList=node)
-
-    return
+# Render every node's frr.conf into CONFIG_BUNDLE_LOCATION/<node>/frr.conf. The slice is new, so every node needs its file, whatever an earlier
+# slice was given. The bundle's manifest is only saved once the files are on the nodes (see the update section at the end of the book).
+configFiles = renderer.render(topology, CONFIG_BUNDLE_LOCATION, interfaceNames=interfaceNames, commit=False)
 
 # Upload the scripts directory for all nodes (switches + servers) and provide the correct permissions
 manager.uploadDirectoryParallel(BGP_SCRIPTS_LOCATION)
 manager.executeCommandsParallel('sudo chmod +x /home/rocky/bgp_scripts/*.sh')
 
 # Configure the switches
-for node in topology.iterNodes(noComputeNodes=True):
-    addBGPConfiguration(node, topology, bgpTemplate)
+uploadedNodes = manager.uploadNodeFilesParallel(configFiles, "/home/rocky/bgp_scripts/frr.conf")
+renderer.commitManifest(CONFIG_BUNDLE_LOCATION, uploadedNodes)
 
 # %%
 # Commands to execute the bash scripts configuring the nodes
@@ -244,7 +235,9 @@ manager.executeCommandsParallel(edgeNodeConfig, prefixList=COMPUTE_NODE_PREFIXES
 #
 # * 192.168.0.0/16 is the compute supernet. All compute subnets are given a /24 subnet. Compute devices are given lower addresses (ex: .1) and the leaf node is given a high address (ex: .254)
 #
-# * 172.16.0.0/12 is the core supernet. All core subnets are given a /24 subnet. Both devices are given lower addresses.
+# * 172.16.0.0/12 is the core supernet. All core subnets are given a subnet of CORE_PREFIX_LENGTH (/24 by default). Both devices are given lower addresses, which are the only two addresses of a /31.
+#
+# If UNNUMBERED is set, core interfaces have no IPv4 addresses and are skipped, as BGP uses their IPv6 link-local addresses.
 
 # %%
 from ipaddress import ip_address, IPv4Address, IPv4Network
@@ -259,12 +252,12 @@ for node in topology.iterNodes():
     # Pull IPv4 attribute data to configure FABRIC interfaces
     for neighbor, currentAddress in topology.getNodeAttribute(node, 'ipv4').items():
         # Access the interface from FABRIC.
-        intfName = f"{node}-intf-{neighbor}-p1" # Naming is a bit strange, but is formatted in FABRIC as such.
+        intfName = topology.getFabricInterfaceName(node, neighbor) # Naming is a bit strange, but is formatted in FABRIC as such.
         intf = manager.slice.get_interface(intfName)
 
         # Convert the address and subnet into ipaddress objects for FABRIC processing.
         fabAddress = IPv4Address(currentAddress)
-        fabSubnet = IPv4Network(f"{currentAddress}/24", strict=False)
+        fabSubnet = IPv4Network(topology.getInterfaceSubnet(node, neighbor))
 
         # Assign the address to the interface.
         intf.ip_addr_add(addr=fabAddress, subnet=fabSubnet)
@@ -286,14 +279,31 @@ for node in topology.iterNodes():
 # ## <span style="color: #de4815"><b>Log Topology Information</b></span> 
 
 # %%
-# Iterate through every node in the topology
-for nodeName in topology.iterNodes():
-    tierNumber = topology.getNodeAttribute(nodeName, 'tier')
-    logFile[f"tier_{tierNumber}"][nodeName]["ssh"] = manager.slice.get_node(nodeName).get_ssh_command()
+# Stream the topology information to the log file one node at a time, adding slice-specific information and each node's SSH command.
+# Pass binary=True (and open the file in "wb" mode) for a compact file that ClosSerializer.GraphInfoReader can read one node at a time.
+with open(f'{SLICE_NAME}_k{PORTS_PER_DEVICE}_t{NUMBER_OF_TIERS}_BGP.json', "w") as outfile:
+    topology.writeGraphInfo(outfile, 
+                            extraInfo={"name": SLICE_NAME, "site": SITE_NAME}, 
+                            nodeExtras=lambda nodeName: {"ssh": manager.slice.get_node(nodeName).get_ssh_command()})
+
+# Save the reverse address index too, so analysis code can resolve the addresses in FRR logs (ex: 172.16.8.1(S-1-1)) to their node, interface, and link.
+topology.getAddressIndex().save(f'{SLICE_NAME}_k{PORTS_PER_DEVICE}_t{NUMBER_OF_TIERS}_BGP_addresses.json')
 
+# %% [markdown]
+# ## <span style="color: #de4815"><b>Update the Configuration of the Running Slice</b></span>
+#
+# Only run this section against a slice this book already built. After changing the BGP configuration of the topology (ex: ASNs or networks, without adding or removing links) or the template, run the graph and template sections again, then this one.
+#
+# Only the nodes whose frr.conf changed since the last push are rendered, pushed, and reloaded. The manifest is saved for the nodes the push reached, so a node the push missed is pushed again the next time.
 
 # %%
-import json
+configFiles = renderer.render(topology, CONFIG_BUNDLE_LOCATION, interfaceNames=interfaceNames, changedOnly=True, commit=False)
+print(f"{len(configFiles)} nodes to update: {sorted(configFiles)}")
 
-with open(f'{SLICE_NAME}_k{PORTS_PER_DEVICE}_t{NUMBER_OF_TIERS}_BGP.json', "w") as outfile:
-    json.dump(logFile, outfile)
+uploadedNodes = manager.uploadNodeFilesParallel(configFiles, "/home/rocky/bgp_scripts/frr.conf")
+
+# Nodes whose pushed file differs from the running one take it and reload FRR, the other nodes are left alone.
+reloadCommand = "cmp -s bgp_scripts/frr.conf /etc/frr/frr.conf || (sudo cp bgp_scripts/frr.conf /etc/frr/frr.conf && sudo service frr reload)"
+manager.executeCommandsParallel(reloadCommand, prefixList=NETWORK_NODE_PREFIXES)
+
+renderer.commitManifest(CONFIG_BUNDLE_LOCATION, uploadedNodes)
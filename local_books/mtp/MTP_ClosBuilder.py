@@ -43,6 +43,7 @@
 # | SOUTHBOUND_PORT_DENSITY | If you want to change how many southbound ports are used for a device at a given tier, it needs to be placed in a dictonary with the key being the tier and the value being the updated southbound port density. For example, If I want tier 3 spines to only have 2 southbound ports, I would modify this variable to show {3:2}. |
 # | MTP_SCRIPTS_LOCATION     | The full path to the mtp_scripts directory. Don't change the name of the files inside of the directory unless you change it in this book as well. |
 # | TEMPLATE_LOCATION     | The full path to the MTP Mako template. You don't need to understand how Mako works, the book takes care of it. Don't change the name of the files inside of the directory unless you change it in this book as well. |
+# | CONFIG_BUNDLE_LOCATION | The local directory the per-node configuration files are rendered into, one sub-directory per node. |
 
 # %%
 # FABRIC Configuration
@@ -57,6 +58,7 @@ COMPUTE_NODE_PREFIXES = "C"
 SOUTHBOUND_PORT_DENSITY = {1:1}
 MTP_SCRIPTS_LOCATION = "/home/pjw7904/fabric/FABRIC-Automation/remote_scripts/mtp_scripts"
 TEMPLATE_LOCATION = "/home/pjw7904/fabric/FABRIC-Automation/remote_scripts/mtp_templates/mtp_conf.mako"
+CONFIG_BUNDLE_LOCATION = "mtp_configs"
 
 # %% [markdown]
 # ## <span style="color: #034694"><b>Access the Fablib Library and Confirm Configuration</b></span>
@@ -88,10 +90,9 @@ topology = MTPConfig(PORTS_PER_DEVICE,
                         NUMBER_OF_TIERS, 
                         southboundPortsConfig=SOUTHBOUND_PORT_DENSITY)
 topology.buildGraph()
-logFile = topology.jsonGraphInfo()
 
 print("MTP configuration complete\n")
-print(f"Folded-Clos topology details (Not considering port density changes):\n{topology.getClosStats()}")
+print(f"Folded-Clos topology details:\n{topology.getClosStats()}")
 
 # %% [markdown]
 # ## <span style="color: #034694"><b>Prepare the MTP Configuration Template</b></span> 
@@ -99,10 +100,11 @@ print(f"Folded-Clos topology details (Not considering port density changes):\n{t
 # This book uses the Mako template engine to populate MTP-related information into the MTP configuration file (mtp.conf). The per-node MTP configuration is contained in the graph structure built in the prior section. 
 
 # %%
-from mako.template import Template
+from ClosRender import ConfigRenderer
 
 try: 
-    mtpTemplate = Template(filename=TEMPLATE_LOCATION)
+    # Templates are compiled once into Mako's module cache, and every node is rendered in a process pool.
+    renderer = ConfigRenderer(topology.PROTOCOL, templatePath=TEMPLATE_LOCATION)
     print("MTP configuration template loaded.")
     
 except Exception as e:
@@ -117,9 +119,6 @@ slice = fablib.new_slice(name=SLICE_NAME)
 
 addedNodes = {} # Visited nodes structure, format = name : nodeInfo
 
-# Add slice-specific information to the log file
-logFile.update({"name": SLICE_NAME, "site": SITE_NAME})
-
 # Iterate over each network in the topology and configure each interface connected to the network, and the network itself.
 for networkInfo in topology.iterNetwork(fabricFormating=True):
     networkIntfs = [] # Interfaces to be added to the network.
@@ -185,29 +184,17 @@ except Exception as e:
 
 # %%
 # CONFIGURATION FOR MTP-SPEAKING LEAF AND SPINE NODES
-def addMTPConfiguration(node, topology, mtpTemplate):
-    '''
-    Prepare a node for the MTP implementation to be utilized.
-    '''
-
-    # Store tier information
-    nodeTemplate = {'tier': topology.getNodeAttribute(node, 'tier'), 'isTopSpine': topology.getNodeAttribute(node, 'isTopTier')}
-
-    # Process the stored information and render a custom mtp.conf.
-    nodeMTPData = mtpTemplate.render(**nodeTemplate)
-
-    # Perform the transfer to the node-specific configuration file
-    manager.executeCommandsParallel(f'sudo echo -e "{nodeMTPData}" > mtp_scripts/mtp.conf', prefixList=node)
-
-    return
+# Render every node's mtp.conf into CONFIG_BUNDLE_LOCATION/<node>/mtp.conf. The slice is new, so every node needs its file, whatever an earlier
+# slice was given. The bundle's manifest is only saved once the files are on the nodes (see the update section at the end of the book).
+configFiles = renderer.render(topology, CONFIG_BUNDLE_LOCATION, commit=False)
 
 # Upload the scripts directory for all nodes (switches + servers) and provide the correct permissions
 manager.uploadDirectoryParallel(MTP_SCRIPTS_LOCATION)
 manager.executeCommandsParallel('sudo chmod +x /home/rocky/mtp_scripts/*.sh')
 
 # Configure the switches
-for node in topology.iterNodes(noComputeNodes=True):
-    addMTPConfiguration(node, topology, mtpTemplate)
+uploadedNodes = manager.uploadNodeFilesParallel(configFiles, "/home/rocky/mtp_scripts/mtp.conf")
+renderer.commitManifest(CONFIG_BUNDLE_LOCATION, uploadedNodes)
 
 # %%
 # Commands to execute the bash scripts configuring the nodes
@@ -240,12 +227,12 @@ for node in topology.iterNodes():
     # Pull IPv4 attribute data to configure FABRIC interfaces
     for neighbor, currentAddress in topology.getNodeAttribute(node, 'ipv4').items():
         # Access the interface from FABRIC.
-        intfName = f"{node}-intf-{neighbor}-p1" # Naming is a bit strange, but is formatted in FABRIC as such.
+        intfName = topology.getFabricInterfaceName(node, neighbor) # Naming is a bit strange, but is formatted in FABRIC as such.
         intf = manager.slice.get_interface(intfName)
 
         # Convert the address and subnet into ipaddress objects for FABRIC processing.
         fabAddress = IPv4Address(currentAddress)
-        fabSubnet = IPv4Network(f"{currentAddress}/24", strict=False)
+        fabSubnet = IPv4Network(topology.getInterfaceSubnet(node, neighbor))
 
         # Assign the address to the interface.
         intf.ip_addr_add(addr=fabAddress, subnet=fabSubnet)
@@ -267,14 +254,30 @@ for node in topology.iterNodes():
 # ## <span style="color: #034694"><b>Log Topology Information</b></span> 
 
 # %%
-# Iterate through every node in the topology
-for nodeName in topology.iterNodes():
-    tierNumber = topology.getNodeAttribute(nodeName, 'tier')
-    logFile[f"tier_{tierNumber}"][nodeName]["ssh"] = manager.slice.get_node(nodeName).get_ssh_command()
+# Stream the topology information to the log file one node at a time, adding slice-specific information and each node's SSH command.
+# Pass binary=True (and open the file in "wb" mode) for a compact file that ClosSerializer.GraphInfoReader can read one node at a time.
+with open(f'{SLICE_NAME}_k{PORTS_PER_DEVICE}_t{NUMBER_OF_TIERS}_MTP.json', "w") as outfile:
+    topology.writeGraphInfo(outfile, 
+                            extraInfo={"name": SLICE_NAME, "site": SITE_NAME}, 
+                            nodeExtras=lambda nodeName: {"ssh": manager.slice.get_node(nodeName).get_ssh_command()})
 
+# Save the reverse address index too, so analysis code can resolve the addresses in FRR logs (ex: 172.16.8.1(S-1-1)) to their node, interface, and link.
+topology.getAddressIndex().save(f'{SLICE_NAME}_k{PORTS_PER_DEVICE}_t{NUMBER_OF_TIERS}_MTP_addresses.json')
+
+# %% [markdown]
+# ## <span style="color: #034694"><b>Update the Configuration of the Running Slice</b></span>
+#
+# Only run this section against a slice this book already built. After changing the template, run the graph and template sections again, then this one.
+#
+# Only the nodes whose mtp.conf changed since the last push are rendered and pushed, and MTP reads the new file the next time it is started (ex: by MTP_Test). The manifest is saved for the nodes the push reached, so a node the push missed is pushed again the next time.
 
 # %%
-import json 
+configFiles = renderer.render(topology, CONFIG_BUNDLE_LOCATION, changedOnly=True, commit=False)
+print(f"{len(configFiles)} nodes to update: {sorted(configFiles)}")
 
-with open(f'{SLICE_NAME}_k{PORTS_PER_DEVICE}_t{NUMBER_OF_TIERS}_MTP.json', "w") as outfile:
-    json.dump(logFile, outfile)
+uploadedNodes = manager.uploadNodeFilesParallel(configFiles, "/home/rocky/mtp_scripts/mtp.conf")
+
+# The compiled MTP implementation reads its configuration from its source directory (see compile_mtp.sh).
+manager.executeCommandsParallel("cp ~/mtp_scripts/mtp.conf ~/CMTP/SRC/", prefixList=NETWORK_NODE_PREFIXES)
+
+renderer.commitManifest(CONFIG_BUNDLE_LOCATION, uploadedNodes)
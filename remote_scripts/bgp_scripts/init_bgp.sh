@@ -21,6 +21,10 @@ sudo python3 -m pip install scapy psutil
 # Turn on IP forwarding
 sudo sysctl -w net.ipv4.ip_forward=1
 
+# Unnumbered BGP peers over IPv6 link-local addresses, so every interface needs to be up with IPv6 enabled, even without an IPv4 address.
+sudo sysctl -w net.ipv6.conf.all.disable_ipv6=0
+for intf in $(ls /sys/class/net); do sudo ip link set dev "$intf" up; done
+
 # A "here" document to get around the logout/login requirements of adding a group to a user
 newgrp frr << END
 sudo sed -i 's/bgpd=no/bgpd=yes/g' /etc/frr/daemons
@@ -12,9 +12,11 @@ bfd
   transmit-interval 100
  !
 % for neighbor in neighbors:
+% if "ip" in neighbor:
  peer ${neighbor["ip"]}
   profile lowerIntervals
   no shutdown
+% endif
 % endfor
 !
 exit
@@ -23,8 +25,13 @@ router bgp ${bgp_asn}
  timers bgp 1 3
  bgp log-neighbor-changes
 % for neighbor in neighbors:
+% if "interface" in neighbor:
+ neighbor ${neighbor["interface"]} interface remote-as external
+ neighbor ${neighbor["interface"]} bfd profile lowerIntervals
+% else:
  neighbor ${neighbor["ip"]} remote-as ${neighbor["asn"]}
  neighbor ${neighbor["ip"]} bfd
+% endif
 % endfor
  !
 % if networks: